@@ -1,29 +1,54 @@
-from astral.sun import sun
-from astral import LocationInfo
-from datetime import datetime, timezone
-import pytz
-
-def is_day_or_night():
-    LATITUDE = -50.474164647981034
-    LONGITUDE = -73.0354106241449
-    
-    argentina_tz = pytz.timezone('America/Argentina/Ushuaia')
-    location = LocationInfo(name="Calafate", latitude=LATITUDE, longitude=LONGITUDE)
-    
-    now = datetime.now(argentina_tz)
-    
-    s = sun(location.observer, date=now.date(), tzinfo=argentina_tz)
-    sunrise = s["sunrise"]
-    sunset = s["sunset"]
-    
-    #print(sunrise)
-    #print(sunset)
-    #print(now)
-    
-    if sunrise.time() <= now.time() < sunset.time():
-        return "day"
-    else:
-        return "night"
-
-if __name__ == "__main__":
-    print(is_day_or_night())
+import time
+import struct
+import sun_table
+
+STATION = 'Calafate'  # coordinates and time zone in sun_table.STATIONS
+
+def table_day_or_night(now):
+    # Constant-time lookup in the table generated by sun_table.py (no astral/pytz import)
+    try:
+        times = sun_table.lookup(sun_table.TABLE_PATH, now)
+    except (OSError, ValueError, struct.error):
+        return None
+    if times is None:
+        return None
+    sunrise, sunset = times
+    if sunrise <= now < sunset:
+        return "day"
+    else:
+        return "night"
+
+def astral_day_or_night():
+    from astral.sun import sun
+    from astral import LocationInfo
+    from datetime import datetime
+    import pytz
+
+    latitude, longitude, timezone = sun_table.STATIONS[STATION]
+    argentina_tz = pytz.timezone(timezone)
+    location = LocationInfo(name=STATION, latitude=latitude, longitude=longitude)
+    
+    now = datetime.now(argentina_tz)
+    
+    s = sun(location.observer, date=now.date(), tzinfo=argentina_tz)
+    sunrise = s["sunrise"]
+    sunset = s["sunset"]
+    
+    #print(sunrise)
+    #print(sunset)
+    #print(now)
+    
+    if sunrise.time() <= now.time() < sunset.time():
+        return "day"
+    else:
+        return "night"
+
+def is_day_or_night():
+    result = table_day_or_night(time.time())
+    if result is None:
+        # Outside the precomputed range (or no table yet): compute it with astral
+        result = astral_day_or_night()
+    return result
+
+if __name__ == "__main__":
+    print(is_day_or_night())
@@ -17,24 +17,38 @@ import argparse
 import glob
 import shutil
 import subprocess
+import usb_mirror
+import retention
+import temp_series
+import log_shipper
 
 parser = argparse.ArgumentParser(description='Maintenance script to clean and remove files.')
 parser.add_argument('--id', type=str, required=True, help='ID for the system')
 parser.add_argument('--backup', type=int, default=5, help='Threshold in days for backup file deletion')
 parser.add_argument('--thermal', type=str, default='false', help='Thermal camera?')
-args = parser.parse_args()
-BASE_PATH = '/home/pi'
+parser.add_argument('--budget', type=int, default=4000, help='Storage budget in MB for each FileTransfer folder')
+parser.add_argument('--logs_budget', type=int, default=200, help='Storage budget in MB for the logs backup folder')
+parser.add_argument('--preview_budget', type=int, default=200, help='Storage budget in MB for the RGB previews folder')
+parser.add_argument('--min_free', type=int, default=1024, help='Free MB to keep on the SD card deleting synced files')
+parser.add_argument('--critical_free', type=int, default=256, help='Free MB below which unsynced files are also deleted')
+parser.add_argument('--reconcile', type=int, default=24, help='Hours between full scans of the USB stick')
+args = parser.parse_args(globals().get("STAGE_ARGV"))  # STAGE_ARGV: arguments given by AI4Glaciers.py
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')
 
 ID = args.id
 day_threshold = args.backup
 thermal_arg = args.thermal
 path_filetransfer_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_filetransfer")
 path_filetransfer_temp = os.path.join(BASE_PATH, f"{ID}_TEMP_filetransfer")
+path_series_temp = os.path.join(BASE_PATH, f"{ID}_TEMP_series")
 path_backup_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_backup")
+path_preview_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_preview")
 path_filetransfer_tir = os.path.join(BASE_PATH, f"{ID}_TIR_filetransfer")
+path_filetransfer_roi = os.path.join(BASE_PATH, f"{ID}_TIR_roi")
 path_backup_tir = os.path.join(BASE_PATH, f"{ID}_TIR_backup")
 path_logs_backup = os.path.join(BASE_PATH, f"{ID}_logs_backup")
 mount_point = os.path.join(BASE_PATH, "usb_stick")
+DATESTAMP_PATH = os.path.join(BASE_PATH, "datestamp")
 
 def _print(message):
     current_time = datetime.now()
@@ -42,7 +56,7 @@ def _print(message):
     print(f"{formatted_time} :: Maintenance :: {message}")
     
 def delete_flags():
-    flags = glob.glob("/home/pi/*.flag")
+    flags = glob.glob(os.path.join(BASE_PATH, "*.flag"))
     if flags:
         for flag in flags:
             _print(f"Flag file {os.path.basename(flag)} detected")
@@ -78,14 +92,14 @@ def check_month():
     try:
         current_datestamp = datetime.now().strftime("%b%y")
 
-        if os.path.exists("/home/pi/datestamp"):
-            with open("/home/pi/datestamp", "r") as f:
+        if os.path.exists(DATESTAMP_PATH):
+            with open(DATESTAMP_PATH, "r") as f:
                 datestamp = f.read().strip()
             _print(f"Last datestamp found: {datestamp}")
 
         else:
-            _print("File /home/pi/datestamp does not exist. Creating it with the current month")
-            with open("/home/pi/datestamp", "w") as f:
+            _print(f"File {DATESTAMP_PATH} does not exist. Creating it with the current month")
+            with open(DATESTAMP_PATH, "w") as f:
                 f.write(current_datestamp)
             datestamp = current_datestamp
 
@@ -97,41 +111,53 @@ def check_month():
 
 def check_mount(directory):
     count = -1
-    with open('/proc/mounts', 'r') as mounts:
-        if mount_point in mounts.read():
-            try:
-                count = sum(len(files) for _, _, files in os.walk(directory))
-            except:
-                count = -999
-            _print(f"USB mounted correctly in {mount_point} - {count} files stored")
-        else:
-            _print(f'USB not mounted correctly')  
+    if usb_mirror.is_mounted(mount_point):
+        try:
+            # File index kept by the USB sync and the uploads; the stick is only rescanned once a day
+            count, size, oldest, newest = usb_mirror.index_stats(directory, reconcile_hours=args.reconcile)
+            _print(f"USB mounted correctly in {mount_point} - {count} files stored ({size / 1e9:.2f} GB)")
+            if oldest and newest:
+                _print(f"USB oldest file: {oldest['name']} - newest file: {newest['name']}")
+        except Exception as e:
+            count = -999
+            _print(f"USB mounted correctly in {mount_point} - ERROR reading the file index: {e}")
+    else:
+        _print(f'USB not mounted correctly')  
     return count
 
-def clean_old_files(path):
-    if not os.path.exists(path):
-        _print(f"ERROR: {path} does not exist.")
-        return
-        
-    if not any(os.scandir(path)):
-        _print(f'Clean Folder: No files in the {os.path.basename(path)}')   
-    else:
-        _print(f'Clean Folder: There are {len(os.listdir(path))} images in {os.path.basename(path)}')
-        date_time = time.time()
-        deleted_images = 0
-        for file in os.listdir(path):
-            date_file = os.path.getmtime(os.path.join(path, file))
-            if ((date_time - date_file)/(24*3600))>= day_threshold:
-                try:
-                    os.unlink(os.path.join(path, file))
-                    _print(f"Clean Folder: File {file} deleted successfully")
-                except Exception as e:
-                    _print(f"ERROR deleting {file}: {e}")
-                deleted_images = deleted_images + 1
-        if deleted_images == 0:
-            _print(f'Clean Folder: No files older than {day_threshold} days. No folder cleanning')
-        else:
-            _print(f'Clean Folder: {deleted_images} images deleted because are older than {day_threshold}')
+def publish_temperatures():
+    # Temperature series of the previous days (or months) go to the FileTransfer folder to be uploaded
+    try:
+        moved = temp_series.publish(path_series_temp, path_filetransfer_temp)
+        if moved:
+            usb_mirror.sync(moved, mount_point)
+    except Exception as e:
+        _print(f"ERROR: Temperature series")
+        _print(f"ERROR: {e}")
+
+def clean_old_files(thermal):
+    # Budget-based retention: synced files go first, unsynced files only if the SD card is almost full
+    folders = {path_filetransfer_rgb: (args.budget * 1e6, False),
+               path_preview_rgb: (args.preview_budget * 1e6, True),  # the originals are kept
+               path_logs_backup: (args.logs_budget * 1e6, True)}
+    if thermal:
+        folders[path_filetransfer_tir] = (args.budget * 1e6, False)
+        folders[path_filetransfer_temp] = (args.budget * 1e6, False)
+        folders[path_filetransfer_roi] = (args.preview_budget * 1e6, True)  # the rows are also in the TIRroi series
+    try:
+        retention.enforce(folders, args.min_free * 1e6, args.critical_free * 1e6, day_threshold, BASE_PATH)
+    except Exception as e:
+        _print(f"ERROR: Retention policy")
+        _print(f"ERROR: {e}")
+
+def clear_log(log_path):
+    # Truncated in place, not deleted: AI4Glaciers.py (stdout >> AI4G.log) keeps the file open for
+    # the rest of the cycle, and the lines written to a deleted file would be lost
+    try:
+        with open(log_path, "r+") as f:
+            f.truncate(0)
+    except PermissionError:
+        subprocess.check_call(['sudo', 'truncate', '-s', '0', log_path])
 
 def backup_and_clear_log(log_path, datestamp, current_datestamp):
     try:
@@ -141,13 +167,14 @@ def backup_and_clear_log(log_path, datestamp, current_datestamp):
             backup_path = os.path.join(path_logs_backup, log_name_with_date)
             try:
                 shutil.copy(log_path, backup_path)
-                _print(f"Logs: Backup done. Removing source log file to restart the content")
-                subprocess.check_call(['sudo', 'rm', log_path])
-                _print(f"Logs: {os.path.basename(log_path)} has been deleted")
+                log_shipper.rotate(log_path, backup_path)
+                _print(f"Logs: Backup done. Emptying source log file to restart the content")
+                clear_log(log_path)
+                _print(f"Logs: {os.path.basename(log_path)} has been emptied")
             except Exception as e:
                 _print(f"ERROR: Failed to back up log file {log_path}. {e}")
                 
-            with open("/home/pi/datestamp", "w") as f:
+            with open(DATESTAMP_PATH, "w") as f:
                 f.write(current_datestamp)
 
     except Exception as e:
@@ -184,23 +211,24 @@ if __name__ == "__main__":
             _print("ERROR: USB not mounted")
         check_mount(mount_point)                
         create_folders(path_filetransfer_rgb)
+        create_folders(path_preview_rgb)
         create_folders(path_logs_backup)      
         list_clean_img(path_filetransfer_rgb)
-        clean_old_files(path_filetransfer_rgb)
 
         if thermal_arg.lower() == 'true':
             _print('Thermal Camera module enabled: TIR Actions will be performed')
             create_folders(path_filetransfer_tir)
             create_folders(path_filetransfer_temp)
+            create_folders(path_filetransfer_roi)
             list_clean_img(path_filetransfer_tir)
-            clean_old_files(path_filetransfer_tir)
-            clean_old_files(path_filetransfer_temp)
-            
+            publish_temperatures()
+
+        clean_old_files(thermal_arg.lower() == 'true')
         delete_flags()
         datestamp, current_datestamp = check_month()
-        backup_and_clear_log('/home/pi/AI4G.log', datestamp, current_datestamp)
-        backup_and_clear_log('/home/pi/wittypi/wittyPi.log', datestamp, current_datestamp)
-        backup_and_clear_log('/home/pi/wittypi/schedule.log', datestamp, current_datestamp)
+        backup_and_clear_log(os.path.join(BASE_PATH, 'AI4G.log'), datestamp, current_datestamp)
+        backup_and_clear_log(os.path.join(BASE_PATH, 'wittypi/wittyPi.log'), datestamp, current_datestamp)
+        backup_and_clear_log(os.path.join(BASE_PATH, 'wittypi/schedule.log'), datestamp, current_datestamp)
 
         _print(f"Code successfully completed in {time.time()-start_time:.2f} s")
 
@@ -13,32 +13,45 @@ import time
 start_time = time.time()
 from datetime import datetime
 import glob
-from sh import gphoto2 as gp
+import re
 import RPi.GPIO as GPIO
-import subprocess
 import os
 import argparse
-import shutil
+import usb_mirror
+import camera_session
+import camera_backends
+import rgb_preview
+import rgb_quality
+import metrics
 
 parser = argparse.ArgumentParser(description='Maintenance script to clean and remove files.')
 parser.add_argument('--id', type=str, required=True, help='ID for the system')
 parser.add_argument('--num', type=int, default=2, help='Number of burst images')
-args = parser.parse_args()
-BASE_PATH = '/home/pi'
+parser.add_argument('--backend', type=str, default='session', choices=['session', 'cli'], help='One libgphoto2 session per cycle or one gphoto2 process per command')
+parser.add_argument('--shutter_second', type=int, default=35, help='Second of the minute for the shutter (-1: at once)')
+parser.add_argument('--ready_timeout', type=int, default=30, help='Seconds to wait for the camera after the relay is on')
+parser.add_argument('--files_timeout', type=int, default=30, help='Seconds to wait for the images on the camera card')
+parser.add_argument('--preview_size', type=int, default=rgb_preview.PREVIEW_SIZE, help='Long side in pixels of the previews uploaded first (0: no previews)')
+parser.add_argument('--quality_gate', type=str, default='true', help='Tag dark, fogged or duplicate images to skip or defer their upload')
+parser.add_argument('--preview_quality', type=int, default=rgb_preview.PREVIEW_QUALITY, help='JPEG quality of the previews')
+args = parser.parse_args(globals().get("STAGE_ARGV"))  # STAGE_ARGV: arguments given by AI4Glaciers.py
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')
 ID = args.id
 num_of_pics = args.num
 
 path_filetransfer_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_filetransfer")
 path_backup_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_backup")
+path_preview_rgb = os.path.join(BASE_PATH, f"{ID}_RGB_preview")
 mount_point = os.path.join(BASE_PATH, "usb_stick")
+SHUTTER_SECOND = args.shutter_second if args.shutter_second >= 0 else None
 
-gphoto2_ISO = ["--set-config", "iso=1"]
-#gphoto2_focus = ["--set-config", "autofocusdrive=1"]
 gphoto2_autodetect = ["--summary"]
-gphoto2_capture = ["--capture-image", "-F=" + str(num_of_pics), "-I=3="]
 gphoto2_SD_Erase = ["--folder", "/store_00020001/DCIM/100CANON", "-R", "--delete-all-files"]
 gphoto2_SD = ["--set-config", "capturetarget=1"]
-gphoto2_SD_Transfer = ["--get-all-files"]
+gphoto2_SD_Files = ["--folder", "/store_00020001/DCIM/100CANON", "--num-files"]
+gphoto2_SD_Transfer = ["--get-all-files", "--filename"]  # + target pattern: no chdir in a stage
+gphoto2_SD_Filename = "%f.%C"  # %f is the camera name without its extension, %C the extension
+CAMERA_FILE = re.compile(r"^[A-Z0-9_]{4}\d{4}\.[A-Za-z0-9]+$")  # DCF names given by the camera: IMG_1234.JPG
 
 def _print(message):
     current_time = datetime.now()
@@ -52,9 +65,7 @@ def control_relay(mode):
         if mode == "up":
             GPIO.output(21, GPIO.HIGH)
             _print("Camera relay activated succesfully")
-            time.sleep(4)
         if mode == "down":
-            time.sleep(3)
             GPIO.output(21, GPIO.LOW)
             _print("Camera relay deactivated succesfully")     
             #GPIO.cleanup()
@@ -62,109 +73,139 @@ def control_relay(mode):
         _print("ERROR: Camera relay")
         _print(f"ERROR: {e}")    
 
-def detect_camera():
-    try:
-        output = gp(gphoto2_autodetect)
-        data_output = output.splitlines()
-        model_line = [line for line in data_output if "Model:" in line][0]
-        if model_line:
-            _print(f"GPhoto2 - Camera {model_line} detected")
-        else:
-            _print(f'Alert! No camera detected')
+class Gphoto2Backend:
+    """camera_session backend: relay on GPIO 21 and one gphoto2 process per command (fallback)."""
 
-    except Exception as e:
-        _print("ERROR: Camera autodetect not working")
-        return
+    def __init__(self):
+        from sh import gphoto2  # only the command line fallback needs sh
+        self.gp = gphoto2
 
-def time_shutter():
-    while True:
-        current_second = int(time.time() % 60)
-        if current_second == 35:
-            _print(f"Time-based shutther triggered")
-            try:
-                gp(gphoto2_capture)
-                _print(f"GPhoto2 - {num_of_pics} images captured")
-                time.sleep(2)
-                return
-            except Exception as e:
-                _print("ERROR: GPhoto2 - Error in capturing photos")
-                _print(f"ERROR: {e}")
-                return     
-            return
-
-def capture_image():
-    try:
-        detect_camera()
-    except Exception as e:
-        _print(f"ERROR: Camera detection error")
-        return
+    def power(self, on):
+        control_relay("up" if on else "down")
 
-    try:
-        time.sleep(1)
-        gp(gphoto2_SD_Erase)
+    def usb_present(self):
+        return camera_session.usb_camera_present()
+
+    def probe(self):
+        output = self.gp(gphoto2_autodetect)
+        model_line = [line for line in output.splitlines() if "Model:" in line]
+        return model_line[0].strip() if model_line else None
+
+    def prepare(self):
+        self.gp(gphoto2_SD_Erase)
         _print("GPhoto2 - Internal SD card erased")
+        self.gp(gphoto2_SD)
+        _print("GPhoto2 - Internal SD card selected")
+
+    def capture(self, num):
+        self.gp(["--capture-image", "-F=" + str(num), "-I=3="])
+        _print(f"GPhoto2 - {num} images captured")
+
+    def count_files(self):
+        # "Number of files in folder '/store_00020001/DCIM/100CANON': 2"
+        output = str(self.gp(gphoto2_SD_Files)).strip().splitlines()
+        return int(output[-1].rsplit(":", 1)[1]) if output else 0
+
+    def download(self, path, names):
+        self.gp(gphoto2_SD_Transfer + [os.path.join(path, gphoto2_SD_Filename)])
+        _print(f"GPhoto2 - {num_of_pics} images downloaded from the camera")
+        return rename_files(path, names)
+
+def capture_image(session):
+    try:
+        session.wait_ready()
     except Exception as e:
-        _print("ERROR: Error erasing internal SD card")
+        _print(f"ERROR: Camera detection error")
+        _print(f"ERROR: {e}")
         return
 
     try:
-        time.sleep(1)
-        gp(gphoto2_SD)
-        _print("GPhoto2 - Internal SD card selected")
+        session.prepare()
     except Exception as e:
-        _print("ERROR: Error internal SD card")
+        _print("ERROR: Error preparing internal SD card")
         _print(f"ERROR: {e}")
         return
-        
+
     try:
-        time.sleep(2)
-        time_shutter()
+        session.capture_at(SHUTTER_SECOND, num_of_pics)
     except Exception as e:
-        _print("ERROR: Time-based shutter")
+        _print("ERROR: GPhoto2 - Error in capturing photos")
         _print(f"ERROR: {e}")
         return
 
     try:
-        os.chdir(path_filetransfer_rgb)
-        time.sleep(4)
-        gp(gphoto2_SD_Transfer)
-        _print(f"GPhoto2 - {num_of_pics} images downloaded from the camera")
+        session.wait_files(num_of_pics)
+        return session.download(path_filetransfer_rgb, image_names(datetime.now()))
     except Exception as e:
         _print("ERROR: GPhoto2 - Error in downloading photos")
         _print(f"ERROR: {e}")
         return
 
-def rename_files():
-    now = datetime.now()
+def image_names(now):
     timestamp = now.strftime("%y%m%d_%H%M")
-    count = 1
-    for file in os.listdir(path_filetransfer_rgb):
-        if len(file) < 15:
-            filename = ID + "_" + timestamp + "_" + str(count) + ".jpg"
-            os.rename(os.path.join(path_filetransfer_rgb, file), os.path.join(path_filetransfer_rgb, filename))
-            _print(f"File {file} renamed to {filename}")
-            count = count + 1
+    return [ID + "_" + timestamp + "_" + str(count) + ".jpg" for count in range(1, num_of_pics + 1)]
+
+def rename_files(path, names):
+    files = []
+    for file, filename in zip(sorted(f for f in os.listdir(path) if CAMERA_FILE.match(f)), names):
+        os.rename(os.path.join(path, file), os.path.join(path, filename))
+        _print(f"File {file} renamed to {filename}")
+        files.append(os.path.join(path, filename))
+    return files
+
+def camera_backend():
+    if args.backend == "session":
+        try:
+            return camera_backends.Gphoto2Session(lambda on: control_relay("up" if on else "down"))
+        except ImportError:
+            _print("ERROR: python-gphoto2 not installed - gphoto2 command line used")
+    return Gphoto2Backend()
+
+def quality_gate(files):
+    # The tags only change the GDrive upload (rgb_quality): every image still goes to the USB stick
+    gate_start = time.time()
+    conn = rgb_quality.open_quality()
+    try:
+        results = rgb_quality.assess(files, conn)
+    finally:
+        conn.close()
+    for result in results:
+        _print(f"Quality: {rgb_quality.describe(result)}")
+    tags = [result["tag"] for result in results]
+    metrics.record("quality", time.time() - gate_start, files=len(results),
+                   **{tag: tags.count(tag) for tag in (rgb_quality.KEEP, rgb_quality.DEFER, rgb_quality.DROP)})
+
+def create_previews(files):
+    # Small JPEGs uploaded before the originals: the camera view is known even on a bad link
+    preview_start = time.time()
+    previews = rgb_preview.make_previews(files, path_preview_rgb, args.preview_size, args.preview_quality)
+    size = sum(os.path.getsize(path) for path in previews)
+    metrics.record("preview", time.time() - preview_start, files=len(previews), bytes=size,
+                   original_bytes=sum(os.path.getsize(path) for path in files))
+    if previews:
+        _print(f"{len(previews)} previews created ({size / 1024:.0f} KB) in {time.time() - preview_start:.2f} s")
 
 def sync_folder():
     files = glob.glob(os.path.join(path_filetransfer_rgb, "*.jpg"))
     try:
-        existing_files = set(os.listdir(mount_point))        
-        for file in files:
-            file_name = os.path.basename(file)
-            if file_name not in existing_files:
-                shutil.copy2(file, os.path.join(mount_point, os.path.basename(file)))
-                _print(f"Synchronising file in USB stick: {os.path.basename(file)}")
-                
+        usb_mirror.sync(files, mount_point)
     except Exception as e:
         _print(f"ERROR: USB Syncronization")
         _print(f"ERROR: {e}")
 
 if __name__ == "__main__":
     try:            
-        control_relay("up")
-        capture_image()
-        control_relay("down")
-        rename_files()
+        session = camera_session.CameraSession(camera_backend(), args.ready_timeout, args.files_timeout)
+        session.power_on()
+        try:
+            files = capture_image(session)
+        finally:
+            session.power_off()
+            session.report()
+        if files and args.quality_gate.lower() == 'true':
+            quality_gate(files)
+        if files and args.preview_size > 0:
+            create_previews(files)
         sync_folder()
         _print(f"Code successfully completed in {time.time()-start_time:.2f} s")
             
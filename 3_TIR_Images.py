@@ -11,25 +11,46 @@
 
 import time
 start_time = time.time()
-import os, zipfile, sys, csv
+import os, zipfile, sys
 import argparse
 from datetime import datetime
 import subprocess
 import shutil
 import glob
-from pathlib import Path
+import tir_packager
+import tir_container
+import usb_mirror
+import w1_sampler
+import temp_series
+import tir_roi
+import metrics
 
 parser = argparse.ArgumentParser(description='TIR script to capture thermal images')
 parser.add_argument('--id', type=str, required=True, help='ID for the system')
-args = parser.parse_args()
-BASE_PATH = '/home/pi'
+parser.add_argument('--capture_dir', type=str, default='/dev/shm' if os.path.isdir('/dev/shm') else None, help='Folder for the raw TIFF frames (RAM disk by default)')
+parser.add_argument('--format', type=str, default='zip', choices=['zip', 'tirc'], help='Package of the frames: ZIP or compact TIR container')
+parser.add_argument('--compression', type=str, default='deflated', choices=['deflated', 'stored'], help='ZIP compression of the frames')
+parser.add_argument('--level', type=int, default=6, help='Deflate level (1-9)')
+parser.add_argument('--tir_exe', type=str, default=os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), 'scripts/TIRcapture'), help='TIR capture binary')
+parser.add_argument('--tir_timeout', type=int, default=120, help='Seconds before the TIR capture is stopped')
+parser.add_argument('--w1_path', type=str, default='/sys/bus/w1/devices', help='1-Wire devices folder (sysfs)')
+parser.add_argument('--sensor_timeout', type=int, default=30, help='Seconds to wait for the temperature sensors')
+parser.add_argument('--sensor_samples', type=int, default=3, help='Readings of every temperature sensor')
+parser.add_argument('--sensor_period', type=float, default=1.0, help='Seconds between temperature readings')
+parser.add_argument('--sensor_retries', type=int, default=2, help='Retries of a temperature reading with a failed CRC')
+parser.add_argument('--roi_file', type=str, default=tir_roi.ROI_PATH, help='JSON file with the ROI polygons of the temperature statistics')
+parser.add_argument('--temp_series', type=str, default='day', choices=['day', 'month'], help='Period of every temperature series file')
+parser.add_argument('--stored', type=str, nargs='*', default=[], help='File patterns stored without compression (e.g. "*temperature_tempRange*")')
+args = parser.parse_args(globals().get("STAGE_ARGV"))  # STAGE_ARGV: arguments given by AI4Glaciers.py
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')
 
 ID = args.id
-thermalExe = '/home/pi/scripts/TIRcapture'
+thermalExe = args.tir_exe
 path_filetransfer_tir = os.path.join(BASE_PATH, f"{ID}_TIR_filetransfer")
 mount_point = os.path.join(BASE_PATH, "usb_stick")
-path_filetransfer_temp = os.path.join(BASE_PATH, f"{ID}_TEMP_filetransfer")
-ite=3
+path_series_temp = os.path.join(BASE_PATH, f"{ID}_TEMP_series")
+path_filetransfer_roi = os.path.join(BASE_PATH, f"{ID}_TIR_roi")  # one ROI file per capture, uploaded in the same cycle
+path_capture = args.capture_dir or path_filetransfer_tir
 
 def _print(message):
     current_time = datetime.now()
@@ -45,32 +66,43 @@ def create_subfolder():
     try:
         datetime_folder = datetime.now()
         datetime_name = datetime_folder.strftime("%y%m%d_%H%M")
-        path_tir = os.path.join(path_filetransfer_tir, f"{ID}_{datetime_name}_TIR")
+        path_tir = os.path.join(path_capture, f"{ID}_{datetime_name}_TIR")
         os.makedirs(path_tir, exist_ok = True)
         _print(f'Thermal images will be saved at: {os.path.basename(path_tir)}')
         return datetime_name, path_tir, datetime_folder
     except Exception as e:
         _print(f"ERROR creating subfolder: {e}")
         
-def capture_thermal_images(path_tir):
-    try:
-        os.system('sudo ' + thermalExe + ' ' + path_tir + '/ ' + str(4) + '  ' + f'{ID}_{datetime_name}_')
-    except:
-        __print('ERROR executing C++ code')
-
-def create_zip(datetime_name, path_tir):
+def capture_thermal_images(datetime_name, path_tir):
+    if args.format == 'tirc':
+        return capture_thermal_container(datetime_name, path_tir)
+    # Frames are zipped while TIRcapture is still writing the next ones (no write-walk-zip pass)
     try:
         zip_folder = os.path.join(path_filetransfer_tir, f"{ID}_{datetime_name}_TIR.zip")
         _print(f"{os.path.basename(zip_folder)} file will be created")
-        with zipfile.ZipFile(zip_folder, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            for root, _, files in os.walk(path_tir):
-                for file in files:
-                    file_path = os.path.join(root, file)
-                    arcname = os.path.relpath(file_path, path_tir)
-                    zipf.write(file_path, arcname)
-        _print(f'{os.path.basename(zip_folder)} file generated')
+        process = subprocess.Popen(['sudo', thermalExe, path_tir + '/', str(4), f'{ID}_{datetime_name}_'])
+        added = tir_packager.stream_capture(process, path_tir, zip_folder, args.compression, args.level, args.stored, timeout=args.tir_timeout,
+                                            keep_patterns=[tir_roi.FRAME_PATTERN])  # read by save_roi_summary
+        _print(f'{os.path.basename(zip_folder)} file generated with {added} files')
+        return added
+    except Exception as e:
+        _print(f"ERROR executing C++ code or creating ZIP: {e}")
+        return 0
+
+def capture_thermal_container(datetime_name, path_tir):
+    # Predictive coding needs the complete frame set, so the container is built after the capture
+    try:
+        try:
+            subprocess.run(['sudo', thermalExe, path_tir + '/', str(4), f'{ID}_{datetime_name}_'], timeout=args.tir_timeout)
+        except subprocess.TimeoutExpired:
+            _print(f"ERROR: TIR capture stopped after {args.tir_timeout} s")
+        container = os.path.join(path_filetransfer_tir, f"{ID}_{datetime_name}_TIR.tirc")
+        n_frames, n_files = tir_container.pack_folder(path_tir, container, level=args.level)
+        _print(f'{os.path.basename(container)} file generated with {n_frames} frames and {n_files} files')
+        return n_frames + n_files
     except Exception as e:
-        _print(f"ERROR creating ZIP: {e}")
+        _print(f"ERROR executing C++ code or creating TIR container: {e}")
+        return 0
 
 def remove_folder(path_tir):
     try:
@@ -82,70 +114,74 @@ def remove_folder(path_tir):
 def sync_folder(path_filetransfer_tir, file_type):
     files = glob.glob(os.path.join(path_filetransfer_tir, f"*{file_type}"))
     try:
-        existing_files = set(os.listdir(mount_point))        
-        for file in files:
-            file_name = os.path.basename(file)
-            if file_name not in existing_files:
-                shutil.copy2(file, os.path.join(mount_point, os.path.basename(file)))
-                _print(f"Synchronising {file_type} file in USB drive: {os.path.basename(file)}")
-                
+        usb_mirror.sync(files, mount_point)
     except Exception as e:
         _print(f"ERROR: USB Syncronization")
         _print(f"ERROR: {e}")
 
-def temperatureDS18B20(deviceName):
-    id = deviceName.split("/")[5]
+def tir_temperatures(path_tir, package):
+    # temperatures.txt stays in the capture folder (TIR container) or is already inside the ZIP
+    for txt in glob.glob(os.path.join(path_tir, "*temperatures.txt")):
+        with open(txt, "r") as f:
+            return f.read()
+    if package.endswith(".zip") and os.path.exists(package):
+        with zipfile.ZipFile(package) as zipf:
+            for name in zipf.namelist():
+                if name.endswith("temperatures.txt"):
+                    return zipf.read(name).decode()
+    return ""
+
+def save_temperatures(sampler, datetime_folder, path_tir, package):
+    records = sampler.records(timeout=args.sensor_timeout)
+    sampler.stop()
+    rows = temp_series.sensor_rows(records)
     try:
-        f = open(sensor, "r")
-        data = f.read()
-        f.close()
-        if "YES" in data:
-            (discard, sep, reading) = data.partition(' t=')
-            tempVal = float(reading) / 1000.0
-        else:
-            tempVal = 999.9
+        rows = rows + temp_series.tir_rows(tir_temperatures(path_tir, package), datetime_folder)
     except Exception as e:
-        print(e)
-        pass
-
-    return id, tempVal
+        __print(f"ERROR reading the TIR camera temperatures: {e}")
+    metrics.record("temp_sensors", sensors=len(sampler.sensors), readings=len(records),
+                   invalid=sum(1 for record in records if record.temperature == w1_sampler.INVALID),
+                   retries=sum(record.attempts - 1 for record in records))
+    filename = temp_series.series_name(ID, datetime_folder, args.temp_series)
+    try:
+        temp_series.append(os.path.join(path_series_temp, filename), rows)
+        __print(f"{len(rows)} temperature values appended to {filename}")
+    except Exception as e:
+        __print(f"ERROR: Temperature series {filename} can't be written: {e}")
+    return len(records)
 
-def writeToFile(path_filetransfer_temp, datetime_folder): 
+def save_roi_summary(path_tir, datetime_name, datetime_folder):
+    # Region statistics of the tempRange frames: a few rows that reach GDrive long before the package.
+    # The day/month series only closes later, so every capture also gets its own file (GDrive type ROI)
+    roi_start = time.time()
     try:
-        timestamp = datetime_folder.strftime("%y%m%d_%H%M")
-        filename = ID + "_" + timestamp + "_Temp.txt"
-        writeTemp = open(os.path.join(path_filetransfer_temp, filename), 'w')
-        writer = csv.writer(writeTemp)
-        writer.writerow(['date', 'device', 'temperature'])
-        writeTemp.flush()
-        __print(f"Temperature file {filename} created in {os.path.basename(path_filetransfer_temp)} folder")
-    except:
-        __print(f"ERROR: Temperature file can't be created")
-    return writer, writeTemp, filename
+        summary = tir_roi.summarise_capture(path_tir, args.roi_file)
+        rows = tir_roi.rows(summary, datetime_folder)
+        filename = temp_series.series_name(ID, datetime_folder, args.temp_series, tir_roi.SERIES_KIND)
+        temp_series.append(os.path.join(path_series_temp, filename), rows)
+        temp_series.append(os.path.join(path_filetransfer_roi, f"{ID}_{datetime_name}_{tir_roi.SERIES_KIND}.txt"), rows)
+        metrics.record("tir_roi", time.time() - roi_start, rois=len(summary), frames=len(tir_roi.frame_paths(path_tir)))
+        for name, stats in summary.items():
+            _print(f"ROI {name}: mean {stats['T_mean']} - min {stats['T_min']} - max {stats['T_max']} - step {stats['T_step']}")
+    except Exception as e:
+        _print(f"ERROR: TIR region statistics")
+        _print(f"ERROR: {e}")
 
 if __name__ == "__main__":    
     try:   
         datetime_name, path_tir, datetime_folder = create_subfolder()
-        capture_thermal_images(path_tir)     
-        writer, writeTemp, filename = writeToFile(path_filetransfer_temp, datetime_folder)       
-        for sensor in glob.glob("/sys/bus/w1/devices/28-*/w1_slave"):
-            __print(f"Temp sensor {Path(sensor).parent.name} identified: Measuring temperatures")
-            try:
-                for i in range(ite):
-                    now = datetime.now()
-                    timestamp_txt = now.strftime("%Y-%m-%d_%H:%M:%S")
-                    device, temperature = temperatureDS18B20(sensor)
-                    writer.writerow([timestamp_txt, device, temperature])
-                    writeTemp.flush()
-                    time.sleep(1)
-            except Exception as e:
-                print(e)
-                pass
-        __print(f"Temperatures measured and file {filename} saved")
-        create_zip(datetime_name, path_tir)
+        # TIR camera and 1-Wire sensors are driven at the same time
+        sampler = w1_sampler.Sampler(args.w1_path, args.sensor_samples, args.sensor_period, args.sensor_retries).start()
+        capture_start = time.time()
+        tir_files = capture_thermal_images(datetime_name, path_tir)
+        tir_time = time.time() - capture_start
+        package = os.path.join(path_filetransfer_tir, f"{ID}_{datetime_name}_TIR.{args.format}")
+        metrics.record("tir_capture", tir_time, files=tir_files, bytes=os.path.getsize(package) if os.path.exists(package) else 0, format=args.format)
+        readings = save_temperatures(sampler, datetime_folder, path_tir, package)
+        save_roi_summary(path_tir, datetime_name, datetime_folder)
+        _print(f"Capture result: TIR {tir_files} files in {tir_time:.2f} s - {len(sampler.sensors)} temperature sensors, {readings} readings - {time.time() - capture_start:.2f} s in total")
         remove_folder(path_tir)
-        sync_folder(path_filetransfer_tir, ".zip")
-        sync_folder(path_filetransfer_temp, ".txt")
+        sync_folder(path_filetransfer_tir, f".{args.format}")
         _print(f"Code successfully completed in {time.time()-start_time:.2f} s")
 
     except Exception as e:
@@ -13,63 +13,105 @@ import time
 start_time = time.time()
 from datetime import datetime
 import os
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import MediaFileUpload, MediaIoBaseUpload, build_http
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build, build_from_document
+from googleapiclient import discovery_cache
 from googleapiclient.errors import HttpError
+from google_auth_httplib2 import AuthorizedHttp
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import threading
 import argparse
 import random
+import json
+import re
+import io
+import upload_journal
+import usb_mirror
+import upload_scheduler
+import log_shipper
+import drive_cache
+import metrics
+import quality_tags
+
+def chunk_kb(value):
+    size = int(value)
+    if size < 0 or size % 256:
+        raise argparse.ArgumentTypeError(f"{value} KB: 0 (adapted to the link) or a multiple of 256 KB")
+    return size
 
 parser = argparse.ArgumentParser(description='GDrive script to upload TIR images')
 parser.add_argument('--id', type=str, required=True, help='ID for the system')
-parser.add_argument('--filetype', type=str, required=True, choices=['LOG', 'RGB', 'TIR', 'TXT'], help='Tipo de archivo a subir (log, RGB_Images, TIR_Images, TXT_Temp)')
-args = parser.parse_args()
-BASE_PATH = '/home/pi'
+parser.add_argument('--filetype', type=str, nargs='+', default=['PRV', 'RGB', 'TIR', 'ROI', 'TXT', 'LOG'], choices=['LOG', 'PRV', 'RGB', 'TIR', 'ROI', 'TXT'], help='Tipo de archivo a subir (log, RGB previews, RGB_Images, TIR_Images, TIR ROI statistics, TXT_Temp)')
+parser.add_argument('--workers', type=int, default=3, help='Number of concurrent uploads')
+parser.add_argument('--api_endpoint', type=str, default=None, help='Root URL of a Drive stand-in (benchmarks)')
+parser.add_argument('--deadline', type=float, default=None, help='Epoch time by which the uploads must be finished (shutdown)')
+parser.add_argument('--chunk_size', type=chunk_kb, default=0, help='Chunk size of the resumable uploads in KB (multiple of 256, 0: adapted to the link)')
+args = parser.parse_args(globals().get("STAGE_ARGV"))  # STAGE_ARGV: arguments given by AI4Glaciers.py
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')
 
 ID = args.id
-dtype = args.filetype
+dtypes = args.filetype
+workers = max(1, args.workers)
+deadline = args.deadline
+scheduler = None
 
 SCOPES = ['https://www.googleapis.com/auth/drive']
-TOKEN_PATH = "/home/pi/scripts/token.json"
-CREDENTIALS_PATH = "/home/pi/scripts/credentials.json"
+TOKEN_PATH = os.path.join(BASE_PATH, "scripts/token.json")
+CREDENTIALS_PATH = os.path.join(BASE_PATH, "scripts/credentials.json")
 USB_PATH = os.path.join(BASE_PATH, "usb_stick")
+CHUNK_SIZE = args.chunk_size * 1024  # 0: upload_scheduler sizes every chunk from the measured link
+SESSION_RESTARTS = 2  # new resumable sessions for a file after its session expired, per cycle
+LOG_FILES = [os.path.join(BASE_PATH, log) for log in ["wittypi/wittyPi.log", "wittypi/schedule.log", "AI4G.log"]]
+
+# filetype: (FileTransfer folder, {extension: mime type})
+FILETYPES = {
+    'PRV': (os.path.join(BASE_PATH, f"{ID}_RGB_preview"), {".jpg": "image/jpg"}),
+    'RGB': (os.path.join(BASE_PATH, f"{ID}_RGB_filetransfer"), {".jpg": "image/jpg"}),
+    'TIR': (os.path.join(BASE_PATH, f"{ID}_TIR_filetransfer"), {".zip": "application/zip", ".tirc": "application/octet-stream"}),
+    'ROI': (os.path.join(BASE_PATH, f"{ID}_TIR_roi"), {".txt": "text/plain"}),
+    'TXT': (os.path.join(BASE_PATH, f"{ID}_TEMP_filetransfer"), {".txt": "text/plain"})}
 
-def _print(message):
+_thread_local = threading.local()
+_print_lock = threading.Lock()
+
+def _print(message, dtype="ALL"):
     current_time = datetime.now()
     formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
-    print(f"{formatted_time} :: GDrive_{dtype} :: {message}")
+    with _print_lock:
+        print(f"{formatted_time} :: GDrive_{dtype} :: {message}", flush=True)
 
 def gdrive_parent():
-    GDrive_parents = {
-    'GPM01': ['1SLzhGyupTPCfIizgmZMY2fgN2h9hjEIg'],
-    'GPM02': ['1-8xAEW3ruXRWxyGtj0YuSGR1J3dBP8vs'],
-    'GPM03': ['1UoN3C_vs46xHTpt_2aInWO-lCgL7jQfR'],
-    'GPM04': ['1BMrQIb6QzQz7M5hq2JGBoMUBddX7fn5H'],
-    'GPM05': ['1LYKhP7VfApcbr2gLmoBnNAO9H0YmRtEV'],
-    'GPM06': ['1poLnFssMt_FHmnn1UCfsbEbyiuk_b6EZ'],
-    'GPM07': ['1ENCerFyDZZOLPZxkLumB2XrWl0kOXKcM'],
-    'GPM08': ['1Kd38xGspSFZgzLzQnKFVCP4UZsyEbvQx'],
-    'GPM_Dresden': ['11LaYOWSchllfphGBMLj-KEuZZ608TTEO']}
-    return GDrive_parents[ID]
+    return [drive_cache.STATION_FOLDERS[ID]]
 
 def log_in_google():
     creds = None
     if os.path.exists(TOKEN_PATH):
         creds = Credentials.from_authorized_user_file(TOKEN_PATH, SCOPES)
-    if not creds or not creds.valid:
-        if creds and creds.expired and creds.refresh_token:
-            creds.refresh(Request())
-        else:
-            flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
-            creds = flow.run_local_server(port=0) 
-    with open(TOKEN_PATH, "w") as token:
-      token.write(creds.to_json())
+    if creds and creds.refresh_token and drive_cache.needs_refresh(creds, deadline):
+        # Refreshed only if the access token would expire before the end of the uploads
+        creds.refresh(Request())
+        drive_cache.save_token(creds, TOKEN_PATH)
+        _print("Google Drive access token refreshed")
+    elif not creds or not (creds.valid or creds.refresh_token):
+        flow = InstalledAppFlow.from_client_secrets_file(CREDENTIALS_PATH, SCOPES)
+        creds = flow.run_local_server(port=0) 
+        drive_cache.save_token(creds, TOKEN_PATH)
     if creds is not None:
         _print("Logging in Google Drive API succesfully")
     return creds
 
+def drive_service(creds):
+    if args.api_endpoint is None:
+        return build("drive", "v3", credentials=creds)
+    # Same discovery document with another root URL: the API, upload and batch paths all follow it
+    document = json.loads(discovery_cache.get_static_doc("drive", "v3"))
+    document["rootUrl"] = args.api_endpoint
+    document["baseUrl"] = args.api_endpoint + document["servicePath"]
+    return build_from_document(document, credentials=creds)
+
 def create_folders(path):
     try:
         os.makedirs(path, exist_ok = True)
@@ -77,159 +119,334 @@ def create_folders(path):
     except Exception as e:
         _print(f"ERROR creating folder {os.path.basename(path)}: {e}")  
 
-def exponential_backoff_retry(function, retries=5, initial_wait=1):
+def drive_http(creds):
+    # httplib2 is not thread-safe: every worker keeps its own connection over the shared credentials.
+    # build_http() does not follow 308: the resumable upload answers 308 (without Location) to every chunk
+    if getattr(_thread_local, "http", None) is None:
+        _thread_local.http = AuthorizedHttp(creds, http=build_http())
+    return _thread_local.http
+
+def exponential_backoff_retry(function, retries=5, initial_wait=1, dtype="ALL"):
     for attempt in range(retries):
         try:
             return function()
-        except HttpError as error:
-            if error.resp.status in [500, 503]:
-                wait_time = initial_wait * (2 ** attempt) + random.uniform(0, 1)
-                _print(f"Retrying after {wait_time:.2f}s due to {error}")
-                time.sleep(wait_time)
-            else:
-                raise 
+        except (HttpError, ConnectionError, TimeoutError) as error:
+            # Connection dropped or timed out (lossy link): as transient as a 500/503
+            if isinstance(error, HttpError) and error.resp.status not in [500, 503]:
+                raise
+            _thread_local.retries = getattr(_thread_local, "retries", 0) + 1
+            wait_time = initial_wait * (2 ** attempt) + random.uniform(0, 1)
+            _print(f"Retrying after {wait_time:.2f}s due to {error!r}", dtype)
+            if not scheduler.sleep(wait_time):
+                raise Exception("Upload deadline reached while waiting to retry")
     raise Exception(f"Failed after {retries} attempts")
 
-def resumable_upload(service, file_path, file_metadata):
-    media = MediaFileUpload(file_path, mimetype=mime_type, resumable=True)
+def chunk_size():
+    return CHUNK_SIZE or scheduler.chunk_size()
+
+class ChunkedFileUpload(MediaFileUpload):
+    # next_chunk() reads chunksize() several times for every chunk: `chunk` is set before each one
+    # and not changed while it is sent. Every chunk is sent as bytes instead of a slice of the open
+    # file: when a connection drops, httplib2 sends the request again, and a slice already read would
+    # leave it waiting for the timeout
+    def __init__(self, filename, mimetype, chunk):
+        super().__init__(filename, mimetype=mimetype, chunksize=chunk, resumable=True)
+        self.chunk = chunk
+
+    def chunksize(self):
+        return self.chunk
+
+    def has_stream(self):
+        return False
+
+class SessionExpired(Exception):
+    pass
+
+def session_status(http, session_uri, size):
+    """Status query of a resumable session (empty PUT with Content-Range: bytes */size).
+    Return (confirmed bytes, file metadata if the upload already finished)."""
+    resp, content = http.request(session_uri, "PUT", headers={"Content-Range": f"bytes */{size}", "Content-Length": "0"})
+    if resp.status in [200, 201]:
+        return size, json.loads(content)
+    if resp.status == 308:
+        match = re.match(r"bytes=0-(\d+)", resp.get("range", ""))
+        return (int(match.group(1)) + 1 if match else 0), None
+    raise HttpError(resp, content, uri=session_uri)
+
+def resumable_upload(service, creds, file_path, file_metadata, mime_type, dtype="ALL"):
+    for _ in range(SESSION_RESTARTS + 1):
+        if scheduler.expired():
+            _print(f"Upload deadline reached: {file_metadata['name']} will be uploaded next cycle", dtype)
+            return None
+        try:
+            return upload_session(service, creds, file_path, file_metadata, mime_type, dtype)
+        except SessionExpired:
+            _print(f"Resumable session of {file_metadata['name']} expired. Upload restarted", dtype)
+            upload_journal.reset_session(journal, file_path)
+    _print(f"ERROR: {SESSION_RESTARTS + 1} resumable sessions of {file_metadata['name']} expired. It will be uploaded next cycle", dtype)
+    return None
+
+def upload_session(service, creds, file_path, file_metadata, mime_type, dtype="ALL"):
+    """Upload through the journal's resumable session (or a new one). Raise SessionExpired if GDrive forgot it."""
+    entry = upload_journal.start_entry(journal, file_path)
+    if entry["state"] == upload_journal.UPLOADED:
+        _print(f"{file_metadata['name']} already confirmed in GDrive with id {entry['file_id']}. Upload skipped", dtype)
+        return {"id": entry["file_id"], "name": entry["name"]}
+
+    media = ChunkedFileUpload(file_path, mime_type, chunk_size())
     request = service.files().create(body=file_metadata, media_body=media, fields="id, name, mimeType")
-    response = None
+    http = drive_http(creds)
+    response, failed = None, False
+    if entry["session_uri"]:
+        # Session from a previous boot: ask GDrive for the confirmed offset before sending more bytes
+        try:
+            offset, response = exponential_backoff_retry(lambda: session_status(http, entry["session_uri"], entry["size"]), dtype=dtype)
+        except HttpError as error:
+            if error.resp.status in [404, 410]:
+                raise SessionExpired()
+            _print(f"Unexpected error during upload: {error}", dtype)
+            return None
+        except Exception as e:
+            _print(f"Unexpected error during upload: {e}", dtype)
+            return None
+        request.resumable_uri = entry["session_uri"]
+        request.resumable_progress = offset
+        _print(f"{file_metadata['name']} upload resumed from byte {offset}", dtype)
+
     while response is None:
+        if scheduler.expired():
+            _print(f"Upload deadline reached: {file_metadata['name']} paused at byte {request.resumable_progress}. It will resume next cycle", dtype)
+            return None
         try:
-            status, response = exponential_backoff_retry(lambda: request.next_chunk())
+            media.chunk = chunk_size()
+            sent_before, chunk_start = request.resumable_progress, time.time()
+            # After an error next_chunk() queries the session status first; the first chunk starts the session
+            round_trips = 2 if failed or request.resumable_uri is None else 1
+            failed = True  # until next_chunk() returns
+            retries_before = getattr(_thread_local, "retries", 0)
+            status, response = exponential_backoff_retry(lambda: request.next_chunk(http=http), dtype=dtype)
+            failed = False
+            seconds = time.time() - chunk_start
+            sent = (entry["size"] if response else request.resumable_progress) - sent_before
+            scheduler.record_chunk(sent, seconds, round_trips, getattr(_thread_local, "retries", 0) - retries_before)
             if status:  # Upload is in progress
-                _print(f"Upload progress: {int(status.progress() * 100)}%")
+                upload_journal.record_session(journal, file_path, request.resumable_uri, request.resumable_progress)
+                rate = f"{sent / 1024 / seconds:.1f} KB/s"
+                _print(f"{file_metadata['name']} upload progress: {int(status.progress() * 100)}% "
+                       f"({rate}, {media.chunk // 1024} KB chunks, RTT {scheduler.rtt:.2f} s)", dtype)
         except HttpError as error:
+            if error.resp.status in [404, 410] and request.resumable_uri:  # Expired resumable session
+                raise SessionExpired()
+            if error.resp.status == 404:
+                drive_cache.forget_parent(cache, file_metadata["parents"][0])
             if error.resp.status in [404, 403]:  # Permanent errors
                 raise Exception(f"Upload failed due to permission or file not found: {error}")
-            _print(f"Temporary error during upload: {error}. Retrying...")
+            _print(f"Temporary error during upload: {error}. Retrying...", dtype)
         except Exception as e:
-            _print(f"Unexpected error during upload: {e}")
+            _print(f"Unexpected error during upload: {e}", dtype)
             return None
     
     # After completion, `response` contains file metadata
     if response:
-        _print(f"{response.get('name')} succesfully uploaded with id {response.get('id')}")
+        upload_journal.mark_uploaded(journal, file_path, response.get('id'))
+        drive_cache.remember_file(cache, file_metadata["parents"][0], file_metadata["name"], response.get('id'), entry["size"])
+        _print(f"{response.get('name')} succesfully uploaded with id {response.get('id')}", dtype)
     return response
 
-def corrupted_file(file_path):
+def corrupted_file(file_path, dtype="ALL"):
     if not os.path.exists(file_path) or os.path.getsize(file_path) == 0:
-        _print(f"Invalid or empty file: {file_path}")
+        _print(f"Invalid or empty file: {file_path}", dtype)
         return True
     return False
 
-def google_upload(creds, parent):
+def list_pending(dtype):
+    path_filetransfer, mime_types = FILETYPES[dtype]
+    file_type = "/".join(mime_types)
     try:
-        files = [f for f in os.listdir(path_filetransfer) if f.endswith(file_type)]
-        if not files:
-            _print(f"No {file_type} files in the FileTransfer folder")
-            return
-            
-        _print(f'{len(files)} {file_type} files in the FileTransfer folder. The upload will start:')
-        service = build("drive", "v3", credentials=creds)
- 
-        for file in files:                       
-            file_path = os.path.join(path_filetransfer, file)
-            if corrupted_file(file_path):
+        files = [f for f in os.listdir(path_filetransfer) if f.endswith(tuple(mime_types))]
+    except Exception as e:
+        _print(f"ERROR listing {os.path.basename(path_filetransfer)}: {e}", dtype)
+        return []
+    if not files:
+        _print(f"No {file_type} files in the FileTransfer folder", dtype)
+    else:
+        _print(f'{len(files)} {file_type} files in the FileTransfer folder. The upload will start:', dtype)
+    return files
+
+def upload_file(service, creds, parent, dtype, file):
+    path_filetransfer, mime_types = FILETYPES[dtype]
+    mime_type = mime_types[os.path.splitext(file)[1]]
+    file_path = os.path.join(path_filetransfer, file)
+    if corrupted_file(file_path, dtype):
+        return
+    file_metadata = {"parents": parent, "name":  file}
+    upload_start, size, file_gdrive = time.time(), os.path.getsize(file_path), None
+    _thread_local.retries = 0
+    try:
+        file_gdrive = resumable_upload(service, creds, file_path, file_metadata, mime_type, dtype)
+        delete_uploaded_file(file_gdrive, file, file_path, dtype)
+    except Exception as e:
+        _print(f"Critical error while uploading {file_path}: {e}", dtype)
+    metrics.record("upload", time.time() - upload_start, dtype=dtype, name=file, bytes=size,
+                   retries=_thread_local.retries, ok=bool(file_gdrive and file_gdrive.get("id")))
+
+def upload_jobs(dtypes):
+    jobs, dropped = [], 0
+    for dtype in dtypes:
+        if dtype == 'LOG':
+            files = [(log, os.path.basename(log)) for log in LOG_FILES if log_shipper.pending_bytes(log_state, log) > 0]
+        elif dtype in FILETYPES:
+            files = [(os.path.join(FILETYPES[dtype][0], file), file) for file in list_pending(dtype)]
+        else:
+            continue
+        for path, name in files:
+            tag = quality_tags.get_tag(quality, name) if dtype == 'RGB' else None
+            if tag == quality_tags.DROP:
+                dropped += 1  # Kept on the USB stick only
                 continue
-                
-            file_metadata = {"parents": parent, "name":  file}            
             try:
-                file_gdrive = resumable_upload(service, file_path, file_metadata)
-                delete_uploaded_file(file_gdrive, file, file_path)
-            except Exception as e:
-                _print(f"Critical error while uploading {file_path}: {e}")
-    except:
-        _print("Error")     
-                
-def upload_logs_core(creds, file_path, new_name, parent):
-    try:
-        service = build("drive", "v3", credentials=creds)
-        media = MediaFileUpload(file_path, mimetype='text/plain')
+                stat = os.stat(path)
+            except OSError:
+                continue
+            if dtype == 'LOG':
+                sent = stat.st_size - log_shipper.pending_bytes(log_state, path)
+            else:
+                entry = upload_journal.get_entry(journal, path)
+                sent = entry["offset"] if entry and entry["size"] == stat.st_size else 0
+            jobs.append({'dtype': dtype, 'name': name, 'path': path, 'bytes': stat.st_size - sent, 'mtime': stat.st_mtime,
+                         'deferred': tag == quality_tags.DEFER})
+    if dropped:
+        _print(f"{dropped} RGB images dropped by the quality gate are not uploaded", 'RGB')
+    return jobs
 
-        query = f"name='{new_name}' and '{parent[0]}' in parents and trashed=false"
-        results = service.files().list(q=query, spaces='drive', fields='files(id, name)').execute()
-        items = results.get('files', [])
+def upload_worker(service, creds, parent):
+    while True:
+        job = scheduler.next_job()
+        if job is None:
+            return
+        if job['dtype'] == 'LOG':
+            upload_logs(service, creds, parent, job['path'])
+        else:
+            upload_file(service, creds, parent, job['dtype'], job['name'])
 
-        if items:
-            file_id = items[0]['id']
-            try:
-                file_metadata = {'name': new_name, "addParents": parent[0]}
-                updated_file = service.files().update(fileId=file_id, body=file_metadata, media_body=media).execute()
-                _print(f'File ID: {updated_file.get("id")} overwritted')
-            except:
-                file_metadata = {"parents": parent, "name":  new_name}
-                updated_file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-                _print(f'File ID: {updated_file.get("id")} uploaded')
+def check_interrupted(service, creds, parent, jobs):
+    """One batch request: verify the parent folder (once a day) and look for the files whose upload
+    was interrupted in a previous boot, in case it finished in GDrive before the power was cut."""
+    interrupted = [job for job in jobs if job['dtype'] != 'LOG' and
+                   (upload_journal.get_entry(journal, job['path']) or {}).get("state") == upload_journal.UPLOADING]
+    check_parent = not drive_cache.parent_checked(cache, parent[0])
+    if not interrupted and not check_parent:
+        return jobs
+    found, parent_ok = drive_cache.batch_lookup(service, drive_http(creds), cache, parent[0], [job['name'] for job in interrupted], check_parent)
+    if parent_ok is False:
+        raise Exception(f"GDrive folder {parent[0]} not found")
+    remaining = []
+    for job in jobs:
+        remote = found.get(job['name'])
+        if remote and remote["size"] == os.path.getsize(job['path']):
+            _print(f"{job['name']} already complete in GDrive with id {remote['id']}. Upload skipped", job['dtype'])
+            upload_journal.mark_uploaded(journal, job['path'], remote["id"])
+            delete_uploaded_file(remote, job['name'], job['path'], job['dtype'])
         else:
-            file_metadata = {"parents": parent, "name":  new_name}
-            updated_file = service.files().create(body=file_metadata, media_body=media, fields="id").execute()
-            _print(f'File ID: {updated_file.get("id")} uploaded')
+            remaining.append(job)
+    return remaining
 
+def google_upload(service, creds, parent, dtypes):
+    global scheduler
+    jobs = upload_jobs(dtypes)
+    if not jobs:
+        return
+    try:
+        jobs = check_interrupted(service, creds, parent, jobs)
     except HttpError as error:
-        _print(f"ERROR: An error occurred: {error}")
+        _print(f"ERROR: GDrive metadata check failed: {error}")
+    scheduler = upload_scheduler.UploadScheduler(jobs, deadline)
+    if deadline is None:
+        _print(f"{len(jobs)} files will be uploaded with {workers} concurrent uploads")
+    else:
+        _print(f"{len(jobs)} files will be uploaded with {workers} concurrent uploads - {upload_scheduler.time_left(deadline):.0f} s before shutdown")
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = [pool.submit(upload_worker, service, creds, parent) for _ in range(workers)]
+            for future in as_completed(futures):
+                try:
+                    future.result()
+                except Exception as e:
+                    _print(f"ERROR: Upload worker failed: {e}")
+    finally:
+        scheduler.close()
 
-def upload_logs(creds, parent, log):
-    
-    current_month_year = datetime.now().strftime("%b%y")  # Formato "nov24", "dec24", etc.
-    log_name_with_date = f"{os.path.splitext(os.path.basename(log))[0]}_{current_month_year}{os.path.splitext(log)[1]}"
-    _print(f"Uploading {os.path.basename(log)} as {log_name_with_date} to GDrive:")
+def upload_logs(service, creds, parent, log):
+    # Only the lines written since the last confirmed segment are sent (see log_shipper)
+    http = drive_http(creds)
+    while not scheduler.expired():
+        try:
+            segment = log_shipper.next_segment(log_state, log)
+            if segment is None:
+                return
+            media = MediaIoBaseUpload(io.BytesIO(segment["data"]), mimetype='application/gzip', resumable=False)
+            file_metadata = {"parents": parent, "name": segment["name"]}
+            request = service.files().create(body=file_metadata, media_body=media, fields="id")
+            upload_start = time.time()
+            _thread_local.retries = 0
+            uploaded = exponential_backoff_retry(lambda: request.execute(http=http), dtype="LOG")
+            scheduler.record(len(segment["data"]), time.time() - upload_start)
+            metrics.record("upload", time.time() - upload_start, dtype="LOG", name=segment["name"], bytes=len(segment["data"]),
+                           raw_bytes=segment["end"] - segment["start"], retries=_thread_local.retries, ok=True)
+            log_shipper.commit(log_state, log, segment)
+            _print(f"{os.path.basename(segment['source'])}: bytes {segment['start']}-{segment['end']} uploaded as {segment['name']} "
+                   f"({len(segment['data']) / 1024:.1f} KB) with id {uploaded.get('id')}", "LOG")
+        except Exception as e:
+            _print(f"ERROR: Not {os.path.basename(log)} uploaded", "LOG")
+            _print(f"ERROR: {e}", "LOG")
+            return
+
+def usb_manifest_forget(file):
+    conn = usb_mirror.open_manifest()
     try:
-        file_id = upload_logs_core(creds, log, log_name_with_date, parent)
-    except Exception as e:
-        _print(f"ERROR: Not {os.path.basename(log)} uploaded")
-        _print(f"ERROR: {e}")
+        usb_mirror.forget(conn, file)
+    finally:
+        conn.close()
 
-def delete_uploaded_file(file_gdrive, file, file_path):
+def delete_uploaded_file(file_gdrive, file, file_path, dtype="ALL"):
     usb_file = os.path.join(USB_PATH, file)
     if file_gdrive and file_gdrive.get("id"):
-        try:
-            os.remove(usb_file)
-            _print(f"File {os.path.basename(file)} removed from USB stick")
-        except:
-            _print(f"ERROR: File {os.path.basename(file)} NOT removed from USB stick")
+        if dtype not in ('PRV', 'ROI'):  # Previews and ROI files are not copied to the USB stick (the ROI series is)
+            try:
+                os.remove(usb_file)
+                usb_manifest_forget(file)
+                _print(f"File {os.path.basename(file)} removed from USB stick", dtype)
+            except:
+                _print(f"ERROR: File {os.path.basename(file)} NOT removed from USB stick", dtype)
         try:
             os.remove(file_path)
-            _print(f"File {os.path.basename(file)} removed from main folder")
+            upload_journal.remove_entry(journal, file_path)
+            quality_tags.forget(quality, file)
+            _print(f"File {os.path.basename(file)} removed from main folder", dtype)
         except:
-            _print(f"ERROR: File {os.path.basename(file)} NOT removed from main folder")
+            _print(f"ERROR: File {os.path.basename(file)} NOT removed from main folder", dtype)
     else:
-        _print(f'Comprovation in GDrive failed: {os.path.basename(file_path)} will remain on USB stick')
+        _print(f'Comprovation in GDrive failed: {os.path.basename(file_path)} will remain on USB stick', dtype)
         
 if __name__ == "__main__":
     try:
         parent = gdrive_parent()
         creds = log_in_google()
-         
-        if dtype.lower() == 'rgb':
-            path_filetransfer = os.path.join(BASE_PATH, f"{ID}_RGB_filetransfer")
-            file_type = ".jpg"
-            mime_type="image/jpg"
-            google_upload(creds, parent)      
-        
-        elif dtype.lower() == 'tir':
-            path_filetransfer = os.path.join(BASE_PATH, f"{ID}_TIR_filetransfer")
-            file_type = ".zip"
-            mime_type="application/zip"
-            google_upload(creds, parent)
-        
-        elif dtype.lower() == 'txt':
-            path_filetransfer = os.path.join(BASE_PATH, f"{ID}_TEMP_filetransfer")
-            file_type = ".txt"
-            mime_type="text/plain"
-            google_upload(creds, parent)
-        
-        elif dtype.lower() == 'log':
-            file_type = ".log"
-            mime_type="text/plain"
-            upload_logs(creds, parent, "/home/pi/wittypi/wittyPi.log")
-            upload_logs(creds, parent, "/home/pi/wittypi/schedule.log")
-            upload_logs(creds, parent, "/home/pi/AI4G.log")
-
-        else:
-            _print("ERROR: Provide a valid type of file")
-            exit(0)
-      
+        token_before = creds.token
+        cache = drive_cache.open_cache()
+        journal = upload_journal.open_journal()
+        log_state = log_shipper.open_state()
+        quality = quality_tags.open_quality()
+        pruned = upload_journal.prune_missing(journal)
+        if pruned:
+            _print(f"Upload journal: {pruned} entries without local file removed")
+        pruned = quality_tags.prune_missing(quality, FILETYPES['RGB'][0])
+        if pruned:
+            _print(f"Quality tags: {pruned} entries without local file removed")
+        service = drive_service(creds)
+        google_upload(service, creds, parent, dtypes)
+        if drive_cache.save_token_if_changed(creds, TOKEN_PATH, token_before):
+            _print("Google Drive access token refreshed during the uploads and saved")
         _print(f"Code successfully completed in {time.time()-start_time:.2f} s")
 
     except Exception as e:
@@ -15,7 +15,8 @@ import os
 import argparse
 import time
 import subprocess
-FLAG_FILE = "/home/pi/1.flag"
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')
+FLAG_FILE = os.path.join(BASE_PATH, "1.flag")
 
 def unmount_usb(mount_point):
     try:
@@ -57,8 +58,8 @@ if __name__ == "__main__":
     now = datetime.now()
     parser = argparse.ArgumentParser(description="Shutdown script with optional force mode")
     parser.add_argument("--force", action="store_true", help="Force shutdown even in maintenance mode")
-    args = parser.parse_args()
-    unmount_usb('/home/pi/usb_stick')
+    args = parser.parse_args(globals().get("STAGE_ARGV"))  # STAGE_ARGV: arguments given by AI4Glaciers.py
+    unmount_usb(os.path.join(BASE_PATH, 'usb_stick'))
 
     if args.force:
         _print("--force command recieved. Shutdown will be forced now")
@@ -0,0 +1,226 @@
+##############################################################################################
+# AI4Glaciers: Orchestrator that runs every stage of a wake cycle in a single interpreter    #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+import time
+start_time = time.time()
+import os
+import sys
+import runpy
+import argparse
+import threading
+import subprocess
+from datetime import datetime
+import metrics
+
+SCRIPTS_PATH = os.path.dirname(os.path.abspath(__file__))
+RGB_MINUTES = ["00", "01", "02", "03", "30", "31", "32", "33"]
+SHUTDOWN_MARGIN = 60
+stage_times = []
+late_stages = []  # (script, thread) of the capture stages still running after their timeout
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: IA4Glaciers :: {message}", flush=True)
+
+def run_stage(script, *arguments):
+    # Each stage keeps its own command line interface; it runs in this interpreter so the
+    # Python start-up and the heavy imports (googleapiclient, RPi.GPIO, sh) are paid only once.
+    # The arguments go in STAGE_ARGV (not sys.argv) so two stages can run at the same time.
+    stage_start = time.time()
+    ok = True
+    try:
+        runpy.run_path(os.path.join(SCRIPTS_PATH, script), init_globals={"STAGE_ARGV": list(arguments)}, run_name="__main__")
+    except SystemExit as e:
+        if e.code not in (None, 0):
+            ok = False
+            _print(f"ERROR: Stage {script} exited with code {e.code}")
+    except Exception as e:
+        ok = False
+        _print(f"ERROR: Stage {script} failed")
+        _print(f"ERROR: {e}")
+    finally:
+        sys.stdout.flush()
+    elapsed = time.time() - stage_start
+    stage_times.append((script, elapsed))
+    metrics.record("stage", elapsed, script=script, ok=ok)
+    _print(f"Stage {script} finished in {elapsed:.2f} s")
+    return ok, elapsed
+
+def run_stages_parallel(stages):
+    """Run [(script, timeout, arguments)] at the same time and wait for each up to its timeout."""
+    group_start = time.time()
+    results = {}
+    threads = []
+    for script, timeout, arguments in stages:
+        thread = threading.Thread(target=lambda s=script, a=arguments: results.update({s: run_stage(s, *a)}), daemon=True)
+        thread.start()
+        threads.append((script, timeout, thread))
+    for script, timeout, thread in threads:
+        thread.join(max(0, group_start + timeout - time.time()))
+        if thread.is_alive():
+            _print(f"ERROR: Stage {script} still running after {timeout} s - the next stages will wait for it")
+            late_stages.append((script, thread))
+    record = " - ".join(f"{script}: {'OK' if results[script][0] else 'ERROR'} in {results[script][1]:.2f} s" if script in results else f"{script}: TIMEOUT"
+                        for script, _, _ in stages)
+    elapsed = time.time() - group_start
+    stage_times.append(("capture (parallel)", elapsed))
+    metrics.record("capture", elapsed, stages={script: results[script][0] if script in results else "timeout" for script, _, _ in stages})
+    _print(f"Capture result :: {record} :: {elapsed:.2f} s in total")
+    return results
+
+def wait_late_stages(stage, until):
+    # A stage running in this interpreter cannot be killed: the uploads and the shutdown wait for it
+    # (up to `until`) so that they do not work on files the stage is still writing
+    for script, thread in list(late_stages):
+        _print(f"Stage {stage} waiting for {script} (still running after its timeout)")
+        thread.join(max(0, until - time.time()))
+        if thread.is_alive():
+            _print(f"ERROR: Stage {script} still running - {stage} starts anyway")
+        else:
+            _print(f"Stage {script} finished late - {stage} starts")
+            late_stages.remove((script, thread))
+
+def time_of_day():
+    stage_start = time.time()
+    try:
+        day_night = runpy.run_path(os.path.join(SCRIPTS_PATH, "0_day_night.py"))
+        result = day_night["is_day_or_night"]()
+    except Exception as e:
+        _print("ERROR: Day/night detection failed. Daylight assumed")
+        _print(f"ERROR: {e}")
+        result = "day"
+    stage_times.append(("0_day_night.py", time.time() - stage_start))
+    metrics.record("day_night", time.time() - stage_start, result=result)
+    return result
+
+def check_internet():
+    for host in ["google.com", "cloudflare.com"]:
+        if subprocess.call(["ping", "-q", "-c", "1", "-W", "1", host], stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL) == 0:
+            return True
+    return False
+
+def wait_internet(timeout):
+    end_wait = time.time() + timeout
+    while time.time() < end_wait:
+        if check_internet():
+            return True
+    return False
+
+def boot_time():
+    try:
+        with open("/proc/uptime", "r") as f:
+            return time.time() - float(f.read().split()[0])
+    except Exception:
+        return start_time
+
+def report_stages():
+    for script, elapsed in stage_times:
+        _print(f"Timing :: {script}: {elapsed:.2f} s")
+    _print(f"Timing :: Total wake cycle: {time.time() - start_time:.2f} s")
+    metrics.record("cycle", time.time() - start_time, since_boot=round(time.time() - boot_time(), 3))
+
+def main(ID, thermal, backup, num, workers, flag_wait, window, rgb_timeout=240, tir_timeout=180):
+    rgb = False
+    metrics.start_cycle(boot_time())
+    _print("******************************************")
+    _print(f"New instance started: ID = {ID}")
+
+    current_hour = datetime.now().strftime("%H")
+    if time_of_day() == "night":
+        _print(f"Current time ({current_hour} UTC) is in night range")
+        if not thermal:
+            _print("Night time - TIR Camera not avilable, executing shutdown...")
+            report_stages()
+            run_stage("5_shutdown.py", "--force")
+            return
+        _print("Night time - TIR Camera available, skipping shutdown")
+    else:
+        _print(f"Current time ({current_hour} UTC) is in daylight range")
+        rgb = True
+
+    current_minute = datetime.now().strftime("%M")
+    capture_images = current_minute in RGB_MINUTES
+    maintenance = not capture_images
+    if capture_images:
+        _print(f"Started at RGB minute ({current_minute}): Images will be taken")
+    else:
+        _print(f"Started at a maintenance minute ({current_minute}). No images will be captured")
+
+    run_stage("1_maintenance.py", f"--id={ID}", f"--backup={backup}", f"--thermal={str(thermal).lower()}")
+
+    capture_stages = []
+    if capture_images and rgb:
+        _print("RGB Camera module active")
+        capture_stages.append(("2_RGB_images.py", rgb_timeout, [f"--id={ID}", f"--num={num}"]))
+
+    if capture_images and thermal:
+        _print("Thermal Camera module active")
+        subprocess.call(["sudo", "dtoverlay", "w1-gpio", "gpiopin=27", "pullup=0"])
+        capture_stages.append(("3_TIR_Images.py", tir_timeout, [f"--id={ID}"]))
+
+    if capture_stages:
+        # DSLR, TIR camera and temperature sensors are independent devices: they work at the same time
+        run_stages_parallel(capture_stages)
+
+    internet = check_internet()
+    if internet:
+        _print("Internet connection detected - GDrive scripts will be executed")
+    else:
+        _print("No internet connection - GDrive scripts will be skipped")
+
+    if maintenance and not internet:
+        _print("System is in uploading mode - Waiting up to 180 seconds for internet connection")
+        internet = wait_internet(180)
+        if internet:
+            _print("Internet connection detected")
+        else:
+            _print("No internet connection after 180 seconds - GDrive scripts will be skipped")
+
+    if internet:
+        # The WittyPi cuts the power `window` seconds after the boot: uploads must end before that
+        # (minus the flag-file wait and a margin for the shutdown)
+        reserve = (flag_wait if maintenance else 0) + SHUTDOWN_MARGIN
+        deadline = boot_time() + window - reserve
+        filetypes = ["PRV", "RGB", "TIR", "ROI", "TXT", "LOG"] if thermal else ["PRV", "RGB", "LOG"]
+        wait_late_stages("4_GDrive.py", deadline)
+        run_stage("4_GDrive.py", f"--id={ID}", "--filetype", *filetypes, f"--workers={workers}", f"--deadline={deadline:.0f}")
+
+    if maintenance:
+        _print(f"Maintenance mode allowed - Waiting {flag_wait} seconds for a flag file")
+        time.sleep(flag_wait)
+    else:
+        _print("Maintenance mode not allowed - Force shutdown")
+    wait_late_stages("5_shutdown.py", boot_time() + window - SHUTDOWN_MARGIN)
+    report_stages()
+    run_stage("5_shutdown.py")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Orchestrator for a complete AI4Glaciers wake cycle')
+    parser.add_argument('--id', type=str, required=True, help='ID for the system')
+    parser.add_argument('--thermal', type=str, default='false', help='Thermal camera?')
+    parser.add_argument('--backup', type=int, default=5, help='Threshold in days for backup file deletion')
+    parser.add_argument('--num', type=int, default=2, help='Number of burst images')
+    parser.add_argument('--workers', type=int, default=3, help='Number of concurrent uploads')
+    parser.add_argument('--flag_wait', type=int, default=90, help='Seconds to wait for a maintenance flag file')
+    parser.add_argument('--window', type=int, default=1500, help='Seconds the WittyPi keeps the system on (ON M25 = 1500)')
+    parser.add_argument('--rgb_timeout', type=int, default=240, help='Seconds to wait for the RGB capture stage')
+    parser.add_argument('--tir_timeout', type=int, default=180, help='Seconds to wait for the TIR capture stage')
+    args = parser.parse_args()
+    try:
+        main(args.id, args.thermal.lower() == 'true', args.backup, args.num, args.workers, args.flag_wait, args.window,
+             args.rgb_timeout, args.tir_timeout)
+    except Exception as e:
+        _print("ERROR: Main code error")
+        _print(f"ERROR: {e}")
+        wait_late_stages("5_shutdown.py", boot_time() + args.window - SHUTDOWN_MARGIN)
+        report_stages()
+        run_stage("5_shutdown.py")
@@ -0,0 +1,85 @@
+##############################################################################################
+# camera_session: Benchmark of the DSLR cycle (gphoto2 process per command vs one session)   #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/camera_session.py --workdir /home/pi/bench --cycles 3
+# Both runs use camera_backends.FakeCamera with the same latencies. The "cli" run pays the USB
+# detect/claim on every command and keeps the old erase-all / get-all / rename passes.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+from datetime import datetime
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import camera_session
+import camera_backends
+
+class FakeCliCamera(camera_backends.FakeCamera):
+    """FakeCamera driven like the gphoto2 command line: erase + capturetarget, get-all, rename."""
+
+    def __init__(self, **kwargs):
+        super().__init__(per_command=True, **kwargs)
+
+    def prepare(self):
+        self._command()  # --delete-all-files
+        self._command()  # capturetarget=1
+
+    def download(self, path, names):
+        downloaded = super().download(path, [name for name, _ in self.captured])
+        files = []
+        for file_path, filename in zip(sorted(downloaded), names):
+            os.rename(file_path, os.path.join(path, filename))
+            files.append(os.path.join(path, filename))
+        return files
+
+def cycle(backend, path, num):
+    session = camera_session.CameraSession(backend, ready_timeout=30, files_timeout=30)
+    start = time.monotonic()
+    session.power_on()
+    session.wait_ready()
+    session.prepare()
+    session.capture_at(int(time.time() % 60), num)
+    session.wait_files(num)
+    timestamp = datetime.now().strftime("%y%m%d_%H%M")
+    files = session.download(path, [f"BENCH_{timestamp}_{n}.jpg" for n in range(1, num + 1)])
+    session.power_off()
+    elapsed = time.monotonic() - start
+    session.report()
+    return elapsed, files
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the DSLR capture cycle with a fake camera')
+    parser.add_argument('--workdir', type=str, required=True, help='Folder on the storage to measure (SD card)')
+    parser.add_argument('--cycles', type=int, default=3, help='Capture cycles per backend')
+    parser.add_argument('--num', type=int, default=2, help='Number of burst images')
+    parser.add_argument('--connect', type=float, default=0.3, help='Seconds to detect and claim the camera')
+    parser.add_argument('--image_mb', type=float, default=6, help='Size of every image in MB')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    latencies = dict(connect=args.connect, image_size=int(args.image_mb * 1024 * 1024))
+    results = {}
+    for name, make in [("cli", lambda: FakeCliCamera(**latencies)), ("session", lambda: camera_backends.FakeCamera(**latencies))]:
+        path = os.path.join(args.workdir, name)
+        os.makedirs(path, exist_ok=True)
+        times = []
+        for _ in range(args.cycles):
+            elapsed, files = cycle(make(), path, args.num)
+            assert len(files) == args.num and all(os.path.exists(f) for f in files)
+            times.append(elapsed)
+        shutil.rmtree(path)
+        results[name] = sum(times) / len(times)
+
+    for name, elapsed in results.items():
+        print(f"{name:<8} {elapsed:7.2f} s per cycle")
+    print(f"saved    {results['cli'] - results['session']:7.2f} s per cycle")
@@ -0,0 +1,112 @@
+##############################################################################################
+# chunk_sizing: Resumable uploads of 4_GDrive.py with fixed and adaptive chunk sizes         #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/chunk_sizing.py --files 3 --size 4 [--profiles lossy satellite] [--fixed 5120]
+# For every link profile of the Drive stand-in, 4_GDrive.py uploads the same RGB files three times
+# (new AI4G_BASE every run): with --chunk_size fixed, adaptive without link statistics (first boot)
+# and adaptive with the link_stats.json left by the previous run (next boot). Reported: upload time,
+# requests, bytes sent including the chunks lost by the link, and the adaptive chunk size saved at
+# the end. Needs the google client libraries.
+
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCH_PATH)
+ID = "GPM_Dresden"
+PARENT = "11LaYOWSchllfphGBMLj-KEuZZ608TTEO"
+# name: (bandwidth KiB/s per connection, latency s per request, probability of losing a MiB of a chunk)
+PROFILES = {
+    "lan": (4096, 0.02, 0.0),
+    "cellular": (512, 0.25, 0.02),
+    "satellite": (256, 0.8, 0.0),
+    "lossy": (256, 0.3, 0.15)}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Benchmark :: {message}", flush=True)
+
+def prepare_base(base, files, size, link_stats=None):
+    folder = os.path.join(base, f"{ID}_RGB_filetransfer")
+    os.makedirs(folder, exist_ok=True)
+    for number in range(1, files + 1):
+        with open(os.path.join(folder, f"{ID}_240701_1200_{number}.jpg"), "wb") as f:
+            f.write(os.urandom(size))
+    if link_stats:
+        shutil.copy(link_stats, os.path.join(base, "link_stats.json"))
+
+def run(drive, base, chunk_size, workers):
+    """Upload the files of `base` with 4_GDrive.py. Return the results of the run."""
+    before = dict(drive.stats)
+    stand_ins.write_token(os.path.join(base, "scripts", "token.json"), drive.url)
+    start = time.time()
+    output = subprocess.run([sys.executable, os.path.join(REPO_PATH, "4_GDrive.py"), f"--id={ID}", "--filetype", "RGB",
+                             f"--workers={workers}", f"--api_endpoint={drive.url}", f"--chunk_size={chunk_size}"],
+                            cwd=REPO_PATH, env=dict(os.environ, AI4G_BASE=base), capture_output=True, text=True).stdout
+    seconds = time.time() - start
+    try:
+        with open(os.path.join(base, "link_stats.json"), "r") as f:
+            stats = json.load(f)
+    except Exception:
+        stats = {}
+    return {"seconds": seconds, "left": len(os.listdir(os.path.join(base, f"{ID}_RGB_filetransfer"))),
+            "retries": output.count("Retrying after"), "chunk": stats.get("chunk"), "rtt": stats.get("rtt"),
+            **{key: drive.stats[key] - before[key] for key in ["requests", "bytes_in", "lost_chunks", "lost_bytes"]}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the chunk size of the resumable uploads')
+    parser.add_argument('--profiles', type=str, nargs='+', default=list(PROFILES), choices=list(PROFILES), help='Link profiles')
+    parser.add_argument('--files', type=int, default=3, help='Files per run')
+    parser.add_argument('--size', type=float, default=4, help='File size in MiB')
+    parser.add_argument('--fixed', type=int, default=5120, help='Fixed chunk size in KiB to compare with')
+    parser.add_argument('--workers', type=int, default=1, help='Concurrent uploads')
+    parser.add_argument('--seed', type=int, default=0, help='Seed of the chunk losses')
+    parser.add_argument('--workdir', type=str, default=None, help='Working folder (temporary folder by default)')
+    parser.add_argument('--keep', action='store_true', help='Keep the working folder')
+    args = parser.parse_args()
+
+    sys.path[:0] = [REPO_PATH, BENCH_PATH]
+    import stand_ins
+
+    root = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ai4g_chunks_"))
+    payload = args.files * int(args.size * 1024 * 1024)
+    try:
+        for profile in args.profiles:
+            bandwidth, latency, error_rate = PROFILES[profile]
+            _print(f"Profile {profile}: {bandwidth} KiB/s, {latency:.2f} s per request, {error_rate:.0%} of the MiB lost "
+                   f"- {args.files} files of {args.size:.1f} MiB")
+            link_stats = None
+            for mode, chunk_size in [(f"fixed {args.fixed} KiB", args.fixed), ("adaptive, first boot", 0), ("adaptive, next boot", 0)]:
+                base = os.path.join(root, f"{profile}_{chunk_size}_{link_stats is not None}")
+                prepare_base(base, args.files, int(args.size * 1024 * 1024), link_stats if mode.endswith("next boot") else None)
+                drive = stand_ins.DriveStandIn(os.path.join(base, "drive_store"), bandwidth * 1024, latency, [PARENT], error_rate, args.seed).start()
+                try:
+                    result = run(drive, base, chunk_size, args.workers)
+                finally:
+                    drive.stop()
+                if chunk_size == 0:
+                    link_stats = os.path.join(base, "link_stats.json")
+                chunk = f"{result['chunk'] / 1024:.0f} KiB" if result["chunk"] and chunk_size == 0 else "-"
+                _print(f"  {mode:<22} {result['seconds']:7.1f} s  {payload / 1024 / result['seconds']:6.1f} KiB/s  "
+                       f"{result['requests']:4d} requests  {result['bytes_in'] / payload:5.2f}x bytes sent  "
+                       f"{result['lost_chunks']:3d} chunks lost  {result['retries']:3d} retries  {result['left']} files left  "
+                       f"saved chunk {chunk}")
+    finally:
+        if not args.keep:
+            shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,128 @@
+##############################################################################################
+# fleet_sync: Sync, download and query times of fleet_catalog against the Drive stand-in     #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/fleet_sync.py --stations 4 --files 200 --new 20 --workers 4
+# The station folders of the stand-in are seeded with RGB, preview, TIR, temperature and log files
+# of consecutive half-hour captures. Then: first sync, parallel download, incremental sync after
+# `--new` files per station, continuation of an interrupted download (.part with half of the file)
+# and catalog queries. Needs the google client libraries.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCH_PATH)
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Benchmark :: {message}", flush=True)
+
+def capture_names(station, when):
+    stamp = when.strftime("%y%m%d_%H%M")
+    return [f"{station}_{stamp}_1.jpg", f"{station}_{stamp}_2.jpg", f"{station}_{stamp}_1_preview.jpg",
+            f"{station}_{stamp}_TIR.zip", f"{station}_{when:%y%m%d}_Temp.txt", f"AI4G_{when:%y%m%d_%H%M%S}.log.gz"]
+
+def seed(drive, stations, files, start, size):
+    """Add `files` files per station from `start` on. Return the time of the next capture."""
+    names = {station: [] for station in stations}
+    when = start
+    while min(len(value) for value in names.values()) < files:
+        for station in stations:
+            names[station].extend(name for name in capture_names(station, when) if name not in names[station])
+        when = when + timedelta(minutes=30)
+    for station, parent in stations.items():
+        for name in names[station][:files]:
+            drive.add_file(parent, name, os.urandom(size // 8 if "preview" in name or name.endswith((".txt", ".gz")) else size))
+    return when
+
+def timed(function, *arguments):
+    start = time.time()
+    result = function(*arguments)
+    return result, time.time() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the fleet catalog sync and downloads')
+    parser.add_argument('--stations', type=int, default=4, help='Number of station folders')
+    parser.add_argument('--files', type=int, default=200, help='Files per station in the first sync')
+    parser.add_argument('--new', type=int, default=20, help='Files per station added before the incremental sync')
+    parser.add_argument('--size', type=int, default=64, help='Size of the RGB and TIR files in KiB')
+    parser.add_argument('--workers', type=int, default=4, help='Parallel downloads')
+    parser.add_argument('--bandwidth', type=float, default=4096, help='Drive stand-in bandwidth in KiB/s per connection')
+    parser.add_argument('--latency', type=float, default=0.05, help='Drive stand-in latency in seconds per request')
+    parser.add_argument('--workdir', type=str, default=None, help='Working folder (temporary folder by default)')
+    parser.add_argument('--keep', action='store_true', help='Keep the working folder')
+    args = parser.parse_args()
+
+    sys.path[:0] = [REPO_PATH, BENCH_PATH]
+    import stand_ins
+    import fleet_catalog
+
+    base = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ai4g_fleet_"))
+    store = os.path.join(base, "store")
+    os.makedirs(store, exist_ok=True)
+    stations = dict(list(fleet_catalog.STATIONS.items())[:args.stations])
+    drive = stand_ins.DriveStandIn(os.path.join(base, "drive_store"), args.bandwidth * 1024, args.latency, list(stations.values())).start()
+    token = os.path.join(base, "token.json")
+    stand_ins.write_token(token, drive.url)
+    try:
+        start = seed(drive, stations, args.files, datetime(2024, 7, 1, 6, 0), args.size * 1024)
+        conn = fleet_catalog.open_catalog(fleet_catalog.catalog_path(store))
+        creds = fleet_catalog.log_in(token)
+        service = fleet_catalog.drive_service(creds, drive.url)
+
+        def sync_all():
+            return sum(fleet_catalog.sync_station(service, creds, conn, station, parent) for station, parent in stations.items())
+
+        listed, seconds = timed(sync_all)
+        _print(f"First sync: {listed} files listed in {seconds:.2f} s ({drive.stats['requests']} requests)")
+        (done, transferred), seconds = timed(fleet_catalog.download_pending, service, creds, conn, store, args.workers)
+        _print(f"Download: {done} files, {transferred / 1e6:.1f} MB in {seconds:.2f} s ({transferred / 1e6 / seconds:.1f} MB/s with {args.workers} workers)")
+
+        seed(drive, stations, args.new, start, args.size * 1024)
+        requests = drive.stats["requests"]
+        listed, seconds = timed(sync_all)
+        _print(f"Incremental sync: {listed} files listed in {seconds:.2f} s ({drive.stats['requests'] - requests} requests, "
+               f"{args.new * len(stations)} new)")
+        (done, transferred), seconds = timed(fleet_catalog.download_pending, service, creds, conn, store, args.workers)
+        _print(f"Download: {done} files, {transferred / 1e6:.1f} MB in {seconds:.2f} s")
+
+        # Interrupted download: half of the file already in the .part
+        station, parent = next(iter(stations.items()))
+        data = os.urandom(4 * args.size * 1024)
+        drive.add_file(parent, f"{station}_{start:%y%m%d_%H%M}_TIR.zip", data)
+        fleet_catalog.sync_station(service, creds, conn, station, parent)
+        row = fleet_catalog.query(conn, station, "tir", f"{start:%Y-%m-%d %H:%M}")[0]
+        target = fleet_catalog.local_path(store, row)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        with open(target + ".part", "wb") as f:
+            f.write(data[:len(data) // 2])
+        bytes_out = drive.stats["bytes_out"]
+        (done, transferred), seconds = timed(fleet_catalog.download_pending, service, creds, conn, store, args.workers)
+        with open(target, "rb") as f:
+            intact = f.read() == data
+        time.sleep(0.5)  # the stand-in counts the bytes after the response is sent
+        _print(f"Resume: {transferred / 1024:.0f} of {len(data) / 1024:.0f} KiB transferred "
+               f"({(drive.stats['bytes_out'] - bytes_out) / 1024:.0f} KiB served), file {'intact' if intact else 'CORRUPTED'}")
+
+        for arguments in [(None, None, None, None), (station, None, None, None), (None, "rgb", "2024-07-01 08:00", "2024-07-01 12:00"),
+                          (station, "temp", "2024-07-01", "2024-07-05")]:
+            rows, seconds = timed(fleet_catalog.query, conn, *arguments)
+            _print(f"Query {arguments}: {len(rows)} files in {seconds * 1000:.1f} ms")
+    finally:
+        drive.stop()
+        if not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
@@ -0,0 +1,539 @@
+##############################################################################################
+# stand_ins: Fake devices and a local Drive service to run the wake cycle off the Pi         #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# - FakeDSLR: the camera behind the relay. It is driven through a fake RPi.GPIO (pin 21), a fake
+#   `sh.gphoto2` (one "process" per command) and a fake python-gphoto2 module, and it shows up as
+#   a USB still-image interface in a fake sysfs tree once it has booted.
+# - fake_tircapture: writes the frames of TIRcapture (640x480 16-bit TIFFs, 4 variants per frame,
+#   temperatures.txt) at the same pace. install_tir() puts it behind a fake `sudo`.
+# - install_w1(): fake /sys/bus/w1/devices tree with DS18B20 sensors.
+# - DriveStandIn: local HTTP server with the Drive v3 calls used by the scripts (resumable and
+#   multipart uploads, files.get/list, media download with Range, batch, token) and configurable
+#   bandwidth and latency. With `error_rate` (probability that a MiB of an upload chunk is lost) a
+#   chunk is received whole and then answered with a 503 or a dropped connection.
+
+import io
+import os
+import re
+import sys
+import json
+import time
+import random
+import types
+import email
+import shutil
+import hashlib
+import threading
+import urllib.parse
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RELAY_PIN = 21
+TIR_WIDTH, TIR_HEIGHT = 640, 480
+TIR_VARIANTS = ["DN_16_", "DN_noAGC_16_", "DN_tempRange_16_", "temperature_tempRange_16_"]
+
+# ---------------------------------------------------------------------------------------------
+# DSLR
+# ---------------------------------------------------------------------------------------------
+
+def synthetic_jpeg(width=3000, height=2000, seed=0, quality=90):
+    """A landscape-like JPEG (sky, glacier, rock and noise) with the size of a real capture."""
+    from PIL import Image
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    horizon = height * (0.35 + 0.05 * np.sin(x / width * 6))
+    sky = y < horizon
+    base = np.where(sky, 200 - 60 * y / height, 150 + 60 * np.sin(x / 37.0) * np.cos(y / 53.0))
+    rgb = np.stack([base * 0.85, base * 0.95, base * (1.1 - 0.2 * ~sky)], axis=-1)
+    rgb = rgb + rng.normal(0, 12, rgb.shape)
+    buffer = io.BytesIO()
+    Image.fromarray(np.clip(rgb, 0, 255).astype(np.uint8)).save(buffer, "JPEG", quality=quality)
+    return buffer.getvalue()
+
+class FakeDSLR:
+    def __init__(self, usb_devices, image=None, boot=1.5, connect=0.3, shutter=0.3, write_speed=20 * 1024 * 1024):
+        self.usb_devices = usb_devices
+        self.image = image if image is not None else synthetic_jpeg()
+        self.boot, self.connect, self.shutter, self.write_speed = boot, connect, shutter, write_speed
+        self.powered = False
+        self.card = {}  # name -> bytes
+        self.counter = 0
+        self.lock = threading.Lock()
+        self.timer = None
+        os.makedirs(usb_devices, exist_ok=True)
+
+    def _interface(self):
+        return os.path.join(self.usb_devices, "1-1:1.0")
+
+    def power(self, on):
+        if self.timer:
+            self.timer.cancel()
+        self.powered = on
+        if on:
+            self.timer = threading.Timer(self.boot, self._enumerate)
+            self.timer.start()
+        else:
+            shutil.rmtree(self._interface(), ignore_errors=True)
+
+    def _enumerate(self):
+        os.makedirs(self._interface(), exist_ok=True)
+        with open(os.path.join(self._interface(), "bInterfaceClass"), "w") as f:
+            f.write("06\n")
+
+    def ready(self):
+        return self.powered and os.path.exists(self._interface())
+
+    def take(self):
+        time.sleep(self.shutter)
+        with self.lock:
+            self.counter = self.counter + 1
+            name = f"IMG_{self.counter:04d}.JPG"
+            self.card[name] = self.image
+        return name
+
+    def transfer(self, data, write):
+        for offset in range(0, len(data), 1024 * 1024):
+            block = data[offset:offset + 1024 * 1024]
+            write(block)
+            time.sleep(len(block) / self.write_speed)
+
+def gpio_module(devices):
+    """Fake RPi.GPIO: `devices` maps a BCM pin to a callable(on)."""
+    gpio = types.ModuleType("RPi.GPIO")
+    gpio.BCM, gpio.OUT, gpio.IN, gpio.HIGH, gpio.LOW = "BCM", "OUT", "IN", 1, 0
+    gpio.setmode = lambda mode: None
+    gpio.setup = lambda pin, mode: None
+    gpio.cleanup = lambda *pins: None
+    gpio.output = lambda pin, value: devices.get(pin, lambda on: None)(bool(value))
+    package = types.ModuleType("RPi")
+    package.GPIO = gpio
+    return package, gpio
+
+class CommandError(Exception):
+    pass
+
+def sh_module(camera):
+    """Fake `sh` with a gphoto2 command: every call pays the USB detect/claim of a new process."""
+    def gphoto2(arguments):
+        if not camera.ready():
+            raise CommandError("*** Error: No camera found. ***")
+        time.sleep(camera.connect)
+        if "--summary" in arguments:
+            return "Camera summary:\nManufacturer: Canon Inc.\nModel: Fake DSLR\n"
+        if "--delete-all-files" in arguments:
+            camera.card.clear()
+            return ""
+        if "--capture-image" in arguments:
+            frames = int(next((a.split("=")[1] for a in arguments if a.startswith("-F=")), 1))
+            interval = float(next((a.split("=")[1] or 0 for a in arguments if a.startswith("-I=")), 0))
+            for count in range(frames):
+                shot_start = time.monotonic()
+                camera.take()
+                if count < frames - 1:
+                    time.sleep(max(0, interval - (time.monotonic() - shot_start)))
+            return ""
+        if "--num-files" in arguments:
+            return f"Number of files in folder '/store_00020001/DCIM/100CANON': {len(camera.card)}\n"
+        if "--get-all-files" in arguments:
+            for name, data in sorted(camera.card.items()):
+                with open(os.path.join(os.getcwd(), name), "wb") as f:
+                    camera.transfer(data, f.write)
+            return ""
+        return ""
+    module = types.ModuleType("sh")
+    module.gphoto2 = gphoto2
+    return module
+
+def gphoto2_module(camera):
+    """Fake python-gphoto2 with the calls used by camera_backends.Gphoto2Session."""
+    gp = types.ModuleType("gphoto2")
+    gp.GP_CAPTURE_IMAGE, gp.GP_FILE_TYPE_NORMAL = 0, 1
+
+    class GPhoto2Error(Exception):
+        pass
+
+    class Node:
+        def __init__(self, choices):
+            self.choices, self.value = choices, choices[0]
+        def get_choice(self, index):
+            return self.choices[index]
+        def set_value(self, value):
+            self.value = value
+
+    class Config:
+        def __init__(self):
+            self.children = {"capturetarget": Node(["Internal RAM", "Memory card"])}
+        def get_child_by_name(self, name):
+            return self.children[name]
+
+    class CameraFilePath:
+        def __init__(self, folder, name):
+            self.folder, self.name = folder, name
+
+    class Camera:
+        def init(self):
+            if not camera.ready():
+                raise GPhoto2Error("[-105] Unknown model")
+            time.sleep(camera.connect)  # claimed once per session
+        def get_summary(self):
+            return "Manufacturer: Canon Inc.\nModel: Fake DSLR\n"
+        def get_config(self):
+            return Config()
+        def set_config(self, config):
+            pass
+        def capture(self, kind):
+            return CameraFilePath("/store_00020001/DCIM/100CANON", camera.take())
+        def file_delete(self, folder, name):
+            camera.card.pop(name, None)
+        def exit(self):
+            pass
+
+    class CameraFile:
+        def __init__(self, fd):
+            self.fd = fd
+
+    def gp_camera_file_get(cam, folder, name, kind, camera_file):
+        camera.transfer(camera.card[name], lambda block: os.write(camera_file.fd, block))
+
+    gp.GPhoto2Error = GPhoto2Error
+    gp.Camera = Camera
+    gp.gp_file_new_from_fd = CameraFile
+    gp.gp_camera_file_get = gp_camera_file_get
+    return gp
+
+# ---------------------------------------------------------------------------------------------
+# TE thermal camera and 1-Wire
+# ---------------------------------------------------------------------------------------------
+
+def tir_frames(index, seed=0):
+    """The four TIRcapture variants of one frame: smooth scene, sensor noise and a slow drift."""
+    rng = np.random.default_rng(seed + index)
+    y, x = np.mgrid[0:TIR_HEIGHT, 0:TIR_WIDTH]
+    raw = 7000 + 900 * np.sin(x / 90.0) * np.cos(y / 70.0) + 3 * y + rng.normal(0, 4, (TIR_HEIGHT, TIR_WIDTH)) + 2 * index
+    dn = np.clip(raw, 0, 65535).astype(np.uint16)
+    dn_agc = np.clip((raw - 6000) * 20, 0, 65535).astype(np.uint16)
+    temperature = (np.clip(raw - 2000, 0, 65535).astype(np.int32) - 5000).astype(np.float32) / np.float32(100)
+    return dict(zip(TIR_VARIANTS, [dn_agc, dn, dn_agc, temperature]))
+
+def fake_tircapture(argv, startup=1.0, pace=0.11):
+    """Command line of TIRcapture: <folder/> <frames> <prefix>."""
+    sys.path.insert(0, REPO_PATH)
+    import tir_container
+    folder, frames, prefix = argv[0], int(argv[1]), argv[2]
+    time.sleep(startup)  # camera start and skipped frames
+    for count in range(frames):
+        for variant, frame in tir_frames(count).items():
+            path = os.path.join(folder, f"{prefix}{variant}{count}.tif")
+            tir_container.write_tiff(path + ".tmp.tif", frame)
+            os.replace(path + ".tmp.tif", path)
+        with open(os.path.join(folder, prefix + "temperatures.txt"), "a") as f:
+            f.write(f"count {count} FPA_T {25.1 + 0.01 * count:.2f} Shutter_T_raw 1234 Shutter_T 24.8 centrePixel_T {3.2 + 0.1 * count:.1f}\n")
+        time.sleep(pace)
+
+def install_tir(base):
+    """TIRcapture in BASE/scripts and a `sudo` in BASE/bin that only runs it. Returns the bin folder."""
+    scripts, bin_dir = os.path.join(base, "scripts"), os.path.join(base, "bin")
+    os.makedirs(scripts, exist_ok=True)
+    os.makedirs(bin_dir, exist_ok=True)
+    tircapture = os.path.join(scripts, "TIRcapture")
+    with open(tircapture, "w") as f:
+        f.write(f"#!{sys.executable}\nimport sys\nsys.path.insert(0, {os.path.dirname(os.path.abspath(__file__))!r})\n"
+                "import stand_ins\nstand_ins.fake_tircapture(sys.argv[1:])\n")
+    with open(os.path.join(bin_dir, "sudo"), "w") as f:
+        # Only the TIR capture runs; mount, umount, rm, dtoverlay... do nothing
+        f.write(f'#!/bin/sh\nif [ "$1" = "{tircapture}" ]; then exec "$@"; fi\nexit 0\n')
+    for path in (tircapture, os.path.join(bin_dir, "sudo")):
+        os.chmod(path, 0o755)
+    return bin_dir
+
+def install_w1(base, sensors=3):
+    sys.path.insert(0, REPO_PATH)
+    import w1_sampler
+    w1_path = os.path.join(base, "sys_w1")
+    for index in range(sensors):
+        w1_sampler.write_fake_sensor(w1_path, f"28-00000{index:07x}", -2.5 + index)
+    return w1_path
+
+# ---------------------------------------------------------------------------------------------
+# Google Drive stand-in
+# ---------------------------------------------------------------------------------------------
+
+def _now():
+    return datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ")[:-4] + "Z"
+
+class DriveStandIn:
+    """Local Drive v3 service. `bandwidth` in bytes/s per connection, `latency` in seconds per request."""
+
+    def __init__(self, store, bandwidth=200 * 1024, latency=0.3, folders=(), error_rate=0.0, seed=0):
+        self.store = store
+        self.bandwidth, self.latency = bandwidth, latency
+        self.error_rate = error_rate
+        self.random = random.Random(seed)
+        self.files = {}  # id -> metadata
+        self.sessions = {}  # upload id -> {"metadata", "size", "received", "path"}
+        self.lock = threading.Lock()
+        self.counter = 0
+        self.stats = {"requests": 0, "bytes_in": 0, "bytes_out": 0, "upload_seconds": 0.0, "lost_chunks": 0, "lost_bytes": 0}
+        os.makedirs(store, exist_ok=True)
+        for folder in folders:
+            self.files[folder] = {"id": folder, "name": folder, "mimeType": "application/vnd.google-apps.folder",
+                                  "parents": [], "trashed": False, "modifiedTime": _now()}
+        self.server = None
+
+    # --- server -------------------------------------------------------------------------------
+
+    def start(self):
+        stand_in = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *arguments):
+                pass
+
+            def _serve(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                started = time.time()
+                body = self.rfile.read(length) if length else b""
+                stand_in.throttle(len(body))
+                failure = stand_in.failure(len(body)) if self.command == "PUT" and body else None
+                with stand_in.lock:
+                    stand_in.stats["requests"] += 1
+                    stand_in.stats["bytes_in"] += len(body)
+                    if failure:
+                        stand_in.stats["lost_chunks"] += 1
+                        stand_in.stats["lost_bytes"] += len(body)
+                if failure == "drop":
+                    self.close_connection = True
+                    return
+                if failure == "503":
+                    status, headers, data = stand_in._error(503, "Backend Error")
+                else:
+                    status, headers, data = stand_in.handle(self.command, self.path, self.headers, body)
+                if "upload" in self.path:
+                    with stand_in.lock:
+                        stand_in.stats["upload_seconds"] += time.time() - started
+                self.send_response(status)
+                for key, value in headers.items():
+                    self.send_header(key, value)
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                for offset in range(0, len(data), 64 * 1024):
+                    block = data[offset:offset + 64 * 1024]
+                    self.wfile.write(block)
+                    stand_in.throttle(len(block), latency=False)
+                with stand_in.lock:
+                    stand_in.stats["bytes_out"] += len(data)
+
+            do_GET = do_POST = do_PUT = do_PATCH = do_DELETE = _serve
+
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    @property
+    def url(self):
+        return f"http://127.0.0.1:{self.server.server_address[1]}/"
+
+    def stop(self):
+        if self.server:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def throttle(self, size, latency=True):
+        time.sleep((self.latency if latency else 0) + size / self.bandwidth)
+
+    def failure(self, size):
+        """None, "503" or "drop" for an upload chunk of `size` bytes."""
+        with self.lock:
+            if self.random.random() >= 1 - (1 - self.error_rate) ** (size / (1024 * 1024)):
+                return None
+            return "drop" if self.random.random() < 0.5 else "503"
+
+    # --- API ----------------------------------------------------------------------------------
+
+    def _new_id(self):
+        with self.lock:
+            self.counter = self.counter + 1
+            return hashlib.sha1(f"{time.time()}-{self.counter}".encode()).hexdigest()[:28]
+
+    def _json(self, status, value, headers=None):
+        return status, dict({"Content-Type": "application/json; charset=UTF-8"}, **(headers or {})), json.dumps(value).encode()
+
+    def _error(self, status, message):
+        return self._json(status, {"error": {"code": status, "message": message, "errors": [{"message": message}]}})
+
+    def _create(self, metadata, data):
+        file_id = self._new_id()
+        path = os.path.join(self.store, file_id)
+        with open(path, "wb") as f:
+            f.write(data)
+        return self._register(file_id, metadata, path)
+
+    def _register(self, file_id, metadata, path):
+        size = os.path.getsize(path)
+        with open(path, "rb") as f:
+            md5 = hashlib.md5(f.read()).hexdigest()
+        entry = {"id": file_id, "name": metadata.get("name", "Untitled"), "parents": metadata.get("parents", []),
+                 "mimeType": metadata.get("mimeType", "application/octet-stream"), "size": str(size),
+                 "md5Checksum": md5, "trashed": False, "modifiedTime": _now()}
+        parent = (entry["parents"] or [None])[0]
+        if parent is not None and parent not in self.files:
+            os.remove(path)
+            return self._error(404, f"File not found: {parent}.")
+        with self.lock:
+            self.files[file_id] = entry
+        return self._json(200, entry)
+
+    def add_file(self, parent, name, data, mime_type="application/octet-stream"):
+        """Store a file directly (seeding the stand-in without upload requests). Return its metadata."""
+        _, _, body = self._create({"name": name, "parents": [parent], "mimeType": mime_type}, data)
+        return json.loads(body)
+
+    def handle(self, method, path, headers, body):
+        url = urllib.parse.urlsplit(path)
+        query = dict(urllib.parse.parse_qsl(url.query))
+        route = url.path
+        if route == "/token" and method == "POST":
+            return self._json(200, {"access_token": "stand-in-" + self._new_id(), "expires_in": 3599, "token_type": "Bearer"})
+        if route == "/batch/drive/v3" and method == "POST":
+            return self._batch(headers, body)
+        if route == "/upload/drive/v3/files":
+            if method == "POST" and query.get("uploadType") == "resumable":
+                upload_id = self._new_id()
+                size = headers.get("X-Upload-Content-Length")
+                self.sessions[upload_id] = {"metadata": json.loads(body or b"{}"), "size": int(size) if size else None,
+                                            "received": 0, "path": os.path.join(self.store, upload_id + ".part")}
+                open(self.sessions[upload_id]["path"], "wb").close()
+                location = f"http://{headers.get('Host')}/upload/drive/v3/files?uploadType=resumable&upload_id={upload_id}"
+                return 200, {"Location": location}, b""
+            if method == "PUT" and "upload_id" in query:
+                return self._chunk(query["upload_id"], headers, body)
+            if method == "POST" and query.get("uploadType") == "multipart":
+                message = email.message_from_bytes(b"Content-Type: " + headers.get("Content-Type").encode() + b"\r\n\r\n" + body)
+                parts = message.get_payload()
+                metadata = json.loads(parts[0].get_payload(decode=True) or b"{}")
+                return self._create(metadata, parts[1].get_payload(decode=True) or b"")
+            if method == "POST":
+                return self._create({}, body)
+        if route == "/drive/v3/files" and method == "GET":
+            return self._list(query)
+        match = re.fullmatch(r"/drive/v3/files/([^/]+)", route)
+        if match:
+            entry = self.files.get(match.group(1))
+            if entry is None or entry["trashed"]:
+                return self._error(404, f"File not found: {match.group(1)}.")
+            if method == "GET" and query.get("alt") == "media":
+                return self._media(entry, headers)
+            if method == "GET":
+                return self._json(200, entry)
+            if method == "DELETE":
+                with self.lock:
+                    entry["trashed"] = True
+                return 204, {}, b""
+        return self._error(404, f"Unknown route {method} {route}")
+
+    def _chunk(self, upload_id, headers, body):
+        session = self.sessions.get(upload_id)
+        if session is None:
+            return self._error(404, "Upload session not found")
+        if "file_id" in session:  # finished: a status query gets the file again
+            return self._json(200, self.files[session["file_id"]])
+        match = re.fullmatch(r"bytes (\*|(\d+)-(\d+))/(\*|\d+)", headers.get("Content-Range", "bytes */*"))
+        if match is None:
+            return self._error(400, "Invalid Content-Range")
+        if match.group(4) != "*":
+            session["size"] = int(match.group(4))
+        if match.group(1) != "*":
+            start = int(match.group(2))
+            if start != session["received"]:
+                return 308, self._range(session), b""
+            with open(session["path"], "r+b") as f:
+                f.seek(start)
+                f.write(body)
+            session["received"] = start + len(body)
+        if session["size"] is not None and session["received"] >= session["size"]:
+            file_id = self._new_id()
+            final = os.path.join(self.store, file_id)
+            os.replace(session["path"], final)
+            status, headers, data = self._register(file_id, session["metadata"], final)
+            if status == 200:
+                session["file_id"] = file_id
+            else:
+                del self.sessions[upload_id]
+            return status, headers, data
+        return 308, self._range(session), b""
+
+    def _range(self, session):
+        return {"Range": f"bytes=0-{session['received'] - 1}"} if session["received"] else {}
+
+    def _media(self, entry, headers):
+        with open(os.path.join(self.store, entry["id"]), "rb") as f:
+            data = f.read()
+        match = re.fullmatch(r"bytes=(\d+)-(\d*)", headers.get("Range", "") or "")
+        if match:
+            start = int(match.group(1))
+            end = int(match.group(2)) if match.group(2) else len(data) - 1
+            return 206, {"Content-Type": entry["mimeType"], "Content-Range": f"bytes {start}-{end}/{len(data)}"}, data[start:end + 1]
+        return 200, {"Content-Type": entry["mimeType"]}, data
+
+    def _list(self, query):
+        q = query.get("q", "")
+        files = list(self.files.values())
+        for operator, value in re.findall(r"mimeType\s*(!=|=)\s*'([^']+)'", q):
+            files = [entry for entry in files if (entry["mimeType"] == value) == (operator == "=")]
+        for name in re.findall(r"name\s*=\s*'((?:[^'\\]|\\.)*)'", q):
+            files = [entry for entry in files if entry["name"] == name.replace("\\'", "'").replace("\\\\", "\\")]
+        for parent in re.findall(r"'([^']+)'\s+in\s+parents", q):
+            files = [entry for entry in files if parent in entry["parents"]]
+        for operator, value in re.findall(r"modifiedTime\s*(>=|>)\s*'([^']+)'", q):
+            files = [entry for entry in files if entry["modifiedTime"] > value or (operator == ">=" and entry["modifiedTime"] == value)]
+        if "trashed=false" in q.replace(" ", ""):
+            files = [entry for entry in files if not entry["trashed"]]
+        files.sort(key=lambda entry: (entry["modifiedTime"], entry["id"]))
+        start = int(query.get("pageToken", 0))
+        size = int(query.get("pageSize", 100))
+        result = {"files": files[start:start + size]}
+        if start + size < len(files):
+            result["nextPageToken"] = str(start + size)
+        return self._json(200, result)
+
+    def _batch(self, headers, body):
+        message = email.message_from_bytes(b"Content-Type: " + headers.get("Content-Type").encode() + b"\r\n\r\n" + body)
+        boundary = "batch_" + self._new_id()
+        out = io.BytesIO()
+        for part in message.get_payload():
+            request = part.get_payload(decode=True)
+            head, _, inner_body = request.partition(b"\r\n\r\n")
+            lines = head.decode().split("\r\n")
+            method, path, _ = lines[0].split(" ", 2)
+            inner_headers = dict(line.split(": ", 1) for line in lines[1:] if ": " in line)
+            status, response_headers, data = self.handle(method, urllib.parse.urlsplit(path)._replace(scheme="", netloc="").geturl(), inner_headers, inner_body)
+            content_id = part.get("Content-ID", "").strip("<>")
+            out.write(f"--{boundary}\r\nContent-Type: application/http\r\nContent-ID: <response-{content_id}>\r\n\r\n".encode())
+            out.write(f"HTTP/1.1 {status} {'OK' if status < 300 else 'Error'}\r\n".encode())
+            for key, value in response_headers.items():
+                out.write(f"{key}: {value}\r\n".encode())
+            out.write(f"Content-Length: {len(data)}\r\n\r\n".encode() + data + b"\r\n")
+        out.write(f"--{boundary}--\r\n".encode())
+        return 200, {"Content-Type": f"multipart/mixed; boundary={boundary}"}, out.getvalue()
+
+def write_token(path, endpoint):
+    """token.json accepted by google.oauth2 that never needs a refresh (token_uri on the stand-in)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"token": "stand-in", "refresh_token": "stand-in", "token_uri": endpoint + "token",
+                   "client_id": "stand-in", "client_secret": "stand-in", "scopes": ["https://www.googleapis.com/auth/drive"],
+                   "expiry": "2099-01-01T00:00:00Z"}, f)
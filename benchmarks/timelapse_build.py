@@ -0,0 +1,117 @@
+##############################################################################################
+# timelapse_build: Build times of timelapse_builder on a synthetic station archive           #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/timelapse_build.py --days 3 --every 30 --workers 1 4
+# The archive has bursts of --num images every --every minutes, day and night (dark images at night),
+# made of hard links to a few synthetic full-size captures (the decoding cost is the same). Times:
+# the bucket selection with full decodes vs. the draft decodes of timelapse_builder, the time-lapse
+# with every number of workers, a rebuild (everything skipped) and the daily composites.
+
+import os
+import sys
+import time
+import shutil
+import argparse
+import tempfile
+from datetime import datetime, timedelta
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCH_PATH)
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Benchmark :: {message}", flush=True)
+
+def make_archive(archive, station, days, every, num, width, height):
+    """Hard links named ID_yymmdd_HHMM_n.jpg to a few synthetic images. Return the number of images."""
+    import numpy as np
+    from PIL import Image
+    sources = os.path.join(archive, "sources")
+    os.makedirs(sources, exist_ok=True)
+    day_images = []
+    for seed in range(4):
+        path = os.path.join(sources, f"day_{seed}.jpg")
+        with open(path, "wb") as f:
+            f.write(stand_ins.synthetic_jpeg(width, height, seed))
+        day_images.append(path)
+    night_image = os.path.join(sources, "night.jpg")
+    Image.fromarray(np.random.default_rng(0).integers(0, 8, (height, width, 3), dtype=np.uint8)).save(night_image, quality=90)
+
+    count = 0
+    when = datetime(2024, 7, 1)
+    while when < datetime(2024, 7, 1) + timedelta(days=days):
+        folder = os.path.join(archive, station, when.strftime("%y%m"))
+        os.makedirs(folder, exist_ok=True)
+        for n in range(1, num + 1):
+            source = day_images[(count + n) % len(day_images)] if 6 <= when.hour < 20 else night_image
+            os.link(source, os.path.join(folder, f"{station}_{when:%y%m%d_%H%M}_{n}.jpg"))
+        count = count + num
+        when = when + timedelta(minutes=every)
+    return count
+
+def naive_frame(paths, width):
+    """Selection without draft decoding: every image decoded at full size."""
+    import numpy as np
+    from PIL import Image
+    best = max(paths, key=lambda path: rgb_quality.frame_stats(np.asarray(Image.open(path).convert("L"), dtype=np.float32))["sharpness"])
+    img = Image.open(best).convert("RGB")
+    img.thumbnail((width, width), Image.LANCZOS)
+    return timelapse_builder.encode(img)
+
+def timed(function, *arguments):
+    start = time.time()
+    result = function(*arguments)
+    return result, time.time() - start
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the time-lapse and composite builder')
+    parser.add_argument('--days', type=int, default=3, help='Days of captures')
+    parser.add_argument('--every', type=int, default=30, help='Minutes between captures (and per bucket)')
+    parser.add_argument('--num', type=int, default=2, help='Images per burst')
+    parser.add_argument('--size', type=int, nargs=2, default=[3000, 2000], help='Size of the captures')
+    parser.add_argument('--width', type=int, default=1280, help='Time-lapse frame width')
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count()], help='Numbers of decoding processes to compare')
+    parser.add_argument('--workdir', type=str, default=None, help='Working folder (temporary folder by default)')
+    parser.add_argument('--keep', action='store_true', help='Keep the working folder')
+    args = parser.parse_args()
+
+    sys.path[:0] = [REPO_PATH, BENCH_PATH]
+    import stand_ins
+    import rgb_quality
+    import timelapse_builder
+
+    base = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ai4g_timelapse_"))
+    archive = os.path.join(base, "archive")
+    station = "GPM01"
+    try:
+        count = make_archive(archive, station, args.days, args.every, args.num, *args.size)
+        images, seconds = timed(timelapse_builder.find_images, archive)
+        _print(f"{count} images in the archive, found in {seconds:.2f} s")
+        station_buckets = timelapse_builder.buckets(images, args.every)[station]
+
+        day_bucket = next(paths for bucket, paths in station_buckets if bucket.endswith("_1200"))
+        _, full = timed(naive_frame, day_bucket, args.width)
+        _, selected = timed(timelapse_builder.best_frame, day_bucket, args.width)
+        _print(f"Selection of a {len(day_bucket)}-image bucket: {full:.2f} s with full decodes, {selected:.2f} s with draft decodes")
+
+        for workers in args.workers:
+            out = os.path.join(base, f"out_{workers}")
+            (written, empty), seconds = timed(timelapse_builder.build_timelapse, station, station_buckets, out, args.every, args.width, workers)
+            _print(f"Time-lapse with {workers} workers: {written} frames, {empty} empty buckets in {seconds:.2f} s "
+                   f"({(written + empty) / seconds:.1f} buckets/s)")
+        (written, empty), seconds = timed(timelapse_builder.build_timelapse, station, station_buckets, out, args.every, args.width, workers)
+        _print(f"Rebuild: {written} frames, {empty} empty buckets in {seconds:.2f} s")
+        written, seconds = timed(timelapse_builder.build_composites, station, station_buckets, out, args.every, 320, 8, workers)
+        _print(f"Daily composites: {written} in {seconds:.2f} s")
+    finally:
+        if not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
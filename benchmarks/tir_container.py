@@ -0,0 +1,95 @@
+##############################################################################################
+# tir_container: Size and encoding time of the .tirc container against the ZIP               #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/tir_container.py [--capture FOLDER] [--frames 4]
+# Without --capture, a synthetic capture (smooth scene + sensor noise, the four TIRcapture
+# variants) is generated. The round trips are checked in tests/test_tir_container.py.
+
+import io
+import os
+import sys
+import time
+import zipfile
+import argparse
+import tempfile
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tir_container
+
+WIDTH, HEIGHT = 640, 480
+
+def synthetic_capture(path, frames, seed=0):
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:HEIGHT, 0:WIDTH]
+    scene = 7000 + 900 * np.sin(x / 90.0) * np.cos(y / 70.0) + 3 * y
+    for index in range(frames):
+        raw = scene + rng.normal(0, 4, scene.shape) + 2 * index
+        dn = np.clip(raw, 0, 65535).astype(np.uint16)
+        dn_agc = np.clip((raw - 6000) * 20, 0, 65535).astype(np.uint16)
+        temp_raw = np.clip(raw - 2000, 0, 65535).astype(np.int32)
+        temperature = (temp_raw - 5000).astype(np.float32) / np.float32(100)
+        for variant, frame in [("DN_16", dn_agc), ("DN_noAGC_16", dn), ("DN_tempRange_16", dn_agc),
+                               ("temperature_tempRange_16", temperature)]:
+            tir_container.write_tiff(os.path.join(path, f"GPM_bench_{variant}_{index}.tif"), frame)
+    with open(os.path.join(path, "GPM_bench_temperatures.txt"), "w") as f:
+        for index in range(frames):
+            f.write(f"count {index} FPA_T 25.1 Shutter_T_raw 1234 Shutter_T 24.8 centrePixel_T 3.2\n")
+
+def zip_size(path, level):
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED, compresslevel=level) as zipf:
+        for name in sorted(os.listdir(path)):
+            zipf.write(os.path.join(path, name), name)
+    return buffer.tell()
+
+def load_capture(path):
+    frames, extras = {}, {}
+    for name in sorted(os.listdir(path)):
+        if tir_container.frame_key(name):
+            frames[name] = tir_container.read_tiff(os.path.join(path, name))
+        else:
+            with open(os.path.join(path, name), "rb") as f:
+                extras[name] = f.read()
+    return frames, extras
+
+def measure(label, function, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function()
+        timings.append(time.perf_counter() - start)
+    return label, min(timings), result
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the TIR container')
+    parser.add_argument('--capture', type=str, default=None, help='Real capture folder (default: synthetic)')
+    parser.add_argument('--frames', type=int, default=4, help='Frames of the synthetic capture')
+    parser.add_argument('--repeat', type=int, default=3, help='Repetitions per measurement')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = args.capture
+        if path is None:
+            path = tmp
+            synthetic_capture(path, args.frames)
+        frames, extras = load_capture(path)
+        raw_bytes = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path))
+        print(f"Capture: {len(frames)} frames, {len(extras)} files, {raw_bytes / 1e6:.2f} MB on disk")
+
+        runs = [measure(f"zip deflate:{level}", lambda l=level: zip_size(path, l), args.repeat) for level in (1, 6, 9)]
+        for codec, level in [("zlib", 1), ("zlib", 6), ("zlib", 9), ("lzma", 6)]:
+            label, elapsed, data = measure(f"tirc {codec}:{level}", lambda c=codec, l=level: tir_container.encode(frames, extras, c, l), args.repeat)
+            runs.append((label, elapsed, len(data)))
+
+        baseline = runs[1][2]
+        for label, elapsed, size in runs:
+            print(f"{label:<16} {size / 1e6:7.3f} MB  ({100 * size / baseline:5.1f}% of zip:6)  encode {elapsed:6.3f} s")
@@ -0,0 +1,113 @@
+##############################################################################################
+# tir_packaging: Benchmark of the TIR packaging paths (write-walk-zip-rmtree vs streaming)   #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/tir_packaging.py --workdir /home/pi/bench --frames 4
+# Frames are synthetic 640x480 16-bit images (smooth gradient plus sensor noise) written with
+# the same names and the same pace (110 ms per frame) as TIRcapture.
+
+import os
+import sys
+import time
+import random
+import shutil
+import zipfile
+import argparse
+import threading
+from array import array
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tir_packager
+
+WIDTH, HEIGHT = 640, 480
+VARIANTS = ["DN_16_", "DN_noAGC_16_", "DN_tempRange_16_", "temperature_tempRange_16_"]
+
+def synthetic_frame(seed):
+    rng = random.Random(seed)
+    frame = array("H", bytes(2 * WIDTH * HEIGHT))
+    for y in range(HEIGHT):
+        row = 7000 + 4 * y
+        for x in range(0, WIDTH, 8):
+            value = row + x + rng.randint(-6, 6)
+            frame[y * WIDTH + x:y * WIDTH + x + 8] = array("H", [value] * 8)
+    return frame.tobytes()
+
+class FakeTIRcapture(threading.Thread):
+    """Writes the frames of a capture like TIRcapture and exposes poll() like subprocess.Popen."""
+
+    def __init__(self, path, frames, payloads, prefix, delay=0.11):
+        super().__init__(daemon=True)
+        self.path, self.frames, self.payloads, self.prefix, self.delay = path, frames, payloads, prefix, delay
+
+    def run(self):
+        with open(os.path.join(self.path, self.prefix + "temperatures.txt"), "w") as txt:
+            for count in range(self.frames):
+                for variant, payload in zip(VARIANTS, self.payloads):
+                    with open(os.path.join(self.path, f"{self.prefix}{variant}{count}.tif"), "wb") as f:
+                        f.write(payload)
+                txt.write(f"count {count} FPA_T 25.1 Shutter_T_raw 1234 Shutter_T 24.8 centrePixel_T 3.2\n")
+                txt.flush()
+                time.sleep(self.delay)
+
+    def poll(self):
+        return None if self.is_alive() else 0
+
+def current_path(workdir, frames, payloads, level):
+    path_tir = os.path.join(workdir, "GPM_bench_TIR")
+    os.makedirs(path_tir, exist_ok=True)
+    capture = FakeTIRcapture(path_tir, frames, payloads, "GPM_bench_")
+    capture.start()
+    capture.join()
+    zip_folder = os.path.join(workdir, "GPM_bench_TIR_current.zip")
+    with zipfile.ZipFile(zip_folder, 'w', zipfile.ZIP_DEFLATED, compresslevel=level) as zipf:
+        for root, _, files in os.walk(path_tir):
+            for file in files:
+                file_path = os.path.join(root, file)
+                zipf.write(file_path, os.path.relpath(file_path, path_tir))
+    shutil.rmtree(path_tir)
+    return zip_folder
+
+def streaming_path(workdir, capture_dir, frames, payloads, compression, level, stored):
+    path_tir = os.path.join(capture_dir, "GPM_bench_TIR")
+    os.makedirs(path_tir, exist_ok=True)
+    capture = FakeTIRcapture(path_tir, frames, payloads, "GPM_bench_")
+    capture.start()
+    zip_folder = os.path.join(workdir, "GPM_bench_TIR_stream.zip")
+    tir_packager.stream_capture(capture, path_tir, zip_folder, compression, level, stored)
+    shutil.rmtree(path_tir)
+    return zip_folder
+
+def report(name, elapsed, zip_folder, capture_bytes):
+    print(f"{name:<28} {elapsed:7.2f} s   zip {os.path.getsize(zip_folder) / 1e6:6.2f} MB   "
+          f"raw frames on workdir {capture_bytes / 1e6:6.2f} MB")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark of the TIR packaging paths')
+    parser.add_argument('--workdir', type=str, required=True, help='Folder on the storage to measure (SD card)')
+    parser.add_argument('--capture_dir', type=str, default='/dev/shm', help='Capture folder of the streaming path')
+    parser.add_argument('--frames', type=int, default=4, help='Frames per capture')
+    parser.add_argument('--level', type=int, default=6, help='Deflate level')
+    args = parser.parse_args()
+
+    os.makedirs(args.workdir, exist_ok=True)
+    payloads = [synthetic_frame(seed) for seed in range(len(VARIANTS))]
+    raw_bytes = args.frames * sum(len(p) for p in payloads)
+
+    runs = [("current (walk+zip+rmtree)", lambda: current_path(args.workdir, args.frames, payloads, args.level), raw_bytes)]
+    for capture_dir, capture_bytes in [(args.workdir, raw_bytes), (args.capture_dir, 0)]:
+        for compression, level, stored in [("deflated", args.level, []), ("deflated", 1, []), ("stored", 0, [])]:
+            name = f"stream {compression}:{level} {'ram' if capture_bytes == 0 else 'sd'}"
+            runs.append((name, lambda c=capture_dir, m=compression, l=level, s=stored: streaming_path(args.workdir, c, args.frames, payloads, m, l, s), capture_bytes))
+
+    for name, run, capture_bytes in runs:
+        start = time.time()
+        zip_folder = run()
+        report(name, time.time() - start, zip_folder, capture_bytes)
+        os.remove(zip_folder)
@@ -0,0 +1,154 @@
+##############################################################################################
+# wake_cycle: Complete AI4Glaciers wake cycles off the Pi with the device and Drive stand-ins #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Usage: python3 benchmarks/wake_cycle.py --cycles 3 --bandwidth 256 --latency 0.3 [--backend cli]
+# Every stage runs with AI4Glaciers.run_stage as on the Pi: day/night, maintenance, RGB + TIR in
+# parallel, GDrive (against benchmarks/stand_ins.DriveStandIn) and a forced shutdown. AI4G_BASE
+# points all the scripts to a temporary folder. The images keep the minute in their names, so a
+# new cycle waits for the next minute. The GDrive stage needs the google client libraries.
+
+import os
+import sys
+import glob
+import time
+import shutil
+import argparse
+import tempfile
+import importlib.util
+from datetime import datetime
+
+BENCH_PATH = os.path.dirname(os.path.abspath(__file__))
+REPO_PATH = os.path.dirname(BENCH_PATH)
+ID = "GPM_Dresden"  # any ID with a GDrive parent in 4_GDrive.py
+PARENT = "11LaYOWSchllfphGBMLj-KEuZZ608TTEO"
+GOOGLE_MODULES = ["googleapiclient", "google.oauth2", "google_auth_httplib2", "google_auth_oauthlib", "httplib2"]
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Benchmark :: {message}", flush=True)
+
+def google_available():
+    try:
+        return all(importlib.util.find_spec(module) is not None for module in GOOGLE_MODULES)
+    except ImportError:
+        return False
+
+def prepare_base(base, w1_sensors):
+    """Fake devices and files under `base`. Return (dslr, w1_path, tir_exe, drive stand-in)."""
+    import stand_ins
+    import camera_session
+    import usb_mirror
+
+    bin_dir = stand_ins.install_tir(base)
+    os.environ["PATH"] = bin_dir + os.pathsep + os.environ.get("PATH", "")
+    w1_path = stand_ins.install_w1(base, w1_sensors)
+
+    dslr = stand_ins.FakeDSLR(os.path.join(base, "sys_usb"), boot=args.camera_boot, write_speed=args.camera_speed * 1024 * 1024)
+    rpi, gpio = stand_ins.gpio_module({stand_ins.RELAY_PIN: dslr.power})
+    sys.modules.update({"RPi": rpi, "RPi.GPIO": gpio, "sh": stand_ins.sh_module(dslr), "gphoto2": stand_ins.gphoto2_module(dslr)})
+    camera_session.USB_DEVICES = dslr.usb_devices
+
+    # The USB stick is a plain folder here: treated as mounted
+    stick = os.path.join(base, "usb_stick")
+    os.makedirs(stick, exist_ok=True)
+    is_mounted = usb_mirror.is_mounted
+    usb_mirror.is_mounted = lambda mount_point=stick: os.path.abspath(mount_point) == stick or is_mounted(mount_point)
+
+    for log in ["AI4G.log", "wittypi/wittyPi.log", "wittypi/schedule.log"]:
+        os.makedirs(os.path.dirname(os.path.join(base, log)), exist_ok=True)
+        with open(os.path.join(base, log), "a") as f:
+            f.writelines(f"[{datetime.now():%d/%m/%Y - %H:%M:%S}] :: Benchmark :: log line {n}\n" for n in range(200))
+
+    drive = stand_ins.DriveStandIn(os.path.join(base, "drive_store"), args.bandwidth * 1024, args.latency, [PARENT]).start()
+    stand_ins.write_token(os.path.join(base, "scripts", "token.json"), drive.url)
+    return dslr, w1_path, os.path.join(base, "scripts", "TIRcapture"), drive
+
+def wait_next_minute(last_minute):
+    while datetime.now().strftime("%y%m%d_%H%M") == last_minute:
+        time.sleep(0.5)
+
+def cycle(orchestrator, metrics, w1_path, tir_exe, drive, upload):
+    del orchestrator.stage_times[:]
+    cycle_start = time.time()
+    metrics.start_cycle(cycle_start)
+    orchestrator.time_of_day()  # timed only: the capture stages run whatever the result
+    orchestrator.run_stage("1_maintenance.py", f"--id={ID}", "--thermal=true")
+    orchestrator.run_stages_parallel([
+        ("2_RGB_images.py", 240, [f"--id={ID}", f"--num={args.num}", f"--backend={args.backend}", "--shutter_second=-1"]),
+        ("3_TIR_Images.py", 180, [f"--id={ID}", f"--w1_path={w1_path}", f"--tir_exe={tir_exe}", f"--format={args.format}"])])
+    bytes_before = drive.stats["bytes_in"]
+    upload_time = 0
+    if upload:
+        upload_start = time.time()
+        orchestrator.run_stage("4_GDrive.py", f"--id={ID}", "--filetype", "PRV", "RGB", "TIR", "TXT", "LOG",
+                               f"--workers={args.workers}", f"--api_endpoint={drive.url}", f"--deadline={time.time() + args.window:.0f}")
+        upload_time = time.time() - upload_start
+    orchestrator.run_stage("5_shutdown.py", "--force")
+    return {"cycle": time.time() - cycle_start, "stages": list(orchestrator.stage_times),
+            "uploaded": drive.stats["bytes_in"] - bytes_before, "upload_time": upload_time}
+
+def report(results, records, upload):
+    _print("=" * 60)
+    for number, result in enumerate(results, 1):
+        stages = " - ".join(f"{script}: {elapsed:.2f} s" for script, elapsed in result["stages"])
+        _print(f"Cycle {number}: {result['cycle']:.2f} s :: {stages}")
+        if upload and result["upload_time"]:
+            _print(f"Cycle {number}: {result['uploaded'] / 1e6:.2f} MB sent in {result['upload_time']:.2f} s "
+                   f"({result['uploaded'] / 1024 / result['upload_time']:.1f} KiB/s)")
+    cycles = sorted(result["cycle"] for result in results)
+    _print(f"Wake cycle: mean {sum(cycles) / len(cycles):.2f} s - min {cycles[0]:.2f} s - max {cycles[-1]:.2f} s")
+    if not upload:
+        _print("GDrive stage not run: google-api-python-client, google-auth-httplib2 and google-auth-oauthlib are needed")
+    metrics.print_summary(metrics.summarise(records))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Hardware-free benchmark of complete AI4Glaciers wake cycles')
+    parser.add_argument('--cycles', type=int, default=2, help='Number of wake cycles')
+    parser.add_argument('--workdir', type=str, default=None, help='AI4G_BASE of the run (temporary folder by default)')
+    parser.add_argument('--keep', action='store_true', help='Keep the working folder')
+    parser.add_argument('--num', type=int, default=2, help='Number of burst images')
+    parser.add_argument('--backend', type=str, default='session', choices=['session', 'cli'], help='Camera backend of 2_RGB_images.py')
+    parser.add_argument('--format', type=str, default='zip', choices=['zip', 'tirc'], help='Package of the TIR frames')
+    parser.add_argument('--workers', type=int, default=3, help='Number of concurrent uploads')
+    parser.add_argument('--bandwidth', type=float, default=256, help='Drive stand-in bandwidth in KiB/s per connection')
+    parser.add_argument('--latency', type=float, default=0.3, help='Drive stand-in latency in seconds per request')
+    parser.add_argument('--camera_boot', type=float, default=1.5, help='Seconds until the DSLR shows up on USB')
+    parser.add_argument('--camera_speed', type=float, default=20, help='DSLR card read speed in MiB/s')
+    parser.add_argument('--sensors', type=int, default=3, help='Number of DS18B20 sensors')
+    parser.add_argument('--window', type=int, default=1500, help='Seconds the WittyPi keeps the system on')
+    args = parser.parse_args()
+
+    base = os.path.abspath(args.workdir or tempfile.mkdtemp(prefix="ai4g_bench_"))
+    os.makedirs(base, exist_ok=True)
+    os.environ["AI4G_BASE"] = base  # before any import of the scripts' modules
+    sys.path[:0] = [REPO_PATH, BENCH_PATH]
+    import AI4Glaciers
+    import metrics
+
+    dslr, w1_path, tir_exe, drive = prepare_base(base, args.sensors)
+    upload = google_available()
+    _print(f"Working folder {base} - Drive stand-in at {drive.url} ({args.bandwidth:.0f} KiB/s, {args.latency:.2f} s)")
+    results = []
+    last_minute = None
+    try:
+        for number in range(1, args.cycles + 1):
+            wait_next_minute(last_minute)
+            last_minute = datetime.now().strftime("%y%m%d_%H%M")
+            _print(f"Wake cycle {number}/{args.cycles}")
+            results.append(cycle(AI4Glaciers, metrics, w1_path, tir_exe, drive, upload))
+        records = metrics.load(glob.glob(os.path.join(base, "AI4G_metrics_*.jsonl")))
+        report(results, records, upload)
+    finally:
+        drive.stop()
+        dslr.power(False)
+        if not args.keep:
+            shutil.rmtree(base, ignore_errors=True)
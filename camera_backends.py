@@ -0,0 +1,168 @@
+##############################################################################################
+# camera_backends: DSLR backends for camera_session (persistent gphoto2 session and a fake)  #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Every backend implements the interface used by camera_session.CameraSession:
+#   power(on), usb_present(), probe() -> model or None, prepare(), capture(n), count_files(),
+#   download(path, names) -> list of files written under `names`
+# Gphoto2Session claims the camera once per cycle with libgphoto2 (python-gphoto2) and streams every
+# image from the camera straight into its final file, then deletes it from the card. FakeCamera
+# behaves like a camera with configurable latencies, to test and benchmark the capture offline.
+
+import os
+import time
+from datetime import datetime
+import camera_session
+
+BURST_INTERVAL = 3  # seconds between burst images (gphoto2 -I=3)
+CAPTURE_TARGET = 1  # capturetarget=1: memory card
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: RGB_images :: {message}")
+
+def burst(capture_one, num, interval=BURST_INTERVAL):
+    """Call capture_one() `num` times, `interval` seconds apart (measured from the start of each shot)."""
+    results = []
+    for count in range(num):
+        shot_start = time.monotonic()
+        results.append(capture_one())
+        if count < num - 1:
+            time.sleep(max(0, interval - (time.monotonic() - shot_start)))
+    return results
+
+class Gphoto2Session:
+    """One libgphoto2 session per cycle: detect, configure, capture and download without new processes."""
+
+    def __init__(self, power, interval=BURST_INTERVAL):
+        import gphoto2 as gp  # python-gphoto2, only needed on the camera station
+        self.gp = gp
+        self.set_power = power
+        self.interval = interval
+        self.camera = None
+        self.captured = []
+
+    def power(self, on):
+        if not on and self.camera is not None:
+            try:
+                self.camera.exit()
+            except Exception as e:
+                _print(f"ERROR: GPhoto2 - Closing the camera session: {e}")
+            self.camera = None
+        self.set_power(on)
+
+    def usb_present(self):
+        return camera_session.usb_camera_present()
+
+    def probe(self):
+        if self.camera is None:
+            camera = self.gp.Camera()
+            camera.init()
+            self.camera = camera
+        summary = str(self.camera.get_summary())
+        model_line = [line for line in summary.splitlines() if "Model:" in line]
+        return model_line[0].strip() if model_line else "Model: unknown"
+
+    def prepare(self):
+        config = self.camera.get_config()
+        target = config.get_child_by_name("capturetarget")
+        target.set_value(target.get_choice(CAPTURE_TARGET))
+        self.camera.set_config(config)
+        _print("GPhoto2 - Internal SD card selected")
+
+    def capture(self, num):
+        paths = burst(lambda: self.camera.capture(self.gp.GP_CAPTURE_IMAGE), num, self.interval)
+        self.captured.extend((path.folder, path.name) for path in paths)
+        _print(f"GPhoto2 - {num} images captured")
+
+    def count_files(self):
+        return len(self.captured)
+
+    def download(self, path, names):
+        files = []
+        for (folder, name), filename in zip(self.captured, names):
+            file_path = os.path.join(path, filename)
+            part_path = file_path + ".part"
+            fd = os.open(part_path, os.O_CREAT | os.O_WRONLY | os.O_TRUNC, 0o644)
+            try:
+                # The CameraFile writes to the file descriptor while the image comes from the camera
+                camera_file = self.gp.gp_file_new_from_fd(fd)
+                self.gp.gp_camera_file_get(self.camera, folder, name, self.gp.GP_FILE_TYPE_NORMAL, camera_file)
+                del camera_file
+            finally:
+                os.close(fd)
+            os.replace(part_path, file_path)
+            self.camera.file_delete(folder, name)
+            _print(f"GPhoto2 - {name} downloaded as {filename}")
+            files.append(file_path)
+        self.captured = self.captured[len(files):]
+        return files
+
+class FakeCamera:
+    """Offline camera. `connect` is the USB detect/claim time, paid once per session, or once per
+    command when `per_command` is True (what every new gphoto2 process does)."""
+
+    def __init__(self, boot=0.5, connect=0.3, shutter=0.2, available=0.2, image_size=6 * 1024 * 1024,
+                 write_speed=40 * 1024 * 1024, interval=BURST_INTERVAL, per_command=False):
+        self.boot, self.connect, self.shutter, self.available = boot, connect, shutter, available
+        self.image_size, self.write_speed, self.interval = image_size, write_speed, interval
+        self.per_command = per_command
+        self.powered_at = None
+        self.connected = False
+        self.captured = []
+
+    def _command(self):
+        if self.per_command or not self.connected:
+            time.sleep(self.connect)
+            self.connected = True
+
+    def power(self, on):
+        self.powered_at = time.monotonic() if on else None
+        self.connected = False
+
+    def usb_present(self):
+        return self.powered_at is not None and time.monotonic() - self.powered_at >= self.boot
+
+    def probe(self):
+        if not self.usb_present():
+            return None
+        self._command()
+        return "Model: Fake DSLR"
+
+    def prepare(self):
+        self._command()
+
+    def capture(self, num):
+        self._command()
+        def shot():
+            time.sleep(self.shutter)
+            return time.monotonic()
+        self.captured.extend((f"IMG_{len(self.captured) + n + 1:04d}.JPG", taken)
+                             for n, taken in enumerate(burst(shot, num, self.interval)))
+
+    def count_files(self):
+        self._command()
+        return sum(1 for _, taken in self.captured if time.monotonic() - taken >= self.available)
+
+    def download(self, path, names):
+        self._command()
+        files = []
+        block = os.urandom(1024 * 1024)
+        for (name, _), filename in zip(self.captured, names):
+            file_path = os.path.join(path, filename)
+            with open(file_path + ".part", "wb") as f:
+                for offset in range(0, self.image_size, len(block)):
+                    f.write(block[:min(len(block), self.image_size - offset)])
+            time.sleep(self.image_size / self.write_speed)
+            os.replace(file_path + ".part", file_path)
+            files.append(file_path)
+        self.captured = self.captured[len(files):]
+        return files
@@ -0,0 +1,148 @@
+##############################################################################################
+# camera_session: Event-driven state machine for the DSLR capture cycle                      #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# OFF -> POWERED -> READY -> CAPTURED -> DOWNLOADED -> OFF
+# Instead of fixed sleeps, every transition polls the real condition (USB still-image device present,
+# camera answering, files on the card) with a short backoff, and the shutter waits for the trigger
+# second with a timed sleep. The measured latencies are logged at the end of the session.
+
+import os
+import glob
+import time
+from datetime import datetime
+import metrics
+
+OFF, POWERED, READY, CAPTURED, DOWNLOADED = "OFF", "POWERED", "READY", "CAPTURED", "DOWNLOADED"
+USB_DEVICES = "/sys/bus/usb/devices"
+STILL_IMAGE_CLASS = "06"  # USB interface class of PTP cameras
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: RGB_images :: {message}")
+
+def wait_for(condition, timeout, first_delay=0.1, max_delay=1.0):
+    """Poll `condition` with exponential backoff. Return (result, elapsed) or (None, elapsed) on timeout."""
+    start = time.monotonic()
+    delay = first_delay
+    while True:
+        try:
+            result = condition()
+        except Exception:
+            result = None
+        elapsed = time.monotonic() - start
+        if result:
+            return result, elapsed
+        if elapsed >= timeout:
+            return None, elapsed
+        time.sleep(min(delay, max(0, timeout - elapsed)))
+        delay = min(delay * 2, max_delay)
+
+def next_shutter_time(second, now=None):
+    """Epoch of the next time the clock shows `second` (now, if we are inside that second)."""
+    now = time.time() if now is None else now
+    minute_start = now - now % 60
+    target = minute_start + second
+    if now >= target + 1:
+        target = target + 60
+    return max(target, now)
+
+def sleep_until(target):
+    # Timed sleep (no busy loop); re-sleep if the kernel wakes us up early
+    while True:
+        remaining = target - time.time()
+        if remaining <= 0:
+            return
+        time.sleep(remaining)
+
+def usb_camera_present(usb_devices=None):
+    for path in glob.glob(os.path.join(usb_devices or USB_DEVICES, "*", "bInterfaceClass")):
+        try:
+            with open(path, "r") as f:
+                if f.read().strip() == STILL_IMAGE_CLASS:
+                    return True
+        except OSError:
+            continue
+    return False
+
+class CameraSession:
+    """Drives a camera backend through one capture cycle.
+
+    The backend provides power(on), usb_present(), probe() -> model or None, prepare(),
+    capture(n), count_files() and download(path, names) -> list of files.
+    """
+
+    def __init__(self, backend, ready_timeout=30, files_timeout=30):
+        self.backend = backend
+        self.ready_timeout = ready_timeout
+        self.files_timeout = files_timeout
+        self.state = OFF
+        self.latencies = {}
+        self.powered_at = None
+        self.files = 0
+
+    def _transition(self, state):
+        self.state = state
+
+    def power_on(self):
+        self.backend.power(True)
+        self.powered_at = time.monotonic()
+        self._transition(POWERED)
+
+    def wait_ready(self):
+        present, _ = wait_for(self.backend.usb_present, self.ready_timeout)
+        if not present:
+            raise Exception(f"Camera not present on USB after {self.ready_timeout} s")
+        model, _ = wait_for(self.backend.probe, self.ready_timeout - (time.monotonic() - self.powered_at))
+        if not model:
+            raise Exception(f"Camera not answering after {self.ready_timeout} s")
+        self.latencies["relay_to_ready"] = time.monotonic() - self.powered_at
+        _print(f"GPhoto2 - Camera {model} detected")
+        self._transition(READY)
+        return model
+
+    def prepare(self):
+        self.backend.prepare()
+
+    def capture_at(self, second, num):
+        target = time.time() if second is None else next_shutter_time(second)
+        sleep_until(target)
+        triggered = time.time()
+        _print(f"Time-based shutther triggered")
+        self.backend.capture(num)
+        self.latencies["trigger_jitter"] = triggered - target
+        self.latencies["capture"] = time.time() - triggered
+        self._transition(CAPTURED)
+
+    def wait_files(self, num):
+        count, elapsed = wait_for(lambda: self.backend.count_files() >= num, self.files_timeout)
+        self.latencies["files_available"] = elapsed
+        if not count:
+            _print(f"ERROR: Less than {num} images available on the camera after {self.files_timeout} s")
+
+    def download(self, path, names=None):
+        start = time.monotonic()
+        files = self.backend.download(path, names)
+        self.latencies["download"] = time.monotonic() - start
+        self.files = len(files or [])
+        self._transition(DOWNLOADED)
+        return files
+
+    def power_off(self):
+        self.backend.power(False)
+        self._transition(OFF)
+
+    def report(self):
+        duration = None if self.powered_at is None else time.monotonic() - self.powered_at
+        metrics.record("camera", duration, state=self.state, files=self.files,
+                       **{name: round(value, 3) for name, value in self.latencies.items()})
+        if self.latencies:
+            _print("Camera latencies: " + ", ".join(f"{name} {value * 1000:.0f} ms" for name, value in self.latencies.items()))
@@ -0,0 +1,175 @@
+##############################################################################################
+# drive_cache: Local cache of the Google Drive credentials and metadata                      #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# token.json is only refreshed when the access token expires within REFRESH_MARGIN (or before the
+# upload deadline) and only rewritten when the token changed. The file ids learned from the uploads
+# are kept per (parent, name) together with the parent folder info. Metadata queries that are still
+# needed go in one request to the Drive batch endpoint (up to BATCH_SIZE calls); a 404 removes the
+# entry from the cache.
+
+import os
+import sqlite3
+import threading
+import time
+from datetime import datetime, timezone
+
+CACHE_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "drive_cache.db")
+REFRESH_MARGIN = 300  # seconds of validity left below which the access token is refreshed
+PARENT_TTL = 24 * 3600
+BATCH_SIZE = 100  # Drive batch endpoint limit
+
+# GDrive folder of every station (4_GDrive.py uploads into it, fleet_catalog.py copies it)
+STATION_FOLDERS = {
+    'GPM01': '1SLzhGyupTPCfIizgmZMY2fgN2h9hjEIg',
+    'GPM02': '1-8xAEW3ruXRWxyGtj0YuSGR1J3dBP8vs',
+    'GPM03': '1UoN3C_vs46xHTpt_2aInWO-lCgL7jQfR',
+    'GPM04': '1BMrQIb6QzQz7M5hq2JGBoMUBddX7fn5H',
+    'GPM05': '1LYKhP7VfApcbr2gLmoBnNAO9H0YmRtEV',
+    'GPM06': '1poLnFssMt_FHmnn1UCfsbEbyiuk_b6EZ',
+    'GPM07': '1ENCerFyDZZOLPZxkLumB2XrWl0kOXKcM',
+    'GPM08': '1Kd38xGspSFZgzLzQnKFVCP4UZsyEbvQx',
+    'GPM_Dresden': '11LaYOWSchllfphGBMLj-KEuZZ608TTEO'}
+
+_lock = threading.Lock()
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: GDrive_Cache :: {message}", flush=True)
+
+def token_expires_in(creds):
+    if creds is None or creds.expiry is None or not creds.token:
+        return 0
+    return (creds.expiry - datetime.now(timezone.utc).replace(tzinfo=None)).total_seconds()  # expiry is naive UTC
+
+def needs_refresh(creds, deadline=None, margin=REFRESH_MARGIN):
+    """True if the access token ends within `margin` seconds or before the upload deadline."""
+    left = token_expires_in(creds)
+    if deadline is not None:
+        margin = max(margin, deadline - time.time())
+    return left <= margin
+
+def save_token(creds, token_path):
+    with open(token_path + ".tmp", "w") as f:
+        f.write(creds.to_json())
+    os.replace(token_path + ".tmp", token_path)
+
+def save_token_if_changed(creds, token_path, token_before):
+    """The HTTP layer refreshes an expired token by itself: keep the new one for the next boot."""
+    if creds is not None and creds.token and creds.token != token_before:
+        save_token(creds, token_path)
+        return True
+    return False
+
+def open_cache(path=CACHE_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                            parent TEXT NOT NULL,
+                            name TEXT NOT NULL,
+                            file_id TEXT NOT NULL,
+                            size INTEGER,
+                            updated REAL NOT NULL,
+                            PRIMARY KEY (parent, name))""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS parents (
+                            parent TEXT PRIMARY KEY,
+                            name TEXT,
+                            checked REAL NOT NULL)""")
+    return conn
+
+def get_file(conn, parent, name):
+    with _lock:
+        row = conn.execute("SELECT * FROM files WHERE parent = ? AND name = ?", (parent, name)).fetchone()
+    return dict(row) if row else None
+
+def remember_file(conn, parent, name, file_id, size=None):
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO files (parent, name, file_id, size, updated) VALUES (?, ?, ?, ?, ?)",
+                     (parent, name, file_id, size, time.time()))
+
+def forget_file(conn, parent, name):
+    with _lock, conn:
+        conn.execute("DELETE FROM files WHERE parent = ? AND name = ?", (parent, name))
+
+def parent_checked(conn, parent, ttl=PARENT_TTL):
+    with _lock:
+        row = conn.execute("SELECT checked FROM parents WHERE parent = ?", (parent,)).fetchone()
+    return row is not None and time.time() - row["checked"] < ttl
+
+def remember_parent(conn, parent, name):
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO parents (parent, name, checked) VALUES (?, ?, ?)", (parent, name, time.time()))
+
+def forget_parent(conn, parent):
+    with _lock, conn:
+        conn.execute("DELETE FROM parents WHERE parent = ?", (parent,))
+
+def _escape(name):
+    return name.replace("\\", "\\\\").replace("'", "\\'")
+
+def batch_lookup(service, http, conn, parent, names, check_parent=False):
+    """Resolve {name: {'id', 'size'} or None} in GDrive with batched requests.
+
+    Names in the cache are confirmed with files().get (a 404 drops them from the cache), the others
+    are searched by name. With check_parent the parent folder is verified in the same batch.
+    Returns (found, parent_ok); parent_ok is None if the parent was not checked.
+    """
+    found = {}
+    status = {"parent": None}
+    calls = []
+    if check_parent:
+        def parent_done(request_id, response, exception):
+            if exception is None and not response.get("trashed"):
+                remember_parent(conn, parent, response.get("name"))
+                status["parent"] = True
+            elif getattr(getattr(exception, "resp", None), "status", None) == 404 or exception is None:
+                forget_parent(conn, parent)
+                status["parent"] = False
+            else:
+                _print(f"ERROR checking the GDrive folder: {exception}")
+        calls.append((service.files().get(fileId=parent, fields="id, name, trashed"), parent_done))
+
+    for name in names:
+        cached = get_file(conn, parent, name)
+        if cached:
+            def get_done(request_id, response, exception, name=name):
+                if exception is None and not response.get("trashed"):
+                    found[name] = {"id": response["id"], "size": int(response.get("size", -1))}
+                else:
+                    if exception is None or getattr(getattr(exception, "resp", None), "status", None) == 404:
+                        forget_file(conn, parent, name)
+                    found[name] = None
+            calls.append((service.files().get(fileId=cached["file_id"], fields="id, size, trashed"), get_done))
+        else:
+            def list_done(request_id, response, exception, name=name):
+                files = response.get("files", []) if exception is None else []
+                found[name] = {"id": files[0]["id"], "size": int(files[0].get("size", -1))} if files else None
+                if files:
+                    remember_file(conn, parent, name, files[0]["id"], found[name]["size"])
+            query = f"name='{_escape(name)}' and '{parent}' in parents and trashed=false"
+            calls.append((service.files().list(q=query, spaces="drive", fields="files(id, size)", pageSize=1), list_done))
+
+    for start in range(0, len(calls), BATCH_SIZE):
+        batch = service.new_batch_http_request()
+        for request, callback in calls[start:start + BATCH_SIZE]:
+            batch.add(request, callback=callback)
+        batch.execute(http=http)
+    return found, status["parent"]
+
+if __name__ == "__main__":
+    conn = open_cache()
+    with _lock:
+        files = conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+        parents = conn.execute("SELECT parent, name, checked FROM parents").fetchall()
+    _print(f"{files} file ids cached")
+    for row in parents:
+        _print(f"Folder {row['name']} ({row['parent']}) checked {datetime.fromtimestamp(row['checked']):%d/%m/%Y %H:%M}")
@@ -0,0 +1,296 @@
+##############################################################################################
+# fleet_catalog: Incremental copy and SQLite catalog of the GDrive folders of all stations   #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Analysis side (not installed on the stations). For every station folder the last modifiedTime
+# seen is kept as a cursor, so a sync only lists the files added since then (the listing is ordered
+# by modifiedTime and the cursor moves after every page: an interrupted sync continues where it
+# stopped). The names are parsed into station, type and capture time:
+#   ID_yymmdd_HHMM_n.jpg (rgb), ID_yymmdd_HHMM_n_preview.jpg (preview), ID_yymmdd_HHMM_TIR.zip/.tirc (tir),
+#   ID_yymmdd_Temp.txt / ID_yymm_Temp.txt (temp), ID_yymmdd_TIRroi.txt (tirroi), name_yymmdd_HHMMSS.log.gz (log)
+# Downloads run in parallel into <store>/<station>/<yymm>/ through .part files; a .part left by an
+# interrupted run is continued with a Range request and the MD5 of GDrive is checked at the end.
+# If a name is in GDrive more than once (an upload retried after a lost response), only the newest
+# copy is downloaded and the others are marked 'superseded'.
+#
+# Usage: python3 fleet_catalog.py sync [--stations GPM01 GPM02] [--download] --store /data/ai4g
+#        python3 fleet_catalog.py download --store /data/ai4g
+#        python3 fleet_catalog.py query --store /data/ai4g --station GPM01 --kind rgb --start 2024-07-01 --end 2024-07-02
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import argparse
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import drive_cache
+
+STATIONS = drive_cache.STATION_FOLDERS
+SCOPES = ['https://www.googleapis.com/auth/drive']
+PAGE_SIZE = 1000
+CHUNK_SIZE = 8 * 1024 * 1024
+EPOCH = "1970-01-01T00:00:00.000Z"
+NAME = re.compile(r"^(?P<station>.+?)_(?P<date>\d{6}|\d{4})(?:_(?P<time>\d{6}|\d{4}))?(?:_(?P<rest>[^.]+))?\.(?P<ext>[\w.]+)$")
+
+_lock = threading.Lock()
+_thread_local = threading.local()
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Fleet_catalog :: {message}", flush=True)
+
+def parse_name(name):
+    """{'kind', 'taken' (YYYY-MM-DD HH:MM:SS), 'burst', 'prefix'} of a station file name, or None."""
+    match = NAME.match(name)
+    if not match:
+        return None
+    date, clock, rest, ext = match.group("date"), match.group("time") or "", match.group("rest") or "", match.group("ext")
+    taken = f"20{date[0:2]}-{date[2:4]}-{date[4:6] or '01'} {clock[0:2] or '00'}:{clock[2:4] or '00'}:{clock[4:6] or '00'}"
+    burst = None
+    if ext == "jpg" and rest.isdigit():
+        kind, burst = "rgb", int(rest)
+    elif ext == "jpg" and rest.endswith("_preview") and rest.split("_")[0].isdigit():
+        kind, burst = "preview", int(rest.split("_")[0])
+    elif ext in ("zip", "tirc") and rest == "TIR":
+        kind = "tir"
+    elif ext == "txt" and rest in ("Temp", "TIRroi"):
+        kind = rest.lower()
+    elif ext == "log.gz":
+        kind = "log"
+    else:
+        return None
+    return {"kind": kind, "taken": taken, "burst": burst, "prefix": match.group("station")}
+
+def catalog_path(store):
+    return os.path.join(store, "fleet_catalog.db")
+
+def open_catalog(path):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                            file_id TEXT PRIMARY KEY,
+                            station TEXT NOT NULL,
+                            name TEXT NOT NULL,
+                            kind TEXT,
+                            taken TEXT,
+                            burst INTEGER,
+                            size INTEGER,
+                            md5 TEXT,
+                            modified TEXT NOT NULL,
+                            local_path TEXT,
+                            state TEXT NOT NULL DEFAULT 'pending')""")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_station_taken ON files (station, taken)")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_kind_taken ON files (kind, taken)")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_state ON files (state)")
+        conn.execute("""CREATE TABLE IF NOT EXISTS cursors (
+                            station TEXT PRIMARY KEY,
+                            parent TEXT NOT NULL,
+                            modified TEXT NOT NULL,
+                            synced REAL NOT NULL)""")
+    return conn
+
+def get_cursor(conn, station):
+    with _lock:
+        row = conn.execute("SELECT modified FROM cursors WHERE station = ?", (station,)).fetchone()
+    return row["modified"] if row else EPOCH
+
+def record_page(conn, station, parent, files):
+    """Add/update the files of a listing page and move the station cursor in one transaction."""
+    rows = []
+    for file in files:
+        parsed = parse_name(file["name"]) or {}
+        rows.append((file["id"], station, file["name"], parsed.get("kind"), parsed.get("taken"), parsed.get("burst"),
+                     int(file.get("size", 0)), file.get("md5Checksum"), file["modifiedTime"]))
+    with _lock, conn:
+        # A file listed again (same id) keeps its download state unless it changed in GDrive
+        conn.executemany("""INSERT INTO files (file_id, station, name, kind, taken, burst, size, md5, modified)
+                            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                            ON CONFLICT (file_id) DO UPDATE SET
+                                name = excluded.name, size = excluded.size, md5 = excluded.md5, modified = excluded.modified,
+                                state = CASE WHEN files.md5 IS excluded.md5 THEN files.state ELSE 'pending' END""", rows)
+        # Same name uploaded again (retried upload): only the newest copy is downloaded
+        conn.executemany("""UPDATE files SET state = 'superseded'
+                            WHERE station = ? AND name = ? AND state != 'superseded' AND file_id != (
+                                SELECT file_id FROM files WHERE station = ? AND name = ? ORDER BY modified DESC, file_id DESC LIMIT 1)""",
+                         [(station, row[2], station, row[2]) for row in rows])
+        if files:
+            conn.execute("INSERT OR REPLACE INTO cursors (station, parent, modified, synced) VALUES (?, ?, ?, ?)",
+                         (station, parent, max(file["modifiedTime"] for file in files), time.time()))
+
+def log_in(token_path):
+    from google.oauth2.credentials import Credentials
+    from google.auth.transport.requests import Request
+    creds = Credentials.from_authorized_user_file(token_path, SCOPES)
+    if not creds.valid and creds.refresh_token:
+        creds.refresh(Request())
+    return creds
+
+def drive_service(creds, api_endpoint=None):
+    from googleapiclient.discovery import build, build_from_document
+    from googleapiclient import discovery_cache
+    if api_endpoint is None:
+        return build("drive", "v3", credentials=creds)
+    document = json.loads(discovery_cache.get_static_doc("drive", "v3"))
+    document["rootUrl"] = api_endpoint
+    document["baseUrl"] = api_endpoint + document["servicePath"]
+    return build_from_document(document, credentials=creds)
+
+def drive_http(creds):
+    # One connection per thread (httplib2 is not thread-safe)
+    from google_auth_httplib2 import AuthorizedHttp
+    from googleapiclient.http import build_http
+    if getattr(_thread_local, "http", None) is None:
+        _thread_local.http = AuthorizedHttp(creds, http=build_http())
+    return _thread_local.http
+
+def sync_station(service, creds, conn, station, parent):
+    """List the files modified since the station cursor. Return the number of files listed."""
+    cursor = get_cursor(conn, station)
+    # >= (not >): files sharing the cursor timestamp are listed again instead of being missed
+    query = f"'{parent}' in parents and trashed=false and modifiedTime >= '{cursor}' and mimeType != 'application/vnd.google-apps.folder'"
+    listed, page_token = 0, None
+    while True:
+        response = service.files().list(q=query, orderBy="modifiedTime", pageSize=PAGE_SIZE, pageToken=page_token, spaces="drive",
+                                        fields="nextPageToken, files(id, name, size, md5Checksum, modifiedTime)").execute(http=drive_http(creds))
+        files = response.get("files", [])
+        record_page(conn, station, parent, files)
+        listed = listed + len(files)
+        page_token = response.get("nextPageToken")
+        if not page_token:
+            return listed
+
+def local_path(store, row):
+    month = (row["taken"] or row["modified"])[0:7].replace("-", "")[2:]
+    return os.path.join(store, row["station"], month, row["name"])
+
+def md5sum(path):
+    digest = hashlib.md5()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def download_file(service, creds, conn, store, row):
+    """Download (or continue) one file. Return the bytes transferred."""
+    from googleapiclient.errors import HttpError
+    target = local_path(store, row)
+    part = target + ".part"
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    size = row["size"] or 0
+    offset = os.path.getsize(part) if os.path.exists(part) else 0
+    if offset > size:
+        offset = 0  # the file changed in GDrive: start again
+    start = offset
+    with open(part, "r+b" if offset else "wb") as f:
+        f.seek(offset)
+        f.truncate()
+        if offset < size:
+            # Plain Range requests on the media URL: every chunk starts after the bytes already on disk
+            request = service.files().get_media(fileId=row["file_id"])
+            http = drive_http(creds)  # the connection of this worker thread
+            while offset < size:
+                headers = dict(request.headers, range=f"bytes={offset}-{min(offset + CHUNK_SIZE, size) - 1}")
+                resp, content = http.request(request.uri, "GET", headers=headers)
+                if resp.status == 200:
+                    start, offset = 0, 0  # whole file sent (Range ignored)
+                    f.seek(0)
+                    f.truncate()
+                elif resp.status != 206:
+                    raise HttpError(resp, content, uri=request.uri)
+                if not content:
+                    raise Exception(f"empty response at byte {offset} of {row['name']}")
+                f.write(content)
+                offset = offset + len(content)
+    if row["md5"] and md5sum(part) != row["md5"]:
+        os.remove(part)
+        with _lock, conn:
+            conn.execute("UPDATE files SET state = 'failed' WHERE file_id = ?", (row["file_id"],))
+        raise Exception(f"MD5 of {row['name']} does not match GDrive")
+    os.replace(part, target)
+    with _lock, conn:
+        conn.execute("UPDATE files SET state = 'done', local_path = ? WHERE file_id = ?", (target, row["file_id"]))
+    return size - start
+
+def download_pending(service, creds, conn, store, workers=4, stations=None):
+    with _lock:
+        rows = [dict(row) for row in conn.execute("SELECT * FROM files WHERE state IN ('pending', 'failed') ORDER BY taken")]
+    if stations:
+        rows = [row for row in rows if row["station"] in stations]
+    if not rows:
+        return 0, 0
+    _print(f"{len(rows)} files to download ({sum(row['size'] or 0 for row in rows) / 1e6:.1f} MB) with {workers} workers")
+
+    done, transferred = 0, 0
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(download_file, service, creds, conn, store, row): row for row in rows}
+        for future in as_completed(futures):
+            try:
+                transferred = transferred + future.result()
+                done = done + 1
+            except Exception as e:
+                _print(f"ERROR: {futures[future]['name']} not downloaded: {e}")
+    return done, transferred
+
+def query(conn, station=None, kind=None, start=None, end=None, downloaded=False):
+    sql, values = "SELECT * FROM files WHERE state != 'superseded'", []
+    for column, operator, value in (("station", "=", station), ("kind", "=", kind), ("taken", ">=", start), ("taken", "<", end)):
+        if value is not None:
+            sql, values = sql + f" AND {column} {operator} ?", values + [value]
+    if downloaded:
+        sql = sql + " AND state = 'done'"
+    with _lock:
+        return [dict(row) for row in conn.execute(sql + " ORDER BY taken, station, name", values)]
+
+def stations_of(names):
+    return {name: STATIONS[name] for name in (names or STATIONS)}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Incremental copy and catalog of the GDrive folders of the AI4Glaciers stations')
+    parser.add_argument('command', choices=['sync', 'download', 'query'], help='sync: list new files (and download them with --download)')
+    parser.add_argument('--store', type=str, required=True, help='Local folder of the copy and the catalog')
+    parser.add_argument('--stations', type=str, nargs='+', default=None, choices=list(STATIONS), help='Stations (all by default)')
+    parser.add_argument('--download', action='store_true', help='Download the new files after the sync')
+    parser.add_argument('--workers', type=int, default=4, help='Parallel downloads')
+    parser.add_argument('--token', type=str, default='token.json', help='OAuth token with access to the station folders')
+    parser.add_argument('--api_endpoint', type=str, default=None, help='Root URL of a Drive stand-in (benchmarks)')
+    parser.add_argument('--station', type=str, default=None, help='query: station')
+    parser.add_argument('--kind', type=str, default=None, choices=['rgb', 'preview', 'tir', 'temp', 'tirroi', 'log'], help='query: file type')
+    parser.add_argument('--start', type=str, default=None, help='query: from YYYY-MM-DD[ HH:MM]')
+    parser.add_argument('--end', type=str, default=None, help='query: before YYYY-MM-DD[ HH:MM]')
+    args = parser.parse_args()
+
+    os.makedirs(args.store, exist_ok=True)
+    conn = open_catalog(catalog_path(args.store))
+    start = time.time()
+    if args.command == 'query':
+        rows = query(conn, args.station, args.kind, args.start, args.end)
+        for row in rows:
+            print(f"{row['taken']}  {row['station']:<12} {row['kind'] or '-':<8} {row['size'] or 0:>10}  {row['state']:<8} {row['name']}")
+        _print(f"{len(rows)} files in {(time.time() - start) * 1000:.1f} ms")
+    else:
+        creds = log_in(args.token)
+        service = drive_service(creds, args.api_endpoint)
+        if args.command == 'sync':
+            for station, parent in stations_of(args.stations).items():
+                try:
+                    cursor = get_cursor(conn, station)
+                    _print(f"{station}: {sync_station(service, creds, conn, station, parent)} files listed since {cursor}")
+                except Exception as e:
+                    _print(f"ERROR: {station} not synchronised: {e}")
+        if args.command == 'download' or args.download:
+            done, transferred = download_pending(service, creds, conn, args.store, args.workers, args.stations)
+            _print(f"{done} files downloaded ({transferred / 1e6:.1f} MB)")
+        _print(f"Completed in {time.time() - start:.2f} s")
@@ -56,6 +56,8 @@ pip install --upgrade google-api-python-client google-auth-httplib2 google-auth-
 pip install --upgrade sh
 pip install --upgrade astral
 pip install --upgrade pytz
+pip install --upgrade numpy pillow
+pip install --upgrade gphoto2
 
 # Download the i3system SDK installer and give it executable permissions
 echo "Downloading i3system SDK installer..."
@@ -96,6 +98,28 @@ wget -O $SCRIPTS_DIR/4_GDrive.py https://github.com/xabierblanch/IA4Glaciers_cam
 wget -O $SCRIPTS_DIR/5_shutdown.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/5_shutdown.py
 wget -O $SCRIPTS_DIR/0_day_night.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/0_day_night.py
 wget -O $SCRIPTS_DIR/AI4Glaciers.sh https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/AI4Glaciers.sh
+wget -O $SCRIPTS_DIR/AI4Glaciers.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/AI4Glaciers.py
+wget -O $SCRIPTS_DIR/upload_journal.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/upload_journal.py
+wget -O $SCRIPTS_DIR/sun_table.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/sun_table.py
+wget -O $SCRIPTS_DIR/tir_packager.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/tir_packager.py
+wget -O $SCRIPTS_DIR/tir_container.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/tir_container.py
+wget -O $SCRIPTS_DIR/usb_mirror.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/usb_mirror.py
+wget -O $SCRIPTS_DIR/retention.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/retention.py
+wget -O $SCRIPTS_DIR/upload_scheduler.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/upload_scheduler.py
+wget -O $SCRIPTS_DIR/camera_session.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/camera_session.py
+wget -O $SCRIPTS_DIR/camera_backends.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/camera_backends.py
+wget -O $SCRIPTS_DIR/w1_sampler.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/w1_sampler.py
+wget -O $SCRIPTS_DIR/temp_series.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/temp_series.py
+wget -O $SCRIPTS_DIR/log_shipper.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/log_shipper.py
+wget -O $SCRIPTS_DIR/drive_cache.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/drive_cache.py
+wget -O $SCRIPTS_DIR/metrics.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/metrics.py
+wget -O $SCRIPTS_DIR/rgb_preview.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/rgb_preview.py
+wget -O $SCRIPTS_DIR/rgb_quality.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/rgb_quality.py
+wget -O $SCRIPTS_DIR/tir_roi.py https://github.com/xabierblanch/IA4Glaciers_cams/raw/refs/heads/main/tir_roi.py
+
+# Precompute the sunrise/sunset table so 0_day_night.py does not need astral on every boot
+echo "Generating sunrise/sunset table..."
+python3 $SCRIPTS_DIR/sun_table.py --years=5
 
 # Check if the IA4Glaciers.sh script exists in the directory and give it executable permissions
 echo "Checking if IA4Glaciers.sh exists..."
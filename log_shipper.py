@@ -0,0 +1,133 @@
+##############################################################################################
+# log_shipper: Incremental shipping of the system logs to Google Drive                       #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# The last shipped byte offset of every log (and its inode) is kept in STATE_PATH. Each cycle only
+# the new complete lines are sent, as a gzip segment with a new name (AI4G_yymmdd_HHMMSS.log.gz),
+# so no files().list query and no overwrite of the monthly log are needed. The offset only moves
+# after GDrive confirmed the segment. When 1_maintenance rotates a log at the start of a month it
+# calls rotate(): the unsent tail is then read from the backup copy, and the new log starts at 0.
+
+import os
+import gzip
+import sqlite3
+import threading
+import time
+from datetime import datetime
+
+STATE_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "log_shipper.db")
+
+_lock = threading.Lock()
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: GDrive_LOG :: {message}", flush=True)
+
+def open_state(path=STATE_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS logs (
+                            path TEXT PRIMARY KEY,
+                            inode INTEGER,
+                            offset INTEGER NOT NULL DEFAULT 0,
+                            updated REAL NOT NULL)""")
+        conn.execute("""CREATE TABLE IF NOT EXISTS rotated (
+                            source TEXT PRIMARY KEY,
+                            path TEXT NOT NULL,
+                            offset INTEGER NOT NULL,
+                            rotated REAL NOT NULL)""")
+    return conn
+
+def _log_row(conn, log_path):
+    with _lock:
+        row = conn.execute("SELECT * FROM logs WHERE path = ?", (log_path,)).fetchone()
+    return dict(row) if row else {"path": log_path, "inode": None, "offset": 0}
+
+def _start_offset(row, stat):
+    # A log deleted or truncated outside rotate() starts again from the beginning
+    if row["inode"] is not None and (row["inode"] != stat.st_ino or stat.st_size < row["offset"]):
+        _print(f"{os.path.basename(row['path'])} was replaced outside the monthly rotation: shipping from the start")
+        return 0
+    return row["offset"]
+
+def rotate(log_path, backup_path, state_path=STATE_PATH):
+    """Called before the log is deleted: its unsent tail will be shipped from `backup_path`."""
+    conn = open_state(state_path)
+    try:
+        row = _log_row(conn, log_path)
+        offset = row["offset"]
+        try:
+            stat = os.stat(log_path)
+            offset = _start_offset(row, stat)
+        except OSError:
+            pass
+        with _lock, conn:
+            conn.execute("INSERT OR REPLACE INTO rotated (source, path, offset, rotated) VALUES (?, ?, ?, ?)",
+                         (backup_path, log_path, offset, time.time()))
+            conn.execute("INSERT OR REPLACE INTO logs (path, inode, offset, updated) VALUES (?, NULL, 0, ?)",
+                         (log_path, time.time()))
+    finally:
+        conn.close()
+
+def _pieces(conn, log_path):
+    """[(source, start, end, rotated)] still to ship for a log: rotated tails first, then the live log."""
+    pieces = []
+    with _lock:
+        rotated = [dict(row) for row in conn.execute("SELECT * FROM rotated WHERE path = ? ORDER BY rotated", (log_path,))]
+    for row in rotated:
+        try:
+            size = os.path.getsize(row["source"])
+        except OSError:
+            _print(f"ERROR: Rotated log {os.path.basename(row['source'])} not found. Its tail is lost")
+            size = row["offset"]
+        if size <= row["offset"]:
+            with _lock, conn:
+                conn.execute("DELETE FROM rotated WHERE source = ?", (row["source"],))
+            continue
+        pieces.append((row["source"], row["offset"], size, True))
+    try:
+        stat = os.stat(log_path)
+        pieces.append((log_path, _start_offset(_log_row(conn, log_path), stat), stat.st_size, False))
+    except OSError:
+        pass
+    return [piece for piece in pieces if piece[2] > piece[1]]
+
+def pending_bytes(conn, log_path):
+    return sum(end - start for _, start, end, _ in _pieces(conn, log_path))
+
+def next_segment(conn, log_path):
+    """Next segment to ship as {'source', 'start', 'end', 'rotated', 'inode', 'name', 'data'}, or None."""
+    for source, start, end, rotated in _pieces(conn, log_path):
+        with open(source, "rb") as f:
+            inode = os.fstat(f.fileno()).st_ino
+            f.seek(start)
+            data = f.read(end - start)
+        if not rotated:
+            # The live log is still being written: only complete lines are shipped
+            cut = data.rfind(b"\n")
+            if cut < 0:
+                continue
+            data = data[:cut + 1]
+        stem = os.path.splitext(os.path.basename(source))[0]
+        name = f"{stem}_{datetime.now().strftime('%y%m%d_%H%M%S')}.log.gz"
+        return {"source": source, "start": start, "end": start + len(data), "rotated": rotated, "inode": inode,
+                "name": name, "data": gzip.compress(data, compresslevel=9)}
+    return None
+
+def commit(conn, log_path, segment):
+    """Record a segment confirmed by GDrive."""
+    with _lock, conn:
+        if segment["rotated"]:
+            conn.execute("DELETE FROM rotated WHERE source = ?", (segment["source"],))
+        else:
+            conn.execute("INSERT OR REPLACE INTO logs (path, inode, offset, updated) VALUES (?, ?, ?, ?)",
+                         (log_path, segment["inode"], segment["end"], time.time()))
@@ -0,0 +1,119 @@
+##############################################################################################
+# metrics: JSON-lines metrics of every stage of the wake cycle and monthly summary           #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# One JSON object per line in /home/pi/AI4G_metrics_yymm.jsonl:
+#   {"time": ..., "cycle": "261018_0715", "stage": "upload", "duration": 4.2, "bytes": ..., ...}
+# Every record is written with a single O_APPEND write, so stages running in parallel threads
+# (or a crash) never leave mixed lines. The cycle id is set by AI4Glaciers.py for all the stages.
+#
+# Usage: python3 metrics.py summary [--month 2610] [--stage upload]
+
+import os
+import json
+import time
+import argparse
+import threading
+from datetime import datetime
+
+METRICS_DIR = os.environ.get('AI4G_BASE', '/home/pi')
+CYCLE_ENV = "AI4G_CYCLE"
+PERCENTILES = (50, 90, 99)
+
+_lock = threading.Lock()
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Metrics :: {message}", flush=True)
+
+def metrics_path(month=None, metrics_dir=METRICS_DIR):
+    month = month or datetime.now().strftime("%y%m")
+    return os.path.join(metrics_dir, f"AI4G_metrics_{month}.jsonl")
+
+def start_cycle(boot=None):
+    """Cycle id shared by every stage of this wake cycle (also by the stages run as scripts)."""
+    os.environ[CYCLE_ENV] = datetime.fromtimestamp(boot or time.time()).strftime("%y%m%d_%H%M")
+    return os.environ[CYCLE_ENV]
+
+def record(stage, duration=None, path=None, **fields):
+    entry = {"time": round(time.time(), 3), "cycle": os.environ.get(CYCLE_ENV), "stage": stage}
+    if duration is not None:
+        entry["duration"] = round(duration, 3)
+    entry.update(fields)
+    line = (json.dumps(entry, separators=(",", ":"), default=str) + "\n").encode()
+    try:
+        with _lock:
+            fd = os.open(path or metrics_path(), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+            try:
+                os.write(fd, line)
+            finally:
+                os.close(fd)
+    except OSError as e:
+        _print(f"ERROR writing metrics: {e}")
+    return entry
+
+def load(paths):
+    records = []
+    for path in paths:
+        try:
+            with open(path, "r") as f:
+                for line in f:
+                    try:
+                        records.append(json.loads(line))
+                    except ValueError:
+                        continue  # line cut by a power loss
+        except OSError as e:
+            _print(f"ERROR reading {path}: {e}")
+    return records
+
+def percentile(values, p):
+    values = sorted(values)
+    if not values:
+        return None
+    k = (len(values) - 1) * p / 100
+    low = int(k)
+    high = min(low + 1, len(values) - 1)
+    return values[low] + (values[high] - values[low]) * (k - low)
+
+def summarise(records, fields=("duration", "bytes", "files", "retries")):
+    """{(stage, field): {"n", "sum", "p50", "p90", "p99", "max"}} of the numeric fields."""
+    values = {}
+    for entry in records:
+        for field in fields:
+            value = entry.get(field)
+            if isinstance(value, (int, float)) and not isinstance(value, bool):
+                values.setdefault((entry.get("stage"), field), []).append(value)
+    summary = {}
+    for key, series in sorted(values.items(), key=lambda item: (str(item[0][0]), item[0][1])):
+        stats = {"n": len(series), "sum": sum(series), "max": max(series)}
+        stats.update({f"p{p}": percentile(series, p) for p in PERCENTILES})
+        summary[key] = stats
+    return summary
+
+def print_summary(summary):
+    print(f"{'stage':<22} {'field':<9} {'n':>6} {'p50':>11} {'p90':>11} {'p99':>11} {'max':>11} {'sum':>13}")
+    for (stage, field), stats in summary.items():
+        print(f"{str(stage):<22} {field:<9} {stats['n']:>6} " +
+              " ".join(f"{stats[key]:>11.2f}" for key in ("p50", "p90", "p99", "max")) + f" {stats['sum']:>13.2f}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Summary of the AI4Glaciers stage metrics')
+    parser.add_argument('command', choices=['summary'], help='summary: percentiles per stage')
+    parser.add_argument('--month', type=str, nargs='+', default=[datetime.now().strftime("%y%m")], help='Months (yymm) to summarise')
+    parser.add_argument('--dir', type=str, default=METRICS_DIR, help='Folder of the metrics files')
+    parser.add_argument('--stage', type=str, default=None, help='Only this stage')
+    args = parser.parse_args()
+    records = load(metrics_path(month, args.dir) for month in args.month)
+    if args.stage:
+        records = [entry for entry in records if entry.get("stage") == args.stage]
+    cycles = {entry.get("cycle") for entry in records if entry.get("cycle")}
+    _print(f"{len(records)} records from {len(cycles)} wake cycles")
+    print_summary(summarise(records))
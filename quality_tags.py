@@ -0,0 +1,66 @@
+##############################################################################################
+# quality_tags: Upload tags of the DSLR images, kept in SQLite between the stages            #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# rgb_quality.py tags every image (keep / defer / drop) and 4_GDrive.py reads the tags while the
+# image is in the FileTransfer folder. The tag store has no numpy dependency, so the upload stage
+# does not load numpy on every wake cycle just to read a few rows.
+
+import os
+import sqlite3
+import threading
+import time
+
+QUALITY_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "rgb_quality.db")
+KEEP, DEFER, DROP = "keep", "defer", "drop"
+
+_lock = threading.Lock()
+
+def open_quality(path=QUALITY_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS frames (
+                            name TEXT PRIMARY KEY,
+                            tag TEXT NOT NULL,
+                            brightness REAL,
+                            spread REAL,
+                            sharpness REAL,
+                            dhash TEXT,
+                            distance INTEGER,
+                            assessed REAL NOT NULL)""")
+    return conn
+
+def record(conn, path, tag, stats, distance):
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO frames (name, tag, brightness, spread, sharpness, dhash, distance, assessed) "
+                     "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                     (os.path.basename(path), tag, stats["brightness"], stats["spread"], stats["sharpness"],
+                      f"{stats['dhash']:016x}", distance, time.time()))
+
+def get_tag(conn, name):
+    with _lock:
+        row = conn.execute("SELECT tag FROM frames WHERE name = ?", (name,)).fetchone()
+    return row["tag"] if row else None
+
+def forget(conn, name):
+    with _lock, conn:
+        conn.execute("DELETE FROM frames WHERE name = ?", (name,))
+
+def prune_missing(conn, folder):
+    """Forget the frames no longer in `folder` (uploaded, or dropped frames removed by the maintenance script)."""
+    try:
+        names = set(os.listdir(folder))
+    except OSError:
+        return 0
+    with _lock, conn:
+        gone = [row["name"] for row in conn.execute("SELECT name FROM frames") if row["name"] not in names]
+        conn.executemany("DELETE FROM frames WHERE name = ?", [(name,) for name in gone])
+    return len(gone)
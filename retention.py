@@ -0,0 +1,118 @@
+##############################################################################################
+# retention: Storage-budget retention for the FileTransfer, backup and log folders           #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Every file gets a tier: 0 = confirmed in GDrive (upload journal), 1 = verified copy on the USB stick
+# (USB manifest) or a folder marked as safe, 2 = the only copy. Files are deleted oldest first and by
+# tier: tiers 0-1 to respect the age limit, the folder budgets and the free-space target; tier 2
+# only when the free space of the SD card falls below the critical limit.
+
+import os
+import shutil
+from datetime import datetime
+import upload_journal
+import usb_mirror
+import metrics
+
+UPLOADED, MIRRORED, UNSYNCED = 0, 1, 2
+TIER_NAMES = {UPLOADED: "uploaded", MIRRORED: "on USB", UNSYNCED: "unsynced"}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Maintenance :: {message}")
+
+def load_sync_state(journal_path=upload_journal.JOURNAL_PATH, manifest_path=usb_mirror.MANIFEST_PATH):
+    uploaded, mirrored = set(), {}
+    if os.path.exists(journal_path):
+        conn = upload_journal.open_journal(journal_path)
+        uploaded = {entry["path"] for entry in upload_journal.list_entries(conn, upload_journal.UPLOADED)}
+        conn.close()
+    if os.path.exists(manifest_path):
+        conn = usb_mirror.open_manifest(manifest_path)
+        mirrored = {row["name"]: row["size"] for row in conn.execute("SELECT name, size FROM files")}
+        conn.close()
+    return uploaded, mirrored
+
+def scan(path, safe, uploaded, mirrored):
+    """One scandir pass: [path, name, size, mtime, tier] of every file of the folder."""
+    files = []
+    for entry in os.scandir(path):
+        if not entry.is_file(follow_symlinks=False):
+            continue
+        stat = entry.stat()
+        if entry.path in uploaded:
+            tier = UPLOADED
+        elif safe or mirrored.get(entry.name) == stat.st_size:
+            tier = MIRRORED
+        else:
+            tier = UNSYNCED
+        files.append([entry.path, entry.name, stat.st_size, stat.st_mtime, tier])
+    return files
+
+def delete(file, reason):
+    try:
+        os.unlink(file[0])
+        _print(f"Retention: {file[1]} ({TIER_NAMES[file[4]]}) deleted - {reason}")
+        return True
+    except Exception as e:
+        _print(f"ERROR deleting {file[1]}: {e}")
+        return False
+
+def enforce(folders, min_free, critical_free, day_threshold=None, device=None):
+    """Apply the retention policy.
+
+    folders: {path: (budget in bytes or None, safe)} on the same device.
+    min_free / critical_free: free bytes to keep on the device with synced / with any data.
+    """
+    enforce_start = datetime.now().timestamp()
+    uploaded, mirrored = load_sync_state()
+    remaining, deleted = {}, 0
+    now = datetime.now().timestamp()
+    for path, (budget, safe) in folders.items():
+        if not os.path.exists(path):
+            _print(f"ERROR: {path} does not exist.")
+            continue
+        files = sorted(scan(path, safe, uploaded, mirrored), key=lambda f: (f[4], f[3]))
+        total = sum(f[2] for f in files)
+        keep = []
+        for file in files:
+            expired = day_threshold is not None and (now - file[3]) / (24 * 3600) >= day_threshold
+            over_budget = budget is not None and total > budget
+            if file[4] != UNSYNCED and (expired or over_budget):
+                reason = f"older than {day_threshold} days" if expired else f"{os.path.basename(path)} over its {budget / 1e6:.0f} MB budget"
+                if delete(file, reason):
+                    total = total - file[2]
+                    deleted = deleted + 1
+                    continue
+            keep.append(file)
+        remaining[path] = keep
+        _print(f"Retention: {os.path.basename(path)} uses {total / 1e6:.1f} MB in {len(keep)} files")
+
+    device = device or next(iter(folders))
+    candidates = sorted((f for files in remaining.values() for f in files), key=lambda f: (f[4], f[3]))
+    free = shutil.disk_usage(device).free
+    for file in candidates:
+        if free >= min_free:
+            break
+        if file[4] == UNSYNCED and free >= critical_free:
+            # Never drop the only copy of a file unless the SD card is about to fill up
+            break
+        limit = "critical free space" if file[4] == UNSYNCED else "free space target"
+        if delete(file, f"{free / 1e6:.0f} MB free, below the {limit}"):
+            free = free + file[2]
+            deleted = deleted + 1
+
+    if deleted == 0:
+        _print(f"Retention: No files deleted ({free / 1e6:.0f} MB free)")
+    else:
+        _print(f"Retention: {deleted} files deleted ({free / 1e6:.0f} MB free)")
+    metrics.record("retention", datetime.now().timestamp() - enforce_start, files=deleted, free=free)
+    return deleted
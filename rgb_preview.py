@@ -0,0 +1,73 @@
+##############################################################################################
+# rgb_preview: Low-resolution previews of the DSLR images, uploaded before the originals     #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# ID_yymmdd_HHMM_n.jpg -> ID_yymmdd_HHMM_n_preview.jpg in the {ID}_RGB_preview folder (not synced
+# to the USB stick: the original is there). The JPEG is decoded in draft mode, so libjpeg scales the
+# DCT blocks by 1/2, 1/4 or 1/8 and never builds the full-resolution image; only the last step to
+# PREVIEW_SIZE is resampled. GDrive uploads the previews (PRV) before any original.
+#
+# Usage: python3 rgb_preview.py <image.jpg> [...] --out <folder> [--size 800] [--quality 60]
+
+import os
+import time
+import argparse
+from datetime import datetime
+
+PREVIEW_SIZE = 800  # pixels of the long side
+PREVIEW_QUALITY = 60
+SUFFIX = "_preview"
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: RGB_preview :: {message}")
+
+def preview_name(name):
+    stem, extension = os.path.splitext(name)
+    return f"{stem}{SUFFIX}{extension}"
+
+def make_preview(image_path, preview_dir, size=PREVIEW_SIZE, quality=PREVIEW_QUALITY):
+    """Write the preview of `image_path` in `preview_dir` and return its path."""
+    from PIL import Image
+    target = os.path.join(preview_dir, preview_name(os.path.basename(image_path)))
+    with Image.open(image_path) as img:
+        scale = size / max(img.size)
+        img.draft("RGB", (max(1, int(img.size[0] * scale)), max(1, int(img.size[1] * scale))))
+        img = img.convert("RGB")
+        img.thumbnail((size, size), Image.BILINEAR)
+        img.save(target + ".tmp", "JPEG", quality=quality, optimize=True, progressive=True)
+    os.replace(target + ".tmp", target)
+    return target
+
+def make_previews(images, preview_dir, size=PREVIEW_SIZE, quality=PREVIEW_QUALITY):
+    """Previews of a burst. Errors are reported per image: the originals are never touched."""
+    os.makedirs(preview_dir, exist_ok=True)
+    previews = []
+    for image_path in images:
+        try:
+            previews.append(make_preview(image_path, preview_dir, size, quality))
+        except Exception as e:
+            _print(f"ERROR: Preview of {os.path.basename(image_path)} not created")
+            _print(f"ERROR: {e}")
+    return previews
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Low-resolution previews of DSLR images')
+    parser.add_argument('images', type=str, nargs='+', help='JPEG images')
+    parser.add_argument('--out', type=str, required=True, help='Folder of the previews')
+    parser.add_argument('--size', type=int, default=PREVIEW_SIZE, help='Pixels of the long side')
+    parser.add_argument('--quality', type=int, default=PREVIEW_QUALITY, help='JPEG quality of the previews')
+    args = parser.parse_args()
+    start = time.time()
+    previews = make_previews(args.images, args.out, args.size, args.quality)
+    original = sum(os.path.getsize(path) for path in args.images)
+    reduced = sum(os.path.getsize(path) for path in previews)
+    _print(f"{len(previews)} previews in {time.time() - start:.2f} s: {reduced / 1024:.0f} KB instead of {original / 1024:.0f} KB")
@@ -0,0 +1,107 @@
+##############################################################################################
+# rgb_quality: Quality gate of the DSLR bursts before the upload                             #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Every downloaded image is decoded in draft mode (grey, 1/8 of the size) and gets:
+#   brightness = mean grey level, spread = p95 - p5 of the grey levels,
+#   sharpness = variance of the 4-neighbour Laplacian,
+#   dhash = 64-bit difference hash, distance = bits that differ from the last kept frame of the burst.
+# Tags: "drop"  too dark, saturated, flat or without detail (twilight, fog, whiteout): never uploaded,
+#       "defer" blurred or a near-duplicate of a kept frame: uploaded after everything else,
+#       "keep"  uploaded as usual.
+# The tags only affect the uplink: every image is still copied to the USB stick. They are kept in
+# QUALITY_PATH (quality_tags) for 4_GDrive.py while the image is in the FileTransfer folder.
+#
+# Usage: python3 rgb_quality.py <image.jpg> [...]   (statistics and tag of every image)
+
+import os
+import argparse
+import time
+from datetime import datetime
+
+import numpy as np
+
+from quality_tags import QUALITY_PATH, KEEP, DEFER, DROP, open_quality, get_tag, forget, prune_missing
+import quality_tags
+
+DECODE_SCALE = 8  # JPEG DCT scaling of the draft decode
+DARK, SATURATED = 20.0, 245.0  # mean grey level limits
+FLAT = 12.0  # minimum p95 - p5 spread
+SHARP = 15.0  # minimum Laplacian variance (grey levels^2 at 1/8 of the size)
+FOG = 3.0  # Laplacian variance below which a low-contrast frame (spread < 3 * FLAT) is fog
+DUPLICATE = 5  # maximum differing hash bits of a near-duplicate
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: RGB_quality :: {message}")
+
+def load_grey(path, scale=DECODE_SCALE):
+    from PIL import Image
+    with Image.open(path) as img:
+        img.draft("L", (img.size[0] // scale, img.size[1] // scale))
+        return np.asarray(img.convert("L"), dtype=np.float32)
+
+def dhash(grey):
+    """Difference hash: 9x8 thumbnail, one bit per horizontal gradient sign."""
+    from PIL import Image
+    small = np.asarray(Image.fromarray(grey).resize((9, 8), Image.BILINEAR), dtype=np.float32)
+    bits = (small[:, 1:] > small[:, :-1]).ravel()
+    return int(np.packbits(bits).view(">u8")[0])
+
+def frame_stats(grey):
+    low, high = np.percentile(grey, [5, 95])
+    laplacian = grey[1:-1, :-2] + grey[1:-1, 2:] + grey[:-2, 1:-1] + grey[2:, 1:-1] - 4 * grey[1:-1, 1:-1]
+    return {"brightness": float(grey.mean()), "spread": float(high - low), "sharpness": float(laplacian.var()),
+            "dhash": dhash(grey)}
+
+def classify(stats, previous_hash=None):
+    """(tag, distance) of the statistics of a frame."""
+    distance = None if previous_hash is None else bin(stats["dhash"] ^ previous_hash).count("1")
+    if stats["brightness"] < DARK or stats["brightness"] > SATURATED or stats["spread"] < FLAT:
+        return DROP, distance
+    if stats["sharpness"] < FOG and stats["spread"] < 3 * FLAT:
+        return DROP, distance
+    if stats["sharpness"] < SHARP or (distance is not None and distance <= DUPLICATE):
+        return DEFER, distance
+    return KEEP, distance
+
+def assess(images, conn=None):
+    """Tag a burst (in shooting order). Return [{'path', 'tag', 'distance', stats...}]."""
+    results = []
+    previous_hash = None
+    for path in images:
+        try:
+            stats = frame_stats(load_grey(path))
+        except Exception as e:
+            _print(f"ERROR: {os.path.basename(path)} could not be assessed: {e}")
+            continue  # no tag: uploaded as usual
+        tag, distance = classify(stats, previous_hash)
+        if tag == KEEP:
+            previous_hash = stats["dhash"]
+        results.append(dict(stats, path=path, tag=tag, distance=distance))
+        if conn is not None:
+            quality_tags.record(conn, path, tag, stats, distance)
+    return results
+
+def describe(result):
+    distance = "-" if result["distance"] is None else result["distance"]
+    return (f"{os.path.basename(result['path'])}: {result['tag']} (brightness {result['brightness']:.0f}, spread {result['spread']:.0f}, "
+            f"sharpness {result['sharpness']:.1f}, hash distance {distance})")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Quality statistics and upload tag of DSLR images')
+    parser.add_argument('images', type=str, nargs='+', help='JPEG images in shooting order')
+    args = parser.parse_args()
+    start = time.time()
+    results = assess(args.images)
+    for result in results:
+        _print(describe(result))
+    _print(f"{len(results)} images assessed in {time.time() - start:.2f} s")
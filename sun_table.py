@@ -0,0 +1,95 @@
+##############################################################################################
+# sun_table: Precompute sunrise/sunset times of a station into a compact binary table        #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Table layout (little endian):
+#   header  '<4siII'  magic b'SUN1', UTC offset of the local day (s), first local day (ordinal), number of days
+#   body    uint32 pairs (sunrise, sunset) as UTC epoch seconds, one pair per local day
+# 0_day_night.py only reads this file, so astral and pytz are needed only to generate it.
+# The local day uses a fixed UTC offset: with DST the shift only moves the day boundary around
+# midnight, when it is night in both rows.
+
+import os
+import sys
+import struct
+import argparse
+from array import array
+from datetime import date, datetime, timedelta
+
+TABLE_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "scripts/sun_table.bin")
+MAGIC = b"SUN1"
+HEADER = struct.Struct("<4siII")
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+STATIONS = {
+    'Calafate': (-50.474164647981034, -73.0354106241449, 'America/Argentina/Ushuaia')}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Sun_table :: {message}")
+
+def generate_table(latitude, longitude, timezone, start, years):
+    from astral import LocationInfo
+    from astral.sun import sun
+    import pytz
+
+    tz = pytz.timezone(timezone)
+    location = LocationInfo(latitude=latitude, longitude=longitude)
+    utc_offset = int(tz.utcoffset(datetime(start.year, start.month, start.day)).total_seconds())
+    count = (date(start.year + years, start.month, start.day) - start).days
+    values = array("I")
+    for day in range(count):
+        current = start + timedelta(days=day)
+        try:
+            s = sun(location.observer, date=current, tzinfo=tz)
+            values.extend([int(s["sunrise"].timestamp()), int(s["sunset"].timestamp())])
+        except ValueError:
+            # Polar day/night: no sunrise or sunset, the whole day is stored as night
+            values.extend([0, 0])
+    return utc_offset, start.toordinal(), values
+
+def write_table(path, utc_offset, start_ordinal, values):
+    if sys.byteorder != "little":
+        values.byteswap()
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(HEADER.pack(MAGIC, utc_offset, start_ordinal, len(values) // 2))
+        values.tofile(f)
+    os.replace(tmp_path, path)
+
+def lookup(path, timestamp):
+    """Return (sunrise, sunset) epochs of the local day of `timestamp`, or None outside the table."""
+    with open(path, "rb") as f:
+        magic, utc_offset, start_ordinal, count = HEADER.unpack(f.read(HEADER.size))
+        if magic != MAGIC:
+            return None
+        index = EPOCH_ORDINAL + int(timestamp + utc_offset) // 86400 - start_ordinal
+        if not 0 <= index < count:
+            return None
+        f.seek(HEADER.size + index * 8)
+        return struct.unpack("<II", f.read(8))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Generate the sunrise/sunset table used by 0_day_night.py')
+    parser.add_argument('--station', type=str, default='Calafate', choices=sorted(STATIONS), help='Station location')
+    parser.add_argument('--start', type=str, default=date.today().strftime("%Y-%m-%d"), help='First day of the table (YYYY-MM-DD)')
+    parser.add_argument('--years', type=int, default=5, help='Number of years in the table')
+    parser.add_argument('--output', type=str, default=TABLE_PATH, help='Path of the binary table')
+    args = parser.parse_args()
+    try:
+        latitude, longitude, timezone = STATIONS[args.station]
+        start = datetime.strptime(args.start, "%Y-%m-%d").date()
+        utc_offset, start_ordinal, values = generate_table(latitude, longitude, timezone, start, args.years)
+        write_table(args.output, utc_offset, start_ordinal, values)
+        _print(f"Sun table for {args.station} saved in {args.output}: {len(values) // 2} days from {start}")
+    except Exception as e:
+        _print("ERROR: Sun table not generated")
+        _print(f"ERROR: {e}")
@@ -0,0 +1,92 @@
+##############################################################################################
+# temp_series: Append-only daily/monthly series of the temperature readings                  #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Every thermal cycle appends its rows (DS18B20 sensors and the FPA/shutter values of TIRcapture)
+# to ID_yymmdd_Temp.txt (day) or ID_yymm_Temp.txt (month) in the series folder, and the region
+# statistics of the TIR frames to ID_yymmdd_TIRroi.txt (or ID_yymm_TIRroi.txt). Each append is a
+# single O_APPEND write followed by fsync; a row cut by a power loss is removed before the next
+# append. Once its day/month is over the file is moved to the TEMP FileTransfer folder, so GDrive
+# receives one upload per day (or month) instead of one small TXT per boot.
+
+import os
+import glob
+from datetime import datetime
+
+HEADER = "date,device,variable,value\n"
+KINDS = ("Temp", "TIRroi")  # temperatures and TIR region statistics (tir_roi)
+PERIODS = {'day': "%y%m%d", 'month': "%y%m"}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: TEMP_sensor :: {message}")
+
+def series_name(ID, when, period='day', kind="Temp"):
+    return f"{ID}_{when.strftime(PERIODS[period])}_{kind}.txt"
+
+def sensor_rows(records):
+    """Rows of w1_sampler.Record tuples."""
+    return [[record.time.strftime("%Y-%m-%d_%H:%M:%S"), record.device, "temperature", record.temperature] for record in records]
+
+def tir_rows(text, when):
+    """Rows of a TIRcapture temperatures.txt ("count 0 FPA_T 25.1 Shutter_T_raw 1234 ...")."""
+    rows = []
+    timestamp = when.strftime("%Y-%m-%d_%H:%M:%S")
+    for line in text.splitlines():
+        values = line.split()
+        if len(values) < 2 or len(values) % 2 or values[0] != "count":
+            continue
+        device = f"TIR_{values[1]}"
+        rows.extend([timestamp, device, name, value] for name, value in zip(values[2::2], values[3::2]))
+    return rows
+
+def _repair(fd):
+    # A torn append leaves a last line without newline: cut the file back to the last complete row
+    size = os.fstat(fd).st_size
+    if size == 0 or os.pread(fd, 1, size - 1) == b"\n":
+        return size
+    tail = os.pread(fd, min(size, 4096), max(0, size - 4096))
+    cut = tail.rfind(b"\n")
+    new_size = max(0, size - len(tail) + cut + 1) if cut >= 0 else 0
+    os.ftruncate(fd, new_size)
+    _print(f"Temperature series: incomplete row removed ({size - new_size} bytes)")
+    return new_size
+
+def append(path, rows):
+    """Append `rows` to the series file at `path` with one write + fsync. Return the new size."""
+    if not rows:
+        return os.path.getsize(path) if os.path.exists(path) else 0
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd = os.open(path, os.O_RDWR | os.O_APPEND | os.O_CREAT, 0o644)
+    try:
+        size = _repair(fd)
+        text = "".join(",".join(str(value) for value in row) + "\n" for row in rows)
+        data = ((HEADER if size == 0 else "") + text).encode()
+        os.write(fd, data)
+        os.fsync(fd)
+        return size + len(data)
+    finally:
+        os.close(fd)
+
+def publish(series_dir, path_filetransfer, now=None):
+    """Move the series of finished days/months to the FileTransfer folder. Return the files moved."""
+    now = now or datetime.now()
+    moved = []
+    for path in sorted(path for kind in KINDS for path in glob.glob(os.path.join(series_dir, f"*_{kind}.txt"))):
+        key = os.path.basename(path).rsplit("_", 2)[-2]
+        period = 'day' if len(key) == 6 else 'month'
+        if key == now.strftime(PERIODS[period]):
+            continue
+        target = os.path.join(path_filetransfer, os.path.basename(path))
+        os.replace(path, target)
+        moved.append(target)
+        _print(f"Temperature series {os.path.basename(path)} closed and ready to upload")
+    return moved
@@ -0,0 +1,32 @@
+import os
+import sys
+import runpy
+
+import pytest
+
+REPO_PATH = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BENCH_PATH = os.path.join(REPO_PATH, "benchmarks")
+sys.path.insert(0, REPO_PATH)
+sys.path.append(BENCH_PATH)  # stand_ins (after the repo: benchmarks/ has scripts named like repo modules)
+
+@pytest.fixture
+def load_stage(tmp_path, monkeypatch):
+    """Globals of a stage script (0_day_night.py ... 5_shutdown.py) loaded with AI4G_BASE=tmp_path,
+    as AI4Glaciers.py runs it but without its __main__ block."""
+    monkeypatch.setenv("AI4G_BASE", str(tmp_path))
+
+    def load(script, *arguments):
+        return runpy.run_path(os.path.join(REPO_PATH, script), init_globals={"STAGE_ARGV": list(arguments)}, run_name="stage")
+    return load
+
+@pytest.fixture
+def drive(tmp_path):
+    """Drive stand-in (benchmarks/stand_ins.py) with every station folder, without throttling."""
+    pytest.importorskip("googleapiclient")
+    import stand_ins
+    import drive_cache
+    drive = stand_ins.DriveStandIn(str(tmp_path / "drive_store"), bandwidth=1e12, latency=0,
+                                   folders=list(drive_cache.STATION_FOLDERS.values())).start()
+    stand_ins.write_token(str(tmp_path / "scripts" / "token.json"), drive.url)
+    yield drive
+    drive.stop()
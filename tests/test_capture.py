@@ -0,0 +1,60 @@
+import os
+import time
+
+import pytest
+
+import w1_sampler
+import camera_session
+import camera_backends
+
+def test_w1_sampler_fake_sysfs(tmp_path):
+    w1_path = str(tmp_path / "devices")
+    w1_sampler.write_fake_sensor(w1_path, "28-000000000001", 3.25)
+    w1_sampler.write_fake_sensor(w1_path, "28-000000000002", -1.5)
+    w1_sampler.write_fake_sensor(w1_path, "28-000000000003", 20.0, crc_ok=False)
+    os.makedirs(os.path.join(w1_path, "00-000000000000"))  # not a DS18B20
+    assert list(w1_sampler.discover(w1_path)) == ["28-000000000001", "28-000000000002", "28-000000000003"]
+
+    sampler = w1_sampler.Sampler(w1_path, samples=2, period=0.05, retries=1).start()
+    records = sampler.records(timeout=5)
+    sampler.stop()
+    assert len(records) == 6
+    readings = {(record.device, record.temperature, record.attempts) for record in records}
+    assert readings == {("28-000000000001", 3.25, 1), ("28-000000000002", -1.5, 1), ("28-000000000003", w1_sampler.INVALID, 2)}
+
+def test_w1_parse_rejects_power_on_reset():
+    assert w1_sampler.parse("72 01 : crc=57 YES\n72 01 t=85000\n") is None
+    assert w1_sampler.parse("72 01 : crc=57 YES\n72 01 t=-125\n") == -0.125
+    assert w1_sampler.parse("") is None
+
+def test_usb_camera_present_fake_sysfs(tmp_path):
+    for interface, usb_class in [("1-1:1.0", "09"), ("1-1.2:1.0", "06")]:
+        os.makedirs(tmp_path / interface)
+        (tmp_path / interface / "bInterfaceClass").write_text(usb_class + "\n")
+    assert camera_session.usb_camera_present(str(tmp_path))
+    (tmp_path / "1-1.2:1.0" / "bInterfaceClass").write_text("08\n")
+    assert not camera_session.usb_camera_present(str(tmp_path))
+
+def test_camera_session_with_fake_camera(tmp_path):
+    camera = camera_backends.FakeCamera(boot=0.1, connect=0.01, shutter=0.01, available=0.05, image_size=4096, interval=0.02)
+    session = camera_session.CameraSession(camera, ready_timeout=2, files_timeout=2)
+    session.power_on()
+    assert session.wait_ready() == "Model: Fake DSLR"
+    session.prepare()
+    session.capture_at(None, 2)
+    session.wait_files(2)
+    files = session.download(str(tmp_path), ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"])
+    session.power_off()
+    assert [os.path.basename(path) for path in files] == ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"]
+    assert all(os.path.getsize(path) == 4096 for path in files)
+    assert session.state == camera_session.OFF
+    assert {"relay_to_ready", "capture", "files_available", "download"} <= set(session.latencies)
+
+def test_camera_not_ready_times_out():
+    camera = camera_backends.FakeCamera(boot=10)
+    session = camera_session.CameraSession(camera, ready_timeout=0.2)
+    session.power_on()
+    start = time.monotonic()
+    with pytest.raises(Exception, match="not present on USB"):
+        session.wait_ready()
+    assert time.monotonic() - start < 1
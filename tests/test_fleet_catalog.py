@@ -0,0 +1,104 @@
+import os
+import time
+
+import pytest
+
+import drive_cache
+import fleet_catalog
+
+@pytest.fixture
+def catalog(tmp_path, drive):
+    store = tmp_path / "store"
+    store.mkdir()
+    creds = fleet_catalog.log_in(str(tmp_path / "scripts" / "token.json"))
+    service = fleet_catalog.drive_service(creds, drive.url)
+    conn = fleet_catalog.open_catalog(fleet_catalog.catalog_path(str(store)))
+    yield service, creds, conn, str(store)
+    conn.close()
+
+def add_files(drive, parent, names, size=1000):
+    files = []
+    for name in names:
+        files.append(drive.add_file(parent, name, os.urandom(size)))
+        time.sleep(0.011)  # distinct modifiedTime (10 ms resolution)
+    return files
+
+def test_station_folders_shared_with_the_uploads(load_stage):
+    assert fleet_catalog.STATIONS is drive_cache.STATION_FOLDERS
+    gdrive = load_stage("4_GDrive.py", "--id=GPM03")
+    assert gdrive["gdrive_parent"]() == [drive_cache.STATION_FOLDERS["GPM03"]]
+
+def test_sync_moves_the_cursor(drive, catalog, monkeypatch):
+    service, creds, conn, _ = catalog
+    monkeypatch.setattr(fleet_catalog, "PAGE_SIZE", 2)
+    parent = fleet_catalog.STATIONS["GPM01"]
+    first = add_files(drive, parent, [f"GPM01_240701_12{minute:02d}_1.jpg" for minute in range(5)])
+    assert fleet_catalog.get_cursor(conn, "GPM01") == fleet_catalog.EPOCH
+
+    assert fleet_catalog.sync_station(service, creds, conn, "GPM01", parent) == 5
+    assert fleet_catalog.get_cursor(conn, "GPM01") == first[-1]["modifiedTime"]
+
+    # Only the files from the cursor on are listed again (>=: the file at the cursor itself)
+    new = add_files(drive, parent, ["GPM01_240701_1300_1.jpg", "GPM01_240701_1300_TIR.zip"])
+    requests = drive.stats["requests"]
+    assert fleet_catalog.sync_station(service, creds, conn, "GPM01", parent) == 3
+    assert drive.stats["requests"] - requests == 2
+    assert fleet_catalog.get_cursor(conn, "GPM01") == new[-1]["modifiedTime"]
+    rows = fleet_catalog.query(conn, "GPM01")
+    assert len(rows) == 7 and all(row["state"] == "pending" for row in rows)
+    assert [row["kind"] for row in fleet_catalog.query(conn, "GPM01", "tir")] == ["tir"]
+
+    # Other stations keep their own cursor
+    assert fleet_catalog.get_cursor(conn, "GPM02") == fleet_catalog.EPOCH
+
+def test_download_resumes_a_partial_file(drive, catalog):
+    service, creds, conn, store = catalog
+    parent = fleet_catalog.STATIONS["GPM02"]
+    data = os.urandom(300 * 1024)
+    drive.add_file(parent, "GPM02_240701_1200_TIR.zip", data)
+    fleet_catalog.sync_station(service, creds, conn, "GPM02", parent)
+    row = fleet_catalog.query(conn, "GPM02")[0]
+    target = fleet_catalog.local_path(store, row)
+    assert target == os.path.join(store, "GPM02", "2407", "GPM02_240701_1200_TIR.zip")
+    os.makedirs(os.path.dirname(target))
+    with open(target + ".part", "wb") as f:
+        f.write(data[:100 * 1024])
+
+    bytes_out = drive.stats["bytes_out"]
+    assert fleet_catalog.download_pending(service, creds, conn, store) == (1, 200 * 1024)
+    time.sleep(0.2)  # the stand-in counts the bytes after the response is sent
+    assert drive.stats["bytes_out"] - bytes_out == 200 * 1024
+    with open(target, "rb") as f:
+        assert f.read() == data
+    assert not os.path.exists(target + ".part")
+    assert fleet_catalog.query(conn, "GPM02", downloaded=True)[0]["local_path"] == target
+
+def test_download_in_several_range_requests(drive, catalog, monkeypatch):
+    service, creds, conn, store = catalog
+    monkeypatch.setattr(fleet_catalog, "CHUNK_SIZE", 64 * 1024)
+    parent = fleet_catalog.STATIONS["GPM04"]
+    data = os.urandom(200 * 1024 + 7)
+    drive.add_file(parent, "GPM04_240701_1200_1.jpg", data)
+    fleet_catalog.sync_station(service, creds, conn, "GPM04", parent)
+    requests = drive.stats["requests"]
+    assert fleet_catalog.download_pending(service, creds, conn, store) == (1, len(data))
+    assert drive.stats["requests"] - requests == 4
+    with open(fleet_catalog.local_path(store, fleet_catalog.query(conn, "GPM04")[0]), "rb") as f:
+        assert f.read() == data
+
+def test_corrupted_partial_file_fails_the_md5(drive, catalog):
+    service, creds, conn, store = catalog
+    parent = fleet_catalog.STATIONS["GPM05"]
+    data = os.urandom(50 * 1024)
+    drive.add_file(parent, "GPM05_240701_1200_1.jpg", data)
+    fleet_catalog.sync_station(service, creds, conn, "GPM05", parent)
+    target = fleet_catalog.local_path(store, fleet_catalog.query(conn, "GPM05")[0])
+    os.makedirs(os.path.dirname(target))
+    with open(target + ".part", "wb") as f:
+        f.write(bytes(10 * 1024))  # not the start of the file
+
+    assert fleet_catalog.download_pending(service, creds, conn, store) == (0, 0)
+    assert fleet_catalog.query(conn, "GPM05")[0]["state"] == "failed"
+    assert not os.path.exists(target + ".part")
+    # The next run downloads it again from the start
+    assert fleet_catalog.download_pending(service, creds, conn, store) == (1, len(data))
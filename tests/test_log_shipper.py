@@ -0,0 +1,97 @@
+import os
+import gzip
+
+import pytest
+
+import log_shipper
+
+@pytest.fixture
+def state(tmp_path):
+    path = str(tmp_path / "log_shipper.db")
+    conn = log_shipper.open_state(path)
+    yield conn, path
+    conn.close()
+
+def write(path, data, mode="ab"):
+    with open(path, mode) as f:
+        f.write(data)
+
+def ship(conn, log_path):
+    """Ship (and confirm) the next segment. Return its lines."""
+    segment = log_shipper.next_segment(conn, log_path)
+    log_shipper.commit(conn, log_path, segment)
+    return gzip.decompress(segment["data"])
+
+def test_only_complete_lines_and_only_once(tmp_path, state):
+    conn, _ = state
+    log_path = str(tmp_path / "AI4G.log")
+    write(log_path, b"line 1\nline 2\npartial")
+    segment = log_shipper.next_segment(conn, log_path)
+    assert gzip.decompress(segment["data"]) == b"line 1\nline 2\n"
+    assert (segment["start"], segment["end"], segment["rotated"]) == (0, 14, False)
+    assert segment["name"].startswith("AI4G_") and segment["name"].endswith(".log.gz")
+
+    # Not confirmed by GDrive: the same bytes are offered again
+    assert log_shipper.next_segment(conn, log_path)["start"] == 0
+    log_shipper.commit(conn, log_path, segment)
+    assert log_shipper.pending_bytes(conn, log_path) == len(b"partial")
+    assert log_shipper.next_segment(conn, log_path) is None
+
+    write(log_path, b" line 3\nline 4\n")
+    assert ship(conn, log_path) == b"partial line 3\nline 4\n"
+    assert log_shipper.next_segment(conn, log_path) is None
+
+def test_rotation_ships_the_tail_from_the_backup(tmp_path, state):
+    conn, state_path = state
+    log_path, backup_path = str(tmp_path / "AI4G.log"), str(tmp_path / "AI4G_Jul24.log")
+    write(log_path, b"july 1\n")
+    assert ship(conn, log_path) == b"july 1\n"
+    inode = os.stat(log_path).st_ino
+    write(log_path, b"july 2\njuly 3\n")
+
+    # 1_maintenance: backup copy, rotate() and the log emptied in place (same inode)
+    with open(log_path, "rb") as source, open(backup_path, "wb") as backup:
+        backup.write(source.read())
+    log_shipper.rotate(log_path, backup_path, state_path)
+    with open(log_path, "r+") as f:
+        f.truncate(0)
+    assert os.stat(log_path).st_ino == inode
+    write(log_path, b"august 1\n")
+
+    assert log_shipper.pending_bytes(conn, log_path) == len(b"july 2\njuly 3\n") + len(b"august 1\n")
+    segment = log_shipper.next_segment(conn, log_path)
+    assert (segment["source"], segment["start"], segment["rotated"]) == (backup_path, 7, True)
+    assert segment["name"].startswith("AI4G_Jul24_")
+    assert gzip.decompress(segment["data"]) == b"july 2\njuly 3\n"
+    log_shipper.commit(conn, log_path, segment)
+    assert ship(conn, log_path) == b"august 1\n"  # the new log from 0
+    assert log_shipper.next_segment(conn, log_path) is None
+
+def test_log_replaced_outside_the_rotation(tmp_path, state, capsys):
+    conn, _ = state
+    log_path = str(tmp_path / "AI4G.log")
+    write(log_path, b"line 1\n")
+    ship(conn, log_path)
+
+    # A new file (new inode) bigger than the shipped offset
+    write(str(tmp_path / "new.log"), b"new line 1\nnew line 2\n")
+    os.replace(str(tmp_path / "new.log"), log_path)
+    assert ship(conn, log_path) == b"new line 1\nnew line 2\n"
+    assert "replaced outside the monthly rotation" in capsys.readouterr().out
+
+    # Same inode, shorter than the shipped offset
+    write(log_path, b"short\n", "r+b")
+    with open(log_path, "r+b") as f:
+        f.truncate(6)
+    assert ship(conn, log_path) == b"short\n"
+
+def test_missing_backup_loses_only_its_tail(tmp_path, state, capsys):
+    conn, state_path = state
+    log_path, backup_path = str(tmp_path / "AI4G.log"), str(tmp_path / "AI4G_Jul24.log")
+    write(log_path, b"july 1\n")
+    log_shipper.rotate(log_path, backup_path, state_path)
+    os.remove(log_path)
+    assert log_shipper.next_segment(conn, log_path) is None
+    assert "Rotated log AI4G_Jul24.log not found" in capsys.readouterr().out
+    write(log_path, b"august 1\n")
+    assert ship(conn, log_path) == b"august 1\n"
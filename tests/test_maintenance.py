@@ -0,0 +1,37 @@
+import functools
+
+import log_shipper
+
+def test_monthly_rotation_keeps_the_open_log(tmp_path, load_stage, monkeypatch):
+    state = str(tmp_path / "log_shipper.db")
+    monkeypatch.setattr(log_shipper, "rotate", functools.partial(log_shipper.rotate, state_path=state))
+    maintenance = load_stage("1_maintenance.py", "--id=GPM_test")
+    (tmp_path / "GPM_test_logs_backup").mkdir()
+    log_path = tmp_path / "AI4G.log"
+
+    # AI4Glaciers.sh: python3 AI4Glaciers.py >> AI4G.log, open for the whole cycle
+    with open(log_path, "a") as stdout:
+        stdout.write("stage 0 - old month\n")
+        stdout.flush()
+        maintenance["backup_and_clear_log"](str(log_path), "Jun24", "Jul24")
+        stdout.write("stage 2 - new month\n")
+        stdout.flush()
+
+    assert log_path.read_text() == "stage 2 - new month\n"
+    assert (tmp_path / "GPM_test_logs_backup" / "AI4G_Jul24.log").read_text() == "stage 0 - old month\n"
+    assert (tmp_path / "datestamp").read_text() == "Jul24"
+
+    # The tail of the old month is shipped from the backup, then the new log from its first byte
+    conn = log_shipper.open_state(state)
+    segment = log_shipper.next_segment(conn, str(log_path))
+    assert segment["rotated"] and segment["start"] == 0
+    log_shipper.commit(conn, str(log_path), segment)
+    segment = log_shipper.next_segment(conn, str(log_path))
+    assert not segment["rotated"] and (segment["start"], segment["end"]) == (0, len("stage 2 - new month\n"))
+
+def test_same_month_log_untouched(tmp_path, load_stage):
+    maintenance = load_stage("1_maintenance.py", "--id=GPM_test")
+    log_path = tmp_path / "AI4G.log"
+    log_path.write_text("line\n")
+    maintenance["backup_and_clear_log"](str(log_path), "Jul24", "Jul24")
+    assert log_path.read_text() == "line\n"
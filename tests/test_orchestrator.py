@@ -0,0 +1,90 @@
+import os
+import sys
+import json
+import time
+import runpy
+
+import pytest
+
+import metrics
+from conftest import REPO_PATH
+
+ARGV_STAGE = """import os, sys, json, argparse
+parser = argparse.ArgumentParser()
+parser.add_argument('--id', type=str, required=True)
+parser.add_argument('--num', type=int, default=2)
+args = parser.parse_args(globals().get("STAGE_ARGV"))
+with open(os.path.join(os.environ['AI4G_BASE'], args.id + '.json'), 'w') as f:
+    json.dump({'id': args.id, 'num': args.num, 'sys_argv': sys.argv}, f)
+"""
+
+@pytest.fixture
+def orchestrator(tmp_path, monkeypatch):
+    """Live globals of AI4Glaciers.py with its stages taken from tmp_path/scripts and the metrics in a list."""
+    monkeypatch.setenv("AI4G_BASE", str(tmp_path))
+    records = []
+    monkeypatch.setattr(metrics, "record", lambda stage, duration=None, path=None, **fields: records.append(dict(fields, stage=stage, duration=duration)))
+    scripts = tmp_path / "scripts"
+    scripts.mkdir()
+    stages = runpy.run_path(os.path.join(REPO_PATH, "AI4Glaciers.py"), run_name="orchestrator")["run_stage"].__globals__
+    stages["SCRIPTS_PATH"] = str(scripts)
+    stages["records"] = records
+    yield stages
+    for _, thread in stages["late_stages"]:
+        thread.join(5)
+
+def write_stage(orchestrator, name, code):
+    with open(os.path.join(orchestrator["SCRIPTS_PATH"], name), "w") as f:
+        f.write(code)
+
+def test_stage_argv_handoff(orchestrator, tmp_path):
+    write_stage(orchestrator, "argv_stage.py", ARGV_STAGE)
+    sys_argv = list(sys.argv)
+    results = orchestrator["run_stages_parallel"]([("argv_stage.py", 10, ["--id=GPM_rgb", "--num=3"]),
+                                                   ("argv_stage.py", 10, ["--id=GPM_tir"])])
+    assert results["argv_stage.py"][0]
+    # Both stages ran at the same time, each with its own arguments, and sys.argv was not touched
+    assert json.loads((tmp_path / "GPM_rgb.json").read_text())["num"] == 3
+    assert json.loads((tmp_path / "GPM_tir.json").read_text())["num"] == 2
+    assert json.loads((tmp_path / "GPM_rgb.json").read_text())["sys_argv"][1:] == sys_argv[1:]
+    assert sys.argv == sys_argv
+
+def test_stage_exit_code_and_exception(orchestrator):
+    write_stage(orchestrator, "exit_stage.py", "import sys\nsys.exit(2)\n")
+    write_stage(orchestrator, "raise_stage.py", "raise RuntimeError('no camera')\n")
+    write_stage(orchestrator, "ok_stage.py", "import sys\nsys.exit(0)\n")
+    assert not orchestrator["run_stage"]("exit_stage.py")[0]
+    assert not orchestrator["run_stage"]("raise_stage.py")[0]
+    assert orchestrator["run_stage"]("ok_stage.py")[0]
+    assert [(record["script"], record["ok"]) for record in orchestrator["records"]] == \
+        [("exit_stage.py", False), ("raise_stage.py", False), ("ok_stage.py", True)]
+
+def test_parallel_capture_record_and_late_stage(orchestrator, capsys):
+    write_stage(orchestrator, "fast_stage.py", "import time\ntime.sleep(0.05)\n")
+    write_stage(orchestrator, "failed_stage.py", "import sys\nsys.exit(1)\n")
+    write_stage(orchestrator, "slow_stage.py", "import time\ntime.sleep(0.6)\n")
+    start = time.time()
+    results = orchestrator["run_stages_parallel"]([("fast_stage.py", 5, []), ("failed_stage.py", 5, []), ("slow_stage.py", 0.1, [])])
+    # The group waits for the slowest device up to its timeout, not for the sum of all of them
+    assert time.time() - start < 0.5
+    assert results["fast_stage.py"][0] and not results["failed_stage.py"][0] and "slow_stage.py" not in results
+
+    capture = [record for record in orchestrator["records"] if record["stage"] == "capture"]
+    assert capture[0]["stages"] == {"fast_stage.py": True, "failed_stage.py": False, "slow_stage.py": "timeout"}
+    output = capsys.readouterr().out
+    assert "slow_stage.py: TIMEOUT" in output and "failed_stage.py: ERROR" in output
+
+    # The stage that timed out is still running: the next stage waits for it
+    assert [script for script, _ in orchestrator["late_stages"]] == ["slow_stage.py"]
+    orchestrator["wait_late_stages"]("4_GDrive.py", time.time() + 5)
+    assert orchestrator["late_stages"] == []
+    assert "Stage slow_stage.py finished late - 4_GDrive.py starts" in capsys.readouterr().out
+
+def test_late_stage_waits_only_until_the_deadline(orchestrator, capsys):
+    write_stage(orchestrator, "hung_stage.py", "import time\ntime.sleep(1)\n")
+    orchestrator["run_stages_parallel"]([("hung_stage.py", 0.05, [])])
+    start = time.time()
+    orchestrator["wait_late_stages"]("5_shutdown.py", time.time() + 0.1)
+    assert time.time() - start < 0.5
+    assert [script for script, _ in orchestrator["late_stages"]] == ["hung_stage.py"]
+    assert "ERROR: Stage hung_stage.py still running - 5_shutdown.py starts anyway" in capsys.readouterr().out
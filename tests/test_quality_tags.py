@@ -0,0 +1,30 @@
+import os
+import sys
+import subprocess
+
+import quality_tags
+from conftest import REPO_PATH
+
+STATS = {"brightness": 120.0, "spread": 80.0, "sharpness": 40.0, "dhash": 0x0123456789abcdef}
+
+def test_tags_round_trip(tmp_path):
+    conn = quality_tags.open_quality(str(tmp_path / "rgb_quality.db"))
+    folder = tmp_path / "RGB_filetransfer"
+    folder.mkdir()
+    for name, tag in [("GPM_240701_1200_1.jpg", quality_tags.KEEP), ("GPM_240701_1200_2.jpg", quality_tags.DROP)]:
+        (folder / name).write_bytes(b"jpg")
+        quality_tags.record(conn, str(folder / name), tag, STATS, None)
+    assert quality_tags.get_tag(conn, "GPM_240701_1200_2.jpg") == quality_tags.DROP
+    quality_tags.forget(conn, "GPM_240701_1200_2.jpg")
+    assert quality_tags.get_tag(conn, "GPM_240701_1200_2.jpg") is None
+    os.remove(folder / "GPM_240701_1200_1.jpg")
+    assert quality_tags.prune_missing(conn, str(folder)) == 1
+    conn.close()
+
+def test_upload_stage_without_numpy(tmp_path):
+    code = ("import sys, runpy; sys.path.insert(0, sys.argv[1]); "
+            "runpy.run_path(sys.argv[1] + '/4_GDrive.py', init_globals={'STAGE_ARGV': ['--id=GPM_Dresden']}, run_name='stage'); "
+            "print('numpy' in sys.modules)")
+    result = subprocess.run([sys.executable, "-c", code, REPO_PATH], capture_output=True, text=True,
+                            env=dict(os.environ, AI4G_BASE=str(tmp_path)))
+    assert result.stdout.strip() == "False", result.stderr
@@ -0,0 +1,81 @@
+import os
+import shutil
+import collections
+
+import pytest
+
+import metrics
+import retention
+import upload_journal
+import usb_mirror
+
+MB = 1000 * 1000
+DiskUsage = collections.namedtuple("DiskUsage", "total used free")
+
+@pytest.fixture
+def folder(tmp_path, monkeypatch):
+    """FileTransfer folder with an uploaded, a mirrored and an unsynced file (the unsynced one the oldest)."""
+    monkeypatch.setattr(metrics, "record", lambda *arguments, **fields: None)
+    path = tmp_path / "FileTransfer"
+    path.mkdir()
+    files = {}
+    for name, age in [("unsynced.jpg", 3), ("mirrored.jpg", 2), ("uploaded.jpg", 1)]:
+        files[name] = str(path / name)
+        with open(files[name], "wb") as f:
+            f.write(bytes(MB))
+        mtime = os.stat(files[name]).st_mtime - age * 24 * 3600
+        os.utime(files[name], (mtime, mtime))
+
+    journal_path, manifest_path = str(tmp_path / "upload_journal.db"), str(tmp_path / "usb_manifest.db")
+    conn = upload_journal.open_journal(journal_path)
+    upload_journal.start_entry(conn, files["uploaded.jpg"])
+    upload_journal.mark_uploaded(conn, files["uploaded.jpg"], "file-id")
+    conn.close()
+    conn = usb_mirror.open_manifest(manifest_path)
+    usb_mirror.record(conn, [{"name": "mirrored.jpg", "size": MB, "mtime": 0, "checksum": None}])
+    conn.close()
+    load_sync_state = retention.load_sync_state
+    monkeypatch.setattr(retention, "load_sync_state", lambda: load_sync_state(journal_path, manifest_path))
+    return str(path)
+
+def free_space(monkeypatch, free):
+    monkeypatch.setattr(shutil, "disk_usage", lambda path: DiskUsage(100 * MB, 100 * MB - free, free))
+
+def deleted(capsys):
+    out = capsys.readouterr().out
+    return [line.split("Retention: ")[1].split(" (")[0] for line in out.splitlines() if "deleted -" in line]
+
+def test_tiers(folder):
+    uploaded, mirrored = retention.load_sync_state()
+    tiers = {f[1]: f[4] for f in retention.scan(folder, False, uploaded, mirrored)}
+    assert tiers == {"uploaded.jpg": retention.UPLOADED, "mirrored.jpg": retention.MIRRORED, "unsynced.jpg": retention.UNSYNCED}
+    assert {f[4] for f in retention.scan(folder, True, uploaded, mirrored)} == {retention.UPLOADED, retention.MIRRORED}
+
+def test_free_space_target_keeps_the_unsynced_files(folder, monkeypatch, capsys):
+    free_space(monkeypatch, 2 * MB)
+    assert retention.enforce({folder: (None, False)}, min_free=10 * MB, critical_free=1 * MB) == 2
+    assert deleted(capsys) == ["uploaded.jpg", "mirrored.jpg"]  # by tier before age
+    assert os.listdir(folder) == ["unsynced.jpg"]
+
+def test_free_space_target_stops_when_reached(folder, monkeypatch, capsys):
+    free_space(monkeypatch, 2 * MB)
+    assert retention.enforce({folder: (None, False)}, min_free=3 * MB, critical_free=1 * MB) == 1
+    assert deleted(capsys) == ["uploaded.jpg"]
+
+def test_below_critical_free_space_the_unsynced_files_go_last(folder, monkeypatch, capsys):
+    free_space(monkeypatch, 0)
+    assert retention.enforce({folder: (None, False)}, min_free=10 * MB, critical_free=5 * MB) == 3
+    assert deleted(capsys) == ["uploaded.jpg", "mirrored.jpg", "unsynced.jpg"]
+    assert os.listdir(folder) == []
+
+def test_budget_never_drops_the_unsynced_files(folder, monkeypatch, capsys):
+    free_space(monkeypatch, 50 * MB)
+    assert retention.enforce({folder: (0, False)}, min_free=10 * MB, critical_free=5 * MB) == 2
+    assert deleted(capsys) == ["uploaded.jpg", "mirrored.jpg"]
+    assert os.listdir(folder) == ["unsynced.jpg"]
+
+def test_age_limit_never_drops_the_unsynced_files(folder, monkeypatch, capsys):
+    free_space(monkeypatch, 50 * MB)
+    assert retention.enforce({folder: (None, False)}, min_free=10 * MB, critical_free=5 * MB, day_threshold=2) == 1
+    assert deleted(capsys) == ["mirrored.jpg"]
+    assert sorted(os.listdir(folder)) == ["unsynced.jpg", "uploaded.jpg"]
@@ -0,0 +1,101 @@
+import os
+import sys
+import json
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import tir_container
+
+SHAPE = (48, 64)
+
+def scene(index, seed=0):
+    rng = np.random.default_rng(seed + index)
+    y, x = np.mgrid[0:SHAPE[0], 0:SHAPE[1]]
+    return 7000 + 900 * np.sin(x / 9.0) * np.cos(y / 7.0) + 3 * y + rng.normal(0, 4, SHAPE) + 2 * index
+
+def dn_frame(index):
+    return np.clip(scene(index), 0, 65535).astype(np.uint16)
+
+def temperature_frame(index):
+    raw = np.clip(scene(index) - 2000, 0, 65535).astype(np.int32)
+    return (raw - 5000).astype(np.float32) / np.float32(100)
+
+def members(data):
+    _, _, header_length = tir_container.PREFIX.unpack_from(data)
+    header = json.loads(data[tir_container.PREFIX.size:tir_container.PREFIX.size + header_length])
+    return {entry['name']: entry for entry in header['members']}
+
+def assert_exact(decoded, frames):
+    assert sorted(decoded) == sorted(frames)
+    for name, frame in frames.items():
+        assert decoded[name].dtype == frame.dtype
+        assert decoded[name].shape == frame.shape
+        assert decoded[name].tobytes() == frame.tobytes()
+
+@pytest.mark.parametrize("codec", sorted(tir_container.CODECS))
+def test_dn_frames_round_trip(codec):
+    frames = {f"GPM_DN_noAGC_16_{index}.tif": dn_frame(index) for index in range(3)}
+    frames["GPM_DN_16_0.tif"] = np.array([[0, 65535], [65535, 0]], dtype=np.uint16)
+    decoded, extras = tir_container.decode(tir_container.encode(frames, codec=codec))
+    assert_exact(decoded, frames)
+    assert extras == {}
+
+@pytest.mark.parametrize("codec", sorted(tir_container.CODECS))
+def test_temperature_frames_quantized(codec):
+    frames = {f"GPM_temperature_tempRange_16_{index}.tif": temperature_frame(index) for index in range(3)}
+    data = tir_container.encode(frames, codec=codec)
+    assert all(entry['quant'] == [tir_container.TEMP_SCALE, tir_container.TEMP_OFFSET] for entry in members(data).values())
+    decoded, _ = tir_container.decode(data)
+    assert_exact(decoded, frames)
+
+def test_temperature_frames_not_on_the_grid_stored_raw():
+    frame = temperature_frame(0)
+    frame[5, 7] = np.float32(12.345678)
+    frames = {"GPM_temperature_tempRange_16_0.tif": frame,
+              "GPM_temperature_tempRange_16_1.tif": np.full(SHAPE, np.nan, dtype=np.float32)}
+    data = tir_container.encode(frames)
+    assert [entry['predictor'] for entry in members(data).values()] == ['raw', 'raw']
+    decoded, _ = tir_container.decode(data)
+    assert_exact(decoded, frames)
+
+def test_temporal_and_intra_prediction():
+    # A static scene favours the previous frame; a new scene only has the intra (spatial) predictor
+    still = dn_frame(0)
+    frames = {"GPM_DN_16_0.tif": still, "GPM_DN_16_1.tif": still + np.uint16(1),
+              "GPM_DN_16_2.tif": (np.arange(SHAPE[0] * SHAPE[1]).reshape(SHAPE) + 9000).astype(np.uint16),
+              "GPM_DN_noAGC_16_0.tif": dn_frame(1)}
+    data = tir_container.encode(frames)
+    predictors = {name: entry['predictor'] for name, entry in members(data).items()}
+    assert predictors["GPM_DN_16_0.tif"] == 'spatial'
+    assert predictors["GPM_DN_16_1.tif"].startswith('temporal')
+    assert predictors["GPM_DN_16_2.tif"] == 'spatial'
+    assert predictors["GPM_DN_noAGC_16_0.tif"] == 'spatial'  # other variant: no previous frame
+    decoded, _ = tir_container.decode(data)
+    assert_exact(decoded, frames)
+
+@pytest.mark.parametrize("codec", sorted(tir_container.CODECS))
+def test_extra_members_round_trip(codec):
+    frames = {"GPM_DN_16_0.tif": dn_frame(0)}
+    extras = {"GPM_temperatures.txt": b"count 0 FPA_T 25.1 Shutter_T 24.8\n", "empty.bin": b"", "random.bin": os.urandom(1000)}
+    decoded, decoded_extras = tir_container.decode(tir_container.encode(frames, extras, codec))
+    assert_exact(decoded, frames)
+    assert decoded_extras == extras
+
+def test_pack_and_unpack_folder(tmp_path):
+    pytest.importorskip("PIL")
+    capture, out = tmp_path / "capture", tmp_path / "out"
+    capture.mkdir()
+    frames = {"GPM_DN_16_0.tif": dn_frame(0), "GPM_DN_16_1.tif": dn_frame(1), "GPM_temperature_tempRange_16_0.tif": temperature_frame(0)}
+    for name, frame in frames.items():
+        tir_container.write_tiff(str(capture / name), frame)
+    (capture / "GPM_temperatures.txt").write_bytes(b"count 0\n")
+    assert tir_container.pack_folder(str(capture), str(tmp_path / "capture.tirc")) == (3, 1)
+    assert tir_container.unpack(str(tmp_path / "capture.tirc"), str(out)) == (3, 1)
+    assert_exact({name: tir_container.read_tiff(str(out / name)) for name in frames}, frames)
+    assert (out / "GPM_temperatures.txt").read_bytes() == b"count 0\n"
+
+def test_not_a_container():
+    with pytest.raises(ValueError):
+        tir_container.decode(b"ZIPX" + bytes(16))
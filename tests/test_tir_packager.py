@@ -0,0 +1,62 @@
+import os
+import sys
+import time
+import zipfile
+import subprocess
+
+import tir_packager
+
+# Stand-in for TIRcapture: one frame every 50 ms, each written in two halves, and a temperature line per frame
+CAPTURE = """
+import os, sys, time
+path = sys.argv[1]
+for index in range(1000):
+    with open(os.path.join(path, f"GPM_DN_{index:04d}.tif"), "wb") as f:
+        f.write(bytes(5000))
+        f.flush()
+        time.sleep(0.05)
+        f.write(bytes(5000))
+    with open(os.path.join(path, "temperatures.txt"), "a") as f:
+        f.write(f"{index} 1.0\\n")
+"""
+
+def start_capture(path_tir):
+    return subprocess.Popen([sys.executable, "-c", CAPTURE, path_tir])
+
+def test_frames_of_a_finished_capture(tmp_path):
+    path_tir = tmp_path / "TIR"
+    path_tir.mkdir()
+    for index in range(3):
+        (path_tir / f"GPM_DN_{index:04d}.tif").write_bytes(bytes(100))
+        time.sleep(0.01)
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    zip_path = str(tmp_path / "GPM_TIR.zip")
+    assert tir_packager.stream_capture(process, str(path_tir), zip_path, keep_patterns=("*_0002.tif",)) == 3
+    with zipfile.ZipFile(zip_path) as zipf:
+        assert zipf.namelist() == ["GPM_DN_0000.tif", "GPM_DN_0001.tif", "GPM_DN_0002.tif"]
+    assert os.listdir(path_tir) == ["GPM_DN_0002.tif"]
+    assert not os.path.exists(zip_path + ".part")
+
+def test_timeout_drops_the_frame_being_written(tmp_path, capsys):
+    path_tir = tmp_path / "TIR"
+    path_tir.mkdir()
+    zip_path = str(tmp_path / "GPM_TIR.zip")
+    tir_packager.stream_capture(start_capture(str(path_tir)), str(path_tir), zip_path, timeout=0.6)
+    assert "TIR capture stopped after 0.6 s" in capsys.readouterr().out
+    with zipfile.ZipFile(zip_path) as zipf:
+        frames = {info.filename: info.file_size for info in zipf.infolist() if info.filename.endswith(".tif")}
+        temperatures = zipf.read("temperatures.txt").decode().splitlines()
+    assert frames and all(size == 10000 for size in frames.values())  # no half-written frame
+    assert sorted(frames) == [f"GPM_DN_{index:04d}.tif" for index in range(len(frames))]
+    assert len(temperatures) >= len(frames)
+    assert os.listdir(path_tir) == []
+
+def test_drop_partial_frame(tmp_path, capsys):
+    for index in range(3):
+        (tmp_path / f"GPM_DN_{index:04d}.tif").write_bytes(bytes(100))
+        time.sleep(0.01)
+    (tmp_path / "temperatures.txt").write_text("0 1.0\n")
+    assert tir_packager.drop_partial_frame(str(tmp_path)) == ["GPM_DN_0002.tif"]
+    assert "Frame GPM_DN_0002.tif dropped" in capsys.readouterr().out
+    assert sorted(os.listdir(tmp_path)) == ["GPM_DN_0000.tif", "GPM_DN_0001.tif", "temperatures.txt"]
+    assert tir_packager.drop_partial_frame(str(tmp_path), kept={"GPM_DN_0001.tif"}) == ["GPM_DN_0000.tif"]
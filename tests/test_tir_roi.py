@@ -0,0 +1,30 @@
+import os
+from datetime import datetime
+
+import metrics
+import tir_roi
+import upload_scheduler
+
+SUMMARY = {"glacier": {"T_mean": -2.5, "T_min": -7.0, "T_max": 1.5, "T_step": 0.1}}
+
+def test_roi_file_per_capture_uploaded_before_the_package(tmp_path, load_stage, monkeypatch):
+    monkeypatch.setattr(tir_roi, "summarise_capture", lambda path_tir, roi_path: SUMMARY)
+    monkeypatch.setattr(metrics, "record", lambda *arguments, **fields: None)
+    monkeypatch.setattr(tir_roi, "frame_paths", lambda path_tir: [])
+    stage = load_stage("3_TIR_Images.py", "--id=GPM_Dresden")
+    for minute in (0, 10):
+        stage["save_roi_summary"](str(tmp_path), f"240701_12{minute:02d}", datetime(2024, 7, 1, 12, minute))
+
+    # Every capture has its own file in the same cycle, the day series keeps growing
+    roi_files = sorted(os.listdir(stage["path_filetransfer_roi"]))
+    assert roi_files == ["GPM_Dresden_240701_1200_TIRroi.txt", "GPM_Dresden_240701_1210_TIRroi.txt"]
+    with open(os.path.join(stage["path_filetransfer_roi"], roi_files[1])) as f:
+        lines = f.read().splitlines()
+    assert lines[0] == "date,device,variable,value" and len(lines) == 5
+    assert lines[1] == "2024-07-01_12:10:00,ROI_glacier,T_mean,-2.5"
+    with open(os.path.join(stage["path_series_temp"], "GPM_Dresden_240701_TIRroi.txt")) as f:
+        assert len(f.read().splitlines()) == 9
+
+    gdrive = load_stage("4_GDrive.py", "--id=GPM_Dresden")
+    assert gdrive["FILETYPES"]["ROI"][0] == stage["path_filetransfer_roi"]
+    assert upload_scheduler.PRIORITY["ROI"] < upload_scheduler.PRIORITY["TIR"]
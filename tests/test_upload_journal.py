@@ -0,0 +1,166 @@
+import os
+
+import pytest
+
+import drive_cache
+import upload_journal
+import upload_scheduler
+
+@pytest.fixture
+def journal(tmp_path):
+    conn = upload_journal.open_journal(str(tmp_path / "upload_journal.db"))
+    yield conn
+    conn.close()
+
+@pytest.fixture
+def gdrive(tmp_path, drive, journal, load_stage):
+    """Live globals of 4_GDrive.py talking to the Drive stand-in, with its state under tmp_path."""
+    stage = load_stage("4_GDrive.py", "--id=GPM_Dresden", f"--api_endpoint={drive.url}", "--chunk_size=256")
+    gdrive = stage["upload_session"].__globals__
+    gdrive["journal"] = journal
+    gdrive["cache"] = drive_cache.open_cache(str(tmp_path / "drive_cache.db"))
+    gdrive["scheduler"] = upload_scheduler.UploadScheduler([], None, str(tmp_path / "link_stats.json"))
+    creds = gdrive["log_in_google"]()
+    gdrive["service"], gdrive["creds"] = gdrive["drive_service"](creds), creds
+    yield gdrive
+    gdrive["cache"].close()
+
+def local_file(tmp_path, name, size):
+    path = tmp_path / name
+    data = os.urandom(size)
+    path.write_bytes(data)
+    return str(path), data
+
+def upload(gdrive, path):
+    metadata = {"name": os.path.basename(path), "parents": gdrive["gdrive_parent"]()}
+    return gdrive["resumable_upload"](gdrive["service"], gdrive["creds"], path, metadata, "image/jpg", "RGB")
+
+def stop_after(gdrive, chunks):
+    """Deadline reached after `chunks` chunks (the power cut of a cycle)."""
+    calls = {"count": 0}
+    def expired():
+        calls["count"] += 1
+        return calls["count"] > chunks + 1  # + the check before the session starts
+    gdrive["scheduler"].expired = expired
+
+def stored(drive, file_id):
+    with open(os.path.join(drive.store, file_id), "rb") as f:
+        return f.read()
+
+def test_journal_states(tmp_path, journal):
+    path, _ = local_file(tmp_path, "GPM_240701_1200_1.jpg", 1000)
+    entry = upload_journal.start_entry(journal, path)
+    assert (entry["state"], entry["session_uri"], entry["offset"]) == (upload_journal.PENDING, None, 0)
+
+    upload_journal.record_session(journal, path, "http://drive/session", 512)
+    entry = upload_journal.start_entry(journal, path)  # same file: the session is kept
+    assert (entry["state"], entry["session_uri"], entry["offset"]) == (upload_journal.UPLOADING, "http://drive/session", 512)
+
+    upload_journal.reset_session(journal, path)
+    assert upload_journal.get_entry(journal, path)["session_uri"] is None
+
+    upload_journal.mark_uploaded(journal, path, "file-id")
+    entry = upload_journal.get_entry(journal, path)
+    assert (entry["state"], entry["offset"], entry["file_id"]) == (upload_journal.UPLOADED, 1000, "file-id")
+
+def test_changed_file_starts_again(tmp_path, journal):
+    path, _ = local_file(tmp_path, "GPM_240701_1200_1.jpg", 1000)
+    upload_journal.start_entry(journal, path)
+    upload_journal.record_session(journal, path, "http://drive/session", 512)
+    with open(path, "ab") as f:
+        f.write(b"more")
+    entry = upload_journal.start_entry(journal, path)
+    assert (entry["state"], entry["session_uri"], entry["size"]) == (upload_journal.PENDING, None, 1004)
+
+def test_prune_missing(tmp_path, journal):
+    kept, _ = local_file(tmp_path, "GPM_240701_1200_1.jpg", 10)
+    gone, _ = local_file(tmp_path, "GPM_240701_1200_2.jpg", 10)
+    for path in (kept, gone):
+        upload_journal.start_entry(journal, path)
+    upload_journal.mark_uploaded(journal, gone, "file-id")
+    os.remove(gone)
+    assert upload_journal.prune_missing(journal) == 1
+    assert [entry["path"] for entry in upload_journal.list_entries(journal)] == [kept]
+
+def test_upload_resumes_from_the_queried_offset(tmp_path, drive, gdrive, journal, capsys):
+    path, data = local_file(tmp_path, "GPM_Dresden_240701_1200_1.jpg", 1024 * 1024)
+    stop_after(gdrive, 2)
+    assert upload(gdrive, path) is None
+    entry = upload_journal.get_entry(journal, path)
+    assert entry["state"] == upload_journal.UPLOADING and entry["offset"] == 512 * 1024
+
+    # Power cut after GDrive got a third chunk but before the journal recorded it
+    session = next(iter(drive.sessions.values()))
+    with open(path, "rb") as f:
+        f.seek(512 * 1024)
+        extra = f.read(256 * 1024)
+    with open(session["path"], "r+b") as f:
+        f.seek(512 * 1024)
+        f.write(extra)
+    session["received"] = 768 * 1024
+
+    gdrive["scheduler"] = upload_scheduler.UploadScheduler([], None, str(tmp_path / "link_stats.json"))
+    bytes_in = drive.stats["bytes_in"]
+    response = upload(gdrive, path)
+    assert "upload resumed from byte 786432" in capsys.readouterr().out
+    assert drive.stats["bytes_in"] - bytes_in == 256 * 1024  # only the missing bytes
+    assert stored(drive, response["id"]) == data
+    entry = upload_journal.get_entry(journal, path)
+    assert (entry["state"], entry["file_id"]) == (upload_journal.UPLOADED, response["id"])
+
+def test_finished_upload_found_by_the_status_query(tmp_path, drive, gdrive, journal, capsys):
+    # The last chunk reached GDrive but its response was lost: the status query returns the file
+    path, data = local_file(tmp_path, "GPM_Dresden_240701_1200_1.jpg", 512 * 1024)
+    stop_after(gdrive, 1)
+    upload(gdrive, path)
+    upload_id, session = next(iter(drive.sessions.items()))
+    status, _, _ = drive._chunk(upload_id, {"Content-Range": f"bytes {256 * 1024}-{512 * 1024 - 1}/{512 * 1024}"}, data[256 * 1024:])
+    assert status == 200
+
+    gdrive["scheduler"] = upload_scheduler.UploadScheduler([], None, str(tmp_path / "link_stats.json"))
+    requests = drive.stats["requests"]
+    response = upload(gdrive, path)
+    assert drive.stats["requests"] - requests == 1
+    assert stored(drive, response["id"]) == data
+    assert upload_journal.get_entry(journal, path)["state"] == upload_journal.UPLOADED
+
+def test_expired_session_restarts_the_upload(tmp_path, drive, gdrive, journal, capsys):
+    path, data = local_file(tmp_path, "GPM_Dresden_240701_1200_1.jpg", 512 * 1024)
+    stop_after(gdrive, 1)
+    upload(gdrive, path)
+    drive.sessions.clear()  # GDrive forgot the session (a week later)
+
+    gdrive["scheduler"] = upload_scheduler.UploadScheduler([], None, str(tmp_path / "link_stats.json"))
+    response = upload(gdrive, path)
+    assert "expired. Upload restarted" in capsys.readouterr().out
+    assert stored(drive, response["id"]) == data
+    assert upload_journal.get_entry(journal, path)["state"] == upload_journal.UPLOADED
+
+def test_session_restarts_are_bounded(tmp_path, gdrive, journal, capsys):
+    path, _ = local_file(tmp_path, "GPM_Dresden_240701_1200_1.jpg", 1000)
+    calls = []
+
+    def always_expired(service, creds, file_path, *arguments):
+        upload_journal.start_entry(journal, file_path)
+        upload_journal.record_session(journal, file_path, "http://drive/session", 256)
+        calls.append(file_path)
+        raise gdrive["SessionExpired"]()
+    gdrive["upload_session"] = always_expired
+
+    assert upload(gdrive, path) is None
+    assert len(calls) == gdrive["SESSION_RESTARTS"] + 1
+    entry = upload_journal.get_entry(journal, path)
+    assert (entry["state"], entry["session_uri"], entry["offset"]) == (upload_journal.PENDING, None, 0)
+    assert "resumable sessions of GPM_Dresden_240701_1200_1.jpg expired" in capsys.readouterr().out
+
+def test_no_restart_after_the_deadline(tmp_path, gdrive):
+    path, _ = local_file(tmp_path, "GPM_Dresden_240701_1200_1.jpg", 1000)
+    calls = []
+    gdrive["scheduler"].expired = lambda: bool(calls)
+
+    def expired_once(*arguments):
+        calls.append(arguments)
+        raise gdrive["SessionExpired"]()
+    gdrive["upload_session"] = expired_once
+    assert upload(gdrive, path) is None
+    assert len(calls) == 1
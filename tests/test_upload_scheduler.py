@@ -0,0 +1,102 @@
+import json
+import time
+
+import pytest
+
+import upload_scheduler
+from upload_scheduler import UploadScheduler, CHUNK_UNIT, MIN_CHUNK, MAX_CHUNK
+
+def link_stats(tmp_path, **stats):
+    path = tmp_path / "link_stats.json"
+    if stats:
+        path.write_text(json.dumps(stats))
+    return str(path)
+
+def job(dtype, name, size=1000, mtime=0, deferred=False):
+    return {"dtype": dtype, "name": name, "bytes": size, "mtime": mtime, "deferred": deferred}
+
+def drain(scheduler):
+    names = []
+    while True:
+        next_job = scheduler.next_job()
+        if next_job is None:
+            return names
+        names.append(next_job["name"])
+
+def test_priority_order_newest_first_and_deferred_last(tmp_path):
+    jobs = [job("TIR", "tir_old", mtime=1), job("RGB", "rgb_deferred", mtime=9, deferred=True), job("TIR", "tir_new", mtime=2),
+            job("RGB", "rgb_old", mtime=3), job("LOG", "log", mtime=0), job("RGB", "rgb_new", mtime=4),
+            job("TXT", "txt", mtime=0), job("PRV", "preview", mtime=0)]
+    scheduler = UploadScheduler(jobs, None, link_stats(tmp_path))
+    assert drain(scheduler) == ["preview", "log", "txt", "rgb_new", "rgb_old", "tir_new", "tir_old", "rgb_deferred"]
+
+def test_deadline_estimate_skips_jobs(tmp_path, capsys):
+    # 100 KB/s and 1 s RTT: a job needs SAFETY * (3 + KB / 100) s
+    stats = link_stats(tmp_path, throughput=100 * 1024, rtt=1.0)
+    jobs = [job("PRV", "small", 100 * 1024), job("RGB", "large", 2000 * 1024), job("TIR", "medium", 500 * 1024)]
+    scheduler = UploadScheduler(jobs, time.time() + 10.5, stats)
+    assert scheduler.estimate(jobs[0]) == pytest.approx(upload_scheduler.SAFETY * 4)
+    assert scheduler.estimate(jobs[2]) == pytest.approx(upload_scheduler.SAFETY * 8)
+    # small (5 s) fits, large (26.25 s) is skipped, medium (10 s) still fits
+    assert drain(scheduler) == ["small", "medium"]
+    assert [skipped["name"] for skipped in scheduler.skipped] == ["large"]
+    assert "large skipped" in capsys.readouterr().out
+
+def test_expired_deadline(tmp_path):
+    scheduler = UploadScheduler([job("PRV", "preview")], time.time() - 1, link_stats(tmp_path))
+    assert scheduler.expired()
+    assert scheduler.next_job() is None
+    assert not scheduler.sleep(1)
+
+def test_link_stats_defaults_and_saved(tmp_path):
+    scheduler = UploadScheduler([], None, link_stats(tmp_path))
+    assert scheduler.throughput == upload_scheduler.DEFAULT_THROUGHPUT and scheduler.rtt == upload_scheduler.DEFAULT_RTT
+    scheduler.record(200 * 1024, 1.0)
+    scheduler.close()
+    saved = upload_scheduler.load_link_stats(str(tmp_path / "link_stats.json"))
+    expected = (1 - upload_scheduler.EWMA_WEIGHT) * upload_scheduler.DEFAULT_THROUGHPUT + upload_scheduler.EWMA_WEIGHT * 200 * 1024
+    assert saved["throughput"] == pytest.approx(expected)
+
+def test_fit_finds_rtt_and_bandwidth(tmp_path):
+    scheduler = UploadScheduler([], None, link_stats(tmp_path, rtt=0.5, bandwidth=400 * 1024))
+    rtt, bandwidth = 0.3, 256 * 1024
+    for _ in range(10):
+        for size in (256 * 1024, 512 * 1024, 1024 * 1024):
+            scheduler.record_chunk(size, rtt + size / bandwidth)
+    assert scheduler.rtt == pytest.approx(rtt, rel=0.01)
+    assert scheduler.bandwidth == pytest.approx(bandwidth, rel=0.01)
+    assert scheduler.loss == 0
+
+def test_retried_chunks_are_not_link_samples(tmp_path):
+    scheduler = UploadScheduler([], None, link_stats(tmp_path, rtt=0.5, bandwidth=400 * 1024))
+    scheduler.record_chunk(1024 * 1024, 30.0, requests=2)
+    scheduler.record_chunk(1024 * 1024, 30.0, failures=1)
+    assert len(scheduler.samples) == 0
+    assert (scheduler.rtt, scheduler.bandwidth) == (0.5, 400 * 1024)
+    assert scheduler.loss > 0
+
+def test_same_size_chunks_give_a_bound(tmp_path):
+    scheduler = UploadScheduler([], None, link_stats(tmp_path, rtt=1.0, bandwidth=100 * 1024))
+    scheduler.record_chunk(256 * 1024, 0.5)
+    assert scheduler.rtt == 0.5
+    assert scheduler.bandwidth > 100 * 1024
+
+@pytest.mark.parametrize("rtt, bandwidth, loss", [(0.05, 10 * 1024 * 1024, 0.0), (0.3, 256 * 1024, 0.0), (0.8, 256 * 1024, 0.0),
+                                                  (0.3, 256 * 1024, 0.3), (2.0, 20 * 1024, 0.5), (0.01, 1e9, 0.0)])
+def test_chunk_size_multiple_of_256_kib(tmp_path, rtt, bandwidth, loss):
+    scheduler = UploadScheduler([], None, link_stats(tmp_path, rtt=rtt, bandwidth=bandwidth, loss=loss))
+    size = scheduler.chunk_size()
+    assert size % CHUNK_UNIT == 0
+    assert MIN_CHUNK <= size <= MAX_CHUNK
+
+def test_chunk_size_follows_the_link(tmp_path):
+    fast = UploadScheduler([], None, link_stats(tmp_path, rtt=0.2, bandwidth=1024 * 1024)).chunk_size()
+    slow = UploadScheduler([], None, link_stats(tmp_path, rtt=0.2, bandwidth=256 * 1024)).chunk_size()
+    lossy = UploadScheduler([], None, link_stats(tmp_path, rtt=0.2, bandwidth=1024 * 1024, loss=0.3)).chunk_size()
+    far = UploadScheduler([], None, link_stats(tmp_path, rtt=1.0, bandwidth=256 * 1024)).chunk_size()
+    # MIN_CHUNK_SECONDS of bandwidth, shorter chunks on a lossy link, CHUNK_RTTS round trips on a long link
+    # and whole CHUNK_UNITs always
+    assert fast == 4 * 1024 * 1024 and slow == 1024 * 1024
+    assert lossy == 1024 * 1024
+    assert far == 4 * 1024 * 1024
+    assert UploadScheduler([], None, link_stats(tmp_path, rtt=0.3, bandwidth=1024 * 1024)).chunk_size() == 19 * CHUNK_UNIT
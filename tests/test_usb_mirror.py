@@ -0,0 +1,117 @@
+import os
+
+import pytest
+
+import metrics
+import usb_mirror
+
+@pytest.fixture
+def stick(tmp_path, monkeypatch):
+    """FileTransfer folder, USB stick folder and manifest under tmp_path."""
+    monkeypatch.setattr(usb_mirror, "is_mounted", lambda mount_point: True)
+    monkeypatch.setattr(metrics, "record", lambda *arguments, **fields: None)
+    source = tmp_path / "FileTransfer"
+    mount_point = tmp_path / "usb_stick"
+    source.mkdir()
+    mount_point.mkdir()
+    return str(source), str(mount_point), str(tmp_path / "usb_manifest.db")
+
+def source_files(source, names, size=3000):
+    files = []
+    for name in names:
+        path = os.path.join(source, name)
+        with open(path, "wb") as f:
+            f.write(os.urandom(size))
+        files.append(path)
+    return files
+
+def manifest(manifest_path):
+    conn = usb_mirror.open_manifest(manifest_path)
+    rows = {row["name"]: dict(row) for row in conn.execute("SELECT * FROM files")}
+    conn.close()
+    return rows
+
+def test_sync_copies_verified_files_once(stick, capsys):
+    source, mount_point, manifest_path = stick
+    files = source_files(source, ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"])
+    verified = usb_mirror.sync(files, mount_point, manifest_path)
+    assert [entry["name"] for entry in verified] == ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"]
+    assert sorted(os.listdir(mount_point)) == ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"]  # no .part left
+    for file in files:
+        copy = os.path.join(mount_point, os.path.basename(file))
+        assert usb_mirror.checksum(copy) == usb_mirror.checksum(file)
+        assert manifest(manifest_path)[os.path.basename(file)]["checksum"] == usb_mirror.checksum(file)
+        assert os.stat(copy).st_mtime == os.stat(file).st_mtime
+
+    assert usb_mirror.sync(files, mount_point, manifest_path) == []
+    assert "USB stick up to date (2 files checked)" in capsys.readouterr().out
+
+def test_pending_files_size_and_mtime(stick):
+    source, mount_point, manifest_path = stick
+    files = source_files(source, ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg", "GPM_240701_1200_3.jpg"])
+    usb_mirror.sync(files, mount_point, manifest_path)
+    with open(files[0], "ab") as f:
+        f.write(b"more")
+    stat = os.stat(files[1])
+    os.utime(files[1], (stat.st_atime, stat.st_mtime + 1))  # within the 2 s of FAT
+    stat = os.stat(files[2])
+    os.utime(files[2], (stat.st_atime, stat.st_mtime + 3))
+    conn = usb_mirror.open_manifest(manifest_path)
+    assert [file for file, _ in usb_mirror.pending_files(conn, files)] == [files[0], files[2]]
+    conn.close()
+
+def test_corrupted_copy_is_not_recorded(stick, monkeypatch, capsys):
+    source, mount_point, manifest_path = stick
+    files = source_files(source, ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"])
+    read_back_checksum = usb_mirror.read_back_checksum
+
+    def corrupted_stick(path):
+        if path.endswith("_2.jpg.part"):
+            with open(path, "r+b") as f:
+                f.seek(100)
+                f.write(b"\x00" * 8)
+        return read_back_checksum(path)
+    monkeypatch.setattr(usb_mirror, "read_back_checksum", corrupted_stick)
+
+    verified = usb_mirror.sync(files, mount_point, manifest_path)
+    assert [entry["name"] for entry in verified] == ["GPM_240701_1200_1.jpg"]
+    assert os.listdir(mount_point) == ["GPM_240701_1200_1.jpg"]
+    assert list(manifest(manifest_path)) == ["GPM_240701_1200_1.jpg"]
+    assert "GPM_240701_1200_2.jpg copy on the USB stick is corrupted" in capsys.readouterr().out
+
+    monkeypatch.setattr(usb_mirror, "read_back_checksum", read_back_checksum)
+    conn = usb_mirror.open_manifest(manifest_path)
+    assert [file for file, _ in usb_mirror.pending_files(conn, files)] == [files[1]]
+    conn.close()
+
+def test_reconcile_with_the_stick(stick):
+    source, mount_point, manifest_path = stick
+    files = source_files(source, ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg", "GPM_240701_1200_3.jpg"])
+    usb_mirror.sync(files, mount_point, manifest_path)
+    os.remove(os.path.join(mount_point, "GPM_240701_1200_1.jpg"))
+    with open(os.path.join(mount_point, "GPM_240701_1200_2.jpg"), "r+b") as f:
+        f.truncate(1000)
+    source_files(mount_point, ["GPM_240630_1200_1.jpg"])  # copied by hand
+    source_files(mount_point, [".GPM_240701_1300_1.jpg.part"])  # copy cut by a power loss
+
+    assert usb_mirror.reconcile(mount_point, manifest_path) == (3, 1, 2)
+    assert sorted(manifest(manifest_path)) == ["GPM_240630_1200_1.jpg", "GPM_240701_1200_3.jpg"]
+    conn = usb_mirror.open_manifest(manifest_path)
+    assert [file for file, _ in usb_mirror.pending_files(conn, files)] == files[:2]
+    assert usb_mirror.last_reconcile(conn) is not None
+    conn.close()
+
+def test_rebuild_from_the_stick(stick):
+    source, mount_point, manifest_path = stick
+    files = source_files(source, ["GPM_240701_1200_1.jpg", "GPM_240701_1200_2.jpg"])
+    usb_mirror.sync(files, mount_point, manifest_path)
+    os.remove(manifest_path)  # SD card replaced
+
+    assert usb_mirror.reconcile(mount_point, manifest_path, rebuild=True, with_checksum=True) == (2, 2, 0)
+    rows = manifest(manifest_path)
+    assert all(rows[os.path.basename(file)]["checksum"] == usb_mirror.checksum(file) for file in files)
+    conn = usb_mirror.open_manifest(manifest_path)
+    assert usb_mirror.pending_files(conn, files) == []
+    count, size, oldest, newest = usb_mirror.stats(conn)
+    assert (count, size) == (2, 6000)
+    conn.close()
@@ -0,0 +1,207 @@
+##############################################################################################
+# timelapse_builder: Time-lapse frames and daily composites of the RGB archive of a station  #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Analysis side (not installed on the stations). The ID_yymmdd_HHMM_n.jpg images of an archive
+# (USB stick, fleet_catalog store or any copy, searched recursively; the catalog is used when the
+# folder has one) are grouped in buckets of --every minutes. For every bucket a worker process
+# assesses all the images on a 1/8 draft decode (rgb_quality statistics) and decodes only the best
+# one (sharpest image not dropped by the quality gate) at the output size, again with a draft decode.
+#   timelapse: one frame per bucket, <out>/<station>/timelapse_<every>min/<station>_<yymmdd_HHMM>.jpg
+#              (--video joins the frames with ffmpeg)
+#   composite: one image per day with a tile per bucket at its time of day, <out>/<station>/composite_<every>min/
+# Buckets (frames) and days (composites) already in <out> are skipped, and so are the bucket/day of
+# the newest image, which may still be incomplete. Buckets without a usable image leave an empty
+# .none file so that night buckets are not decoded again. Only the buckets being processed by the
+# workers are in memory.
+#
+# Usage: python3 timelapse_builder.py timelapse <archive> --out <folder> [--every 60] [--width 1920] [--video]
+#        python3 timelapse_builder.py composite <archive> --out <folder> [--every 60] [--tile 480] [--columns 6]
+
+import os
+import io
+import time
+import shutil
+import argparse
+import subprocess
+from datetime import datetime
+from itertools import groupby
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+import fleet_catalog
+import rgb_quality
+
+ASPECT = 2 / 3  # height / width of the DSLR images
+QUALITY = 90
+FPS = 24
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: Timelapse :: {message}", flush=True)
+
+def find_images(archive):
+    """[(station, taken, path)] of the RGB images of the archive, in time order."""
+    images = []
+    catalog = fleet_catalog.catalog_path(archive)
+    if os.path.exists(catalog):
+        conn = fleet_catalog.open_catalog(catalog)
+        images = [(row["station"], row["taken"], row["local_path"]) for row in fleet_catalog.query(conn, kind="rgb", downloaded=True)]
+    else:
+        for folder, _, names in os.walk(archive):
+            for name in names:
+                parsed = fleet_catalog.parse_name(name)
+                if parsed and parsed["kind"] == "rgb":
+                    images.append((parsed["prefix"], parsed["taken"], os.path.join(folder, name)))
+    return sorted(images, key=lambda image: (image[0], image[1], image[2]))
+
+def bucket_of(taken, every):
+    """'yymmdd_HHMM' of the start of the bucket of a 'YYYY-MM-DD HH:MM:SS' time."""
+    minutes = int(taken[11:13]) * 60 + int(taken[14:16])
+    minutes = minutes - minutes % every
+    return f"{taken[2:4]}{taken[5:7]}{taken[8:10]}_{minutes // 60:02d}{minutes % 60:02d}"
+
+def buckets(images, every):
+    """{station: [(bucket, [paths])]} in time order."""
+    result = {}
+    for (station, bucket), group in groupby(images, key=lambda image: (image[0], bucket_of(image[1], every))):
+        result.setdefault(station, []).append((bucket, [image[2] for image in group]))
+    return result
+
+def best_frame(paths, width):
+    """JPEG bytes of the best image of a bucket scaled to `width`, or None if none is usable."""
+    from PIL import Image
+    best, best_sharpness = None, -1.0
+    for path in paths:
+        try:
+            stats = rgb_quality.frame_stats(rgb_quality.load_grey(path))
+        except Exception:
+            continue
+        tag, _ = rgb_quality.classify(stats)
+        if tag != rgb_quality.DROP and stats["sharpness"] > best_sharpness:
+            best, best_sharpness = path, stats["sharpness"]
+    if best is None:
+        return None
+    size = (width, round(width * ASPECT))
+    with Image.open(best) as img:
+        img.draft("RGB", size)  # decode at the smallest DCT scale that is still >= size
+        img = img.convert("RGB")
+        img.thumbnail(size, Image.LANCZOS)
+    return encode(img)
+
+def encode(img):
+    buffer = io.BytesIO()
+    img.save(buffer, "JPEG", quality=QUALITY)
+    return buffer.getvalue()
+
+def write_file(path, data):
+    with open(path + ".tmp", "wb") as f:
+        f.write(data)
+    os.replace(path + ".tmp", path)
+
+def stream(tasks, width, workers):
+    """Yield (key, bucket, jpeg bytes or None) in task order with at most 4 buckets per worker in flight."""
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending = deque()
+        for key, bucket, paths in tasks:
+            pending.append((key, bucket, pool.submit(best_frame, paths, width)))
+            if len(pending) >= 4 * workers:
+                key, bucket, future = pending.popleft()
+                yield key, bucket, future.result()
+        while pending:
+            key, bucket, future = pending.popleft()
+            yield key, bucket, future.result()
+
+def build_timelapse(station, station_buckets, out, every, width, workers):
+    """Write the missing frames of a station. Return (frames written, buckets without image)."""
+    folder = os.path.join(out, station, f"timelapse_{every}min")
+    os.makedirs(folder, exist_ok=True)
+    built = set(os.path.splitext(name)[0] for name in os.listdir(folder))
+    tasks = [(f"{station}_{bucket}", bucket, paths) for bucket, paths in station_buckets[:-1] if f"{station}_{bucket}" not in built]
+    written, empty = 0, 0
+    for key, _, data in stream(tasks, width, workers):
+        if data is None:
+            open(os.path.join(folder, key + ".none"), "w").close()
+            empty = empty + 1
+        else:
+            write_file(os.path.join(folder, key + ".jpg"), data)
+            written = written + 1
+    return written, empty
+
+def build_video(station, out, every, fps=FPS):
+    folder = os.path.join(out, station, f"timelapse_{every}min")
+    target = os.path.join(out, station, f"{station}_timelapse_{every}min.mp4")
+    if shutil.which("ffmpeg") is None:
+        _print("ERROR: ffmpeg not found, the frames are not joined into a video")
+        return None
+    subprocess.run(["ffmpeg", "-y", "-loglevel", "error", "-framerate", str(fps), "-pattern_type", "glob", "-i", os.path.join(folder, "*.jpg"),
+                    "-c:v", "libx264", "-pix_fmt", "yuv420p", "-vf", "pad=ceil(iw/2)*2:ceil(ih/2)*2", target], check=True)
+    return target
+
+def build_composites(station, station_buckets, out, every, tile, columns, workers):
+    """Write the missing daily composites of a station. Return the composites written."""
+    from PIL import Image
+    folder = os.path.join(out, station, f"composite_{every}min")
+    os.makedirs(folder, exist_ok=True)
+    newest_day = station_buckets[-1][0][0:6]
+    tasks = [(f"{station}_{bucket[0:6]}_composite", bucket, paths) for bucket, paths in station_buckets
+             if bucket[0:6] != newest_day and not os.path.exists(os.path.join(folder, f"{station}_{bucket[0:6]}_composite.jpg"))]
+    tile_size = (tile, round(tile * ASPECT))
+    rows = -(-(24 * 60 // every) // columns)
+    written, canvas, current = 0, None, None
+    for key, bucket, data in stream(tasks, tile, workers):
+        if key != current:
+            if canvas is not None:
+                write_file(os.path.join(folder, current + ".jpg"), encode(canvas))
+                written = written + 1
+            canvas, current = Image.new("RGB", (columns * tile_size[0], rows * tile_size[1]), (40, 40, 40)), key
+        if data is not None:
+            index = (int(bucket[7:9]) * 60 + int(bucket[9:11])) // every
+            canvas.paste(Image.open(io.BytesIO(data)), ((index % columns) * tile_size[0], (index // columns) * tile_size[1]))
+    if canvas is not None:
+        write_file(os.path.join(folder, current + ".jpg"), encode(canvas))
+        written = written + 1
+    return written
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Time-lapse frames and daily composites of the RGB images of the stations')
+    parser.add_argument('command', choices=['timelapse', 'composite'], help='timelapse: one frame per bucket, composite: one image per day')
+    parser.add_argument('archive', type=str, help='Folder with the ID_yymmdd_HHMM_n.jpg images (searched recursively)')
+    parser.add_argument('--out', type=str, required=True, help='Output folder')
+    parser.add_argument('--stations', type=str, nargs='+', default=None, help='Stations (all by default)')
+    parser.add_argument('--every', type=int, default=60, help='Minutes per bucket')
+    parser.add_argument('--width', type=int, default=1920, help='timelapse: frame width in pixels')
+    parser.add_argument('--video', action='store_true', help='timelapse: join the frames into an mp4 with ffmpeg')
+    parser.add_argument('--fps', type=int, default=FPS, help='timelapse: frames per second of the video')
+    parser.add_argument('--tile', type=int, default=480, help='composite: tile width in pixels')
+    parser.add_argument('--columns', type=int, default=6, help='composite: tiles per row')
+    parser.add_argument('--workers', type=int, default=os.cpu_count(), help='Decoding processes')
+    args = parser.parse_args()
+
+    start = time.time()
+    images = find_images(args.archive)
+    _print(f"{len(images)} RGB images found in {time.time() - start:.2f} s")
+    for station, station_buckets in buckets(images, args.every).items():
+        if args.stations and station not in args.stations:
+            continue
+        try:
+            started = time.time()
+            if args.command == 'timelapse':
+                written, empty = build_timelapse(station, station_buckets, args.out, args.every, args.width, args.workers)
+                _print(f"{station}: {written} frames written, {empty} buckets without usable image in {time.time() - started:.2f} s")
+                if args.video:
+                    _print(f"{station}: video {build_video(station, args.out, args.every, args.fps)}")
+            else:
+                written = build_composites(station, station_buckets, args.out, args.every, args.tile, args.columns, args.workers)
+                _print(f"{station}: {written} daily composites written in {time.time() - started:.2f} s")
+        except Exception as e:
+            _print(f"ERROR: {station} not built: {e}")
+    _print(f"Completed in {time.time() - start:.2f} s")
@@ -0,0 +1,223 @@
+##############################################################################################
+# tir_container: Compact container for TIR frame sets with spatial/temporal prediction       #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# File layout: b'TIRC' + uint8 version + uint32 header length + JSON header + payloads.
+# Every frame is stored as the residual of the best predictor (left/up neighbour, previous frame
+# of the same variant, or both), zigzag-mapped to unsigned integers, split in byte planes and
+# compressed with zlib or lzma. temperature_tempRange frames are floats computed by TIRcapture as
+# (raw - 5000) / 100, so they are stored as the original 16-bit integers when that is bit-exact.
+# Decoding is lossless: the reader returns the same arrays that were written by TIRcapture.
+
+import os
+import re
+import json
+import zlib
+import lzma
+import struct
+import argparse
+from datetime import datetime
+import numpy as np
+
+MAGIC = b"TIRC"
+VERSION = 1
+PREFIX = struct.Struct("<4sBI")
+FRAME_NAME = re.compile(r"^(?P<variant>.+)_(?P<index>\d+)\.tiff?$")
+TEMP_SCALE, TEMP_OFFSET = 100, 5000
+CODECS = {'zlib': (lambda data, level: zlib.compress(data, level), zlib.decompress),
+          'lzma': (lambda data, level: lzma.compress(data, preset=min(level, 9)), lzma.decompress)}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: TIR_container :: {message}")
+
+def spatial_residual(x):
+    r = np.empty_like(x)
+    r[:, 1:] = x[:, 1:] - x[:, :-1]
+    r[1:, 0] = x[1:, 0] - x[:-1, 0]
+    r[0, 0] = x[0, 0]
+    return r
+
+def spatial_restore(r):
+    x = r.copy()
+    x[:, 0] = np.cumsum(r[:, 0], dtype=x.dtype)
+    return np.cumsum(x, axis=1, dtype=x.dtype)
+
+def zigzag(r):
+    return ((r << 1) ^ (r >> 31)).astype(np.uint32)
+
+def unzigzag(z):
+    z = z.astype(np.int64)
+    return ((z >> 1) ^ -(z & 1)).astype(np.int32)
+
+def shuffle_bytes(values, width):
+    planes = values.astype(np.uint16 if width == 2 else np.uint32).view(np.uint8).reshape(-1, width)
+    return np.ascontiguousarray(planes.T).tobytes()
+
+def unshuffle_bytes(data, width, shape):
+    planes = np.frombuffer(data, dtype=np.uint8).reshape(width, -1)
+    values = np.ascontiguousarray(planes.T).view(np.uint16 if width == 2 else np.uint32)
+    return values.reshape(shape).astype(np.uint32)
+
+def quantize_temperature(frame):
+    """Return the integer image behind a float temperature frame, or None if it is not bit-exact."""
+    q = np.rint(frame.astype(np.float64) * TEMP_SCALE + TEMP_OFFSET)
+    if not np.isfinite(q).all() or q.min() < 0 or q.max() > 65535:
+        return None
+    q = q.astype(np.int32)
+    if not np.array_equal(dequantize_temperature(q).view(np.uint32), frame.astype(np.float32).view(np.uint32)):
+        return None
+    return q
+
+def dequantize_temperature(q):
+    return (q - TEMP_OFFSET).astype(np.float32) / np.float32(TEMP_SCALE)
+
+def predict(x, previous):
+    candidates = {'spatial': spatial_residual(x)}
+    if previous is not None and previous.shape == x.shape:
+        temporal = x - previous
+        candidates['temporal'] = temporal
+        candidates['temporal+spatial'] = spatial_residual(temporal)
+    # The cheapest residual (smallest mean magnitude) is the one that compresses best
+    predictor = min(candidates, key=lambda name: np.abs(candidates[name], dtype=np.int64).mean())
+    return predictor, candidates[predictor]
+
+def restore(predictor, r, previous):
+    if predictor == 'spatial':
+        return spatial_restore(r)
+    if predictor == 'temporal':
+        return r + previous
+    return spatial_restore(r) + previous
+
+def encode_frame(frame, previous, codec, level):
+    entry = {'dtype': str(frame.dtype), 'shape': list(frame.shape), 'quant': None}
+    if frame.dtype == np.uint16:
+        x = frame.astype(np.int32)
+    elif frame.dtype == np.float32 and quantize_temperature(frame) is not None:
+        x = quantize_temperature(frame)
+        entry['quant'] = [TEMP_SCALE, TEMP_OFFSET]
+    else:
+        # Not an integer image: bit-exact float32 stored without prediction
+        entry.update({'predictor': 'raw', 'width': 4, 'codec': codec})
+        return entry, None, CODECS[codec][0](shuffle_bytes(frame.astype(np.float32).view(np.uint32), 4), level)
+    predictor, r = predict(x, previous)
+    z = zigzag(r)
+    width = 2 if z.max() <= 0xFFFF else 4
+    entry.update({'predictor': predictor, 'width': width, 'codec': codec})
+    return entry, x, CODECS[codec][0](shuffle_bytes(z, width), level)
+
+def decode_frame(entry, payload, previous):
+    shape = tuple(entry['shape'])
+    values = unshuffle_bytes(CODECS[entry['codec']][1](payload), entry['width'], shape)
+    if entry['predictor'] == 'raw':
+        return values.view(np.float32).reshape(shape), None
+    x = restore(entry['predictor'], unzigzag(values), previous)
+    if entry['quant']:
+        return dequantize_temperature(x), x
+    return x.astype(np.dtype(entry['dtype'])), x
+
+def frame_key(name):
+    match = FRAME_NAME.match(name)
+    if match is None:
+        return None
+    return match.group('variant'), int(match.group('index'))
+
+def encode(frames, extras=None, codec='zlib', level=6):
+    """Encode {name: ndarray} frames (and {name: bytes} side files) into container bytes."""
+    members, payloads, previous = [], [], {}
+    ordered = sorted(frames, key=lambda name: frame_key(name) or (name, 0))
+    for name in ordered:
+        key = frame_key(name)
+        variant = key[0] if key else name
+        entry, x, payload = encode_frame(np.asarray(frames[name]), previous.get(variant), codec, level)
+        previous[variant] = x
+        entry.update({'name': name, 'kind': 'frame', 'variant': variant, 'length': len(payload)})
+        members.append(entry)
+        payloads.append(payload)
+    for name, data in sorted((extras or {}).items()):
+        payload = CODECS[codec][0](data, level)
+        members.append({'name': name, 'kind': 'file', 'codec': codec, 'length': len(payload)})
+        payloads.append(payload)
+    header = json.dumps({'members': members}, separators=(",", ":")).encode()
+    return PREFIX.pack(MAGIC, VERSION, len(header)) + header + b"".join(payloads)
+
+def decode(data):
+    """Decode container bytes into ({name: ndarray}, {name: bytes})."""
+    magic, version, header_length = PREFIX.unpack_from(data)
+    if magic != MAGIC or version != VERSION:
+        raise ValueError("Not a TIR container (or unsupported version)")
+    header = json.loads(data[PREFIX.size:PREFIX.size + header_length])
+    position = PREFIX.size + header_length
+    frames, extras, previous = {}, {}, {}
+    for entry in header['members']:
+        payload = data[position:position + entry['length']]
+        position = position + entry['length']
+        if entry['kind'] == 'file':
+            extras[entry['name']] = CODECS[entry['codec']][1](payload)
+            continue
+        frames[entry['name']], previous[entry['variant']] = decode_frame(entry, payload, previous.get(entry['variant']))
+    return frames, extras
+
+def read_tiff(path):
+    from PIL import Image
+    with Image.open(path) as img:
+        return np.array(img)
+
+def write_tiff(path, frame):
+    from PIL import Image
+    Image.fromarray(frame).save(path)
+
+def pack_folder(path_tir, container_path, codec='zlib', level=6):
+    frames, extras = {}, {}
+    for entry in os.scandir(path_tir):
+        if not entry.is_file():
+            continue
+        if frame_key(entry.name):
+            frames[entry.name] = read_tiff(entry.path)
+        else:
+            with open(entry.path, "rb") as f:
+                extras[entry.name] = f.read()
+    with open(container_path + ".part", "wb") as f:
+        f.write(encode(frames, extras, codec, level))
+    os.replace(container_path + ".part", container_path)
+    return len(frames), len(extras)
+
+def read_container(container_path):
+    with open(container_path, "rb") as f:
+        return decode(f.read())
+
+def unpack(container_path, out_dir):
+    frames, extras = read_container(container_path)
+    os.makedirs(out_dir, exist_ok=True)
+    for name, frame in frames.items():
+        write_tiff(os.path.join(out_dir, name), frame)
+    for name, data in extras.items():
+        with open(os.path.join(out_dir, name), "wb") as f:
+            f.write(data)
+    return len(frames), len(extras)
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Pack or unpack TIR frame sets (.tirc)')
+    parser.add_argument('action', choices=['pack', 'unpack'], help='pack a capture folder or unpack a container')
+    parser.add_argument('source', type=str, help='Capture folder (pack) or .tirc file (unpack)')
+    parser.add_argument('target', type=str, help='.tirc file (pack) or output folder (unpack)')
+    parser.add_argument('--codec', type=str, default='zlib', choices=sorted(CODECS), help='Entropy coder')
+    parser.add_argument('--level', type=int, default=6, help='Compression level')
+    args = parser.parse_args()
+    try:
+        if args.action == 'pack':
+            n_frames, n_files = pack_folder(args.source, args.target, args.codec, args.level)
+        else:
+            n_frames, n_files = unpack(args.source, args.target)
+        _print(f"{args.action.capitalize()} done: {n_frames} frames and {n_files} files")
+    except Exception as e:
+        _print(f"ERROR: {args.action} failed")
+        _print(f"ERROR: {e}")
@@ -0,0 +1,91 @@
+##############################################################################################
+# tir_packager: Stream TIR frames into the ZIP archive while TIRcapture is still running     #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+import os
+import time
+import zipfile
+import fnmatch
+from datetime import datetime
+
+POLL_INTERVAL = 0.25
+COMPRESSION = {'deflated': zipfile.ZIP_DEFLATED, 'stored': zipfile.ZIP_STORED}
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: TIR_images :: {message}")
+
+def member_compression(arcname, compression='deflated', level=6, stored_patterns=()):
+    if any(fnmatch.fnmatch(arcname, pattern) for pattern in stored_patterns):
+        return zipfile.ZIP_STORED, None
+    if COMPRESSION[compression] == zipfile.ZIP_STORED:
+        return zipfile.ZIP_STORED, None
+    return zipfile.ZIP_DEFLATED, level
+
+def add_member(zipf, file_path, compression='deflated', level=6, stored_patterns=(), remove=True):
+    arcname = os.path.basename(file_path)
+    compress_type, compresslevel = member_compression(arcname, compression, level, stored_patterns)
+    zipf.write(file_path, arcname, compress_type=compress_type, compresslevel=compresslevel)
+    if remove:
+        os.remove(file_path)
+
+def drop_partial_frame(path_tir, frame_suffix=".tif", kept=()):
+    """Delete the newest frame after TIRcapture was killed: it may have been cut in the middle."""
+    frames = [entry for entry in os.scandir(path_tir) if entry.is_file() and entry.name.endswith(frame_suffix) and entry.name not in kept]
+    newest = max((entry.stat().st_mtime_ns for entry in frames), default=None)
+    dropped = []
+    for entry in frames:
+        if entry.stat().st_mtime_ns == newest:
+            os.remove(entry.path)
+            _print(f"Frame {entry.name} dropped: it was being written when the capture was stopped")
+            dropped.append(entry.name)
+    return dropped
+
+def stream_capture(process, path_tir, zip_path, compression='deflated', level=6, stored_patterns=(), frame_suffix=".tif", timeout=None, keep_patterns=()):
+    """Add every frame to `zip_path` as soon as TIRcapture finishes writing it.
+
+    TIRcapture writes the frames one after the other, so a frame is complete once a later frame
+    exists (newer modification time); the newest frame waits for the next one or for the end of
+    the process. A size that did not change between two polls is not enough: imwrite can pause in
+    the middle of a frame. Other files (the temperatures.txt that the C++ code appends after every
+    frame) are added once the process exits.
+    The archive is written as .part and renamed at the end, so a half-written ZIP is never uploaded.
+    After `timeout` seconds the capture is stopped and the frames written so far are kept, except
+    the newest one (drop_partial_frame).
+    Frames matching `keep_patterns` stay in `path_tir` after being added (post-capture analysis).
+    """
+    end_time = None if timeout is None else time.time() + timeout
+    part_path = zip_path + ".part"
+    kept = set()
+    added = 0
+    with zipfile.ZipFile(part_path, 'w') as zipf:
+        while True:
+            finished = process.poll() is not None
+            entries = [entry for entry in sorted(os.scandir(path_tir), key=lambda e: e.name) if entry.is_file() and entry.name not in kept]
+            newest = max((entry.stat().st_mtime_ns for entry in entries if entry.name.endswith(frame_suffix)), default=None)
+            for entry in entries:
+                if finished or (entry.name.endswith(frame_suffix) and entry.stat().st_mtime_ns < newest):
+                    keep = any(fnmatch.fnmatch(entry.name, pattern) for pattern in keep_patterns)
+                    add_member(zipf, entry.path, compression, level, stored_patterns, remove=not keep)
+                    if keep:
+                        kept.add(entry.name)
+                    added = added + 1
+            if finished:
+                break
+            if end_time is not None and time.time() > end_time:
+                _print(f"ERROR: TIR capture stopped after {timeout} s")
+                process.terminate()
+                process.wait()
+                drop_partial_frame(path_tir, frame_suffix, kept)
+                continue
+            time.sleep(POLL_INTERVAL)
+    os.replace(part_path, zip_path)
+    return added
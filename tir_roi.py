@@ -0,0 +1,126 @@
+##############################################################################################
+# tir_roi: Temperature statistics of glacier-front regions from the TIR tempRange frames      #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# The temperature_tempRange_16_*.tif frames of a capture (float32, degC) are memory-mapped when the
+# TIFF is uncompressed with contiguous strips (otherwise decoded with PIL). For every region of
+# ROI_PATH, a JSON file {"front": [[x, y], ...], ...} with polygons in pixel coordinates, the
+# statistics of the burst are:
+#   T_min, T_max, T_mean, T_p5, T_p50, T_p95  (median over the frames of each frame value)
+#   T_mean_std  (std of the region mean over the frames)
+#   T_step      (mean absolute change of every pixel between consecutive frames)
+# Without ROI file the whole frame is used ("frame"). The rows go to the ID_yymmdd_TIRroi.txt series
+# (temp_series), uploaded as TXT before the TIR packages.
+#
+# Usage: python3 tir_roi.py <capture folder> [--roi_file tir_roi.json]
+
+import os
+import glob
+import json
+import time
+import argparse
+from datetime import datetime
+
+import numpy as np
+
+ROI_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "scripts/tir_roi.json")
+FRAME_PATTERN = "*temperature_tempRange_16_*.tif"
+SERIES_KIND = "TIRroi"
+PERCENTILES = (5, 50, 95)
+TIFF_TYPES = {(32, 3): "f4", (16, 1): "u2", (16, 2): "i2", (8, 1): "u1"}  # (bits, sample format)
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: TIR_ROI :: {message}")
+
+def load_rois(path=ROI_PATH):
+    """{name: (N, 2) array of polygon vertices} or {} if there is no ROI file."""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path, "r") as f:
+        return {name: np.asarray(vertices, dtype=np.float64) for name, vertices in json.load(f).items()}
+
+def polygon_mask(polygon, shape):
+    """Pixels whose centre is inside the polygon (even-odd rule), for all pixels at once."""
+    y, x = np.mgrid[0:shape[0], 0:shape[1]]
+    x, y = x + 0.5, y + 0.5
+    inside = np.zeros(shape, dtype=bool)
+    for (x1, y1), (x2, y2) in zip(polygon, np.roll(polygon, -1, axis=0)):
+        if y1 == y2:
+            continue
+        crosses = (y1 > y) != (y2 > y)
+        inside ^= crosses & (x < x1 + (y - y1) * (x2 - x1) / (y2 - y1))
+    return inside
+
+def map_frame(path):
+    """Memory map of an uncompressed TIFF frame; decoded array for any other layout."""
+    from PIL import Image
+    with Image.open(path) as img:
+        tags = img.tag_v2
+        width, height = img.size
+        offsets, counts = tags.get(273), tags.get(279)
+        kind = TIFF_TYPES.get((tags.get(258, (0,))[0], tags.get(339, (1,))[0]))
+        contiguous = (offsets is not None and counts is not None and
+                      all(offsets[i] + counts[i] == offsets[i + 1] for i in range(len(offsets) - 1)))
+        if tags.get(259, 1) == 1 and kind and contiguous and sum(counts) == width * height * int(kind[1]):
+            with open(path, "rb") as f:
+                order = "<" if f.read(2) == b"II" else ">"
+            return np.memmap(path, dtype=order + kind, mode="r", offset=offsets[0], shape=(height, width))
+        return np.array(img)
+
+def frame_paths(path_tir):
+    def index(path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        return int(stem.rsplit("_", 1)[1]) if stem.rsplit("_", 1)[1].isdigit() else 0
+    return sorted(glob.glob(os.path.join(path_tir, FRAME_PATTERN)), key=index)
+
+def summarise(frames, rois):
+    """{roi: {variable: value}} of a burst of frames (list of 2-D arrays of the same shape)."""
+    stack = np.stack([np.asarray(frame, dtype=np.float32) for frame in frames])
+    masks = {name: polygon_mask(polygon, stack.shape[1:]) for name, polygon in rois.items()} or {"frame": np.ones(stack.shape[1:], dtype=bool)}
+    summary = {}
+    for name, mask in masks.items():
+        if not mask.any():
+            _print(f"ERROR: ROI {name} has no pixel inside the frame")
+            continue
+        values = stack[:, mask]  # (frames, pixels)
+        values = np.where(np.isfinite(values), values, np.nan)
+        means = np.nanmean(values, axis=1)
+        stats = {"T_min": np.nanmin(values, axis=1), "T_max": np.nanmax(values, axis=1), "T_mean": means}
+        stats.update({f"T_p{p}": value for p, value in zip(PERCENTILES, np.nanpercentile(values, PERCENTILES, axis=1))})
+        summary[name] = {variable: round(float(np.median(series)), 3) for variable, series in stats.items()}
+        summary[name]["T_mean_std"] = round(float(means.std()), 3)
+        summary[name]["T_step"] = round(float(np.nanmean(np.abs(np.diff(values, axis=0)))), 3) if len(values) > 1 else 0.0
+        summary[name]["pixels"] = int(mask.sum())
+    return summary
+
+def rows(summary, when):
+    """Rows for temp_series.append: date, ROI_<name>, variable, value."""
+    timestamp = when.strftime("%Y-%m-%d_%H:%M:%S")
+    return [[timestamp, f"ROI_{name}", variable, value] for name, stats in summary.items() for variable, value in stats.items()]
+
+def summarise_capture(path_tir, roi_path=ROI_PATH):
+    """Summary of the tempRange frames of a capture folder ({} if there are none)."""
+    paths = frame_paths(path_tir)
+    if not paths:
+        return {}
+    return summarise([map_frame(path) for path in paths], load_rois(roi_path))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Temperature statistics of regions of the TIR tempRange frames')
+    parser.add_argument('path_tir', type=str, help='Capture folder with the temperature_tempRange_16_*.tif frames')
+    parser.add_argument('--roi_file', type=str, default=ROI_PATH, help='JSON file with the ROI polygons')
+    args = parser.parse_args()
+    start = time.time()
+    summary = summarise_capture(args.path_tir, args.roi_file)
+    for name, stats in summary.items():
+        _print(f"{name}: " + ", ".join(f"{variable} {value}" for variable, value in stats.items()))
+    _print(f"{len(frame_paths(args.path_tir))} frames summarised in {time.time() - start:.2f} s")
@@ -0,0 +1,95 @@
+##############################################################################################
+# upload_journal: Persistent journal of pending Google Drive uploads                         #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# The WittyPi cuts the power every cycle, so the state of every upload (resumable session URI,
+# confirmed byte offset and Drive file id) is kept on disk and picked up again on the next boot.
+
+import os
+import sqlite3
+import threading
+import time
+
+JOURNAL_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "upload_journal.db")
+
+PENDING = "pending"
+UPLOADING = "uploading"
+UPLOADED = "uploaded"
+
+_lock = threading.Lock()
+
+def open_journal(path=JOURNAL_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS uploads (
+                            path TEXT PRIMARY KEY,
+                            name TEXT NOT NULL,
+                            size INTEGER NOT NULL,
+                            mtime REAL NOT NULL,
+                            state TEXT NOT NULL,
+                            session_uri TEXT,
+                            offset INTEGER NOT NULL DEFAULT 0,
+                            file_id TEXT,
+                            updated REAL NOT NULL)""")
+    return conn
+
+def get_entry(conn, path):
+    with _lock:
+        row = conn.execute("SELECT * FROM uploads WHERE path = ?", (path,)).fetchone()
+    return dict(row) if row else None
+
+def list_entries(conn, state=None):
+    with _lock:
+        if state is None:
+            rows = conn.execute("SELECT * FROM uploads ORDER BY updated").fetchall()
+        else:
+            rows = conn.execute("SELECT * FROM uploads WHERE state = ? ORDER BY updated", (state,)).fetchall()
+    return [dict(row) for row in rows]
+
+def start_entry(conn, path):
+    """Return the journal entry of a local file, (re)creating it if the file changed on disk."""
+    stat = os.stat(path)
+    entry = get_entry(conn, path)
+    if entry and entry["size"] == stat.st_size and entry["mtime"] == stat.st_mtime:
+        return entry
+    with _lock, conn:
+        conn.execute("INSERT OR REPLACE INTO uploads (path, name, size, mtime, state, session_uri, offset, file_id, updated) "
+                     "VALUES (?, ?, ?, ?, ?, NULL, 0, NULL, ?)",
+                     (path, os.path.basename(path), stat.st_size, stat.st_mtime, PENDING, time.time()))
+    return get_entry(conn, path)
+
+def record_session(conn, path, session_uri, offset):
+    with _lock, conn:
+        conn.execute("UPDATE uploads SET state = ?, session_uri = ?, offset = ?, updated = ? WHERE path = ?",
+                     (UPLOADING, session_uri, int(offset or 0), time.time(), path))
+
+def reset_session(conn, path):
+    with _lock, conn:
+        conn.execute("UPDATE uploads SET state = ?, session_uri = NULL, offset = 0, updated = ? WHERE path = ?",
+                     (PENDING, time.time(), path))
+
+def mark_uploaded(conn, path, file_id):
+    with _lock, conn:
+        conn.execute("UPDATE uploads SET state = ?, session_uri = NULL, offset = size, file_id = ?, updated = ? WHERE path = ?",
+                     (UPLOADED, file_id, time.time(), path))
+
+def remove_entry(conn, path):
+    with _lock, conn:
+        conn.execute("DELETE FROM uploads WHERE path = ?", (path,))
+
+def prune_missing(conn):
+    """Forget entries whose local file is gone (deleted after upload or by the maintenance script)."""
+    removed = 0
+    for entry in list_entries(conn):
+        if not os.path.exists(entry["path"]):
+            remove_entry(conn, entry["path"])
+            removed = removed + 1
+    return removed
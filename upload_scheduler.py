@@ -0,0 +1,169 @@
+##############################################################################################
+# upload_scheduler: Deadline-aware ordering and admission of the GDrive uploads              #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# The uploads run until the WittyPi cuts the power, so every job is only started if it can finish
+# before the deadline at the throughput measured in previous transfers (kept between boots in
+# LINK_STATS_PATH). Jobs are served by priority: RGB previews, logs and temperature files, then
+# the full-resolution RGB images (newest first), the TIR backlog (newest first) and finally the
+# RGB images deferred by the quality gate (job['deferred']).
+#
+# The chunks of the resumable uploads are sized from the same link statistics. Every chunk gives a
+# sample (bytes, seconds); a least-squares fit of seconds = RTT + bytes / bandwidth over the last
+# chunks (of different sizes: the chunk size changes and the last chunk of a file is shorter) gives
+# the round-trip time and the raw bandwidth of a connection. A chunk should last CHUNK_RTTS round
+# trips, so that waiting for the answer costs little, but not more than MAX_CHUNK_SECONDS, and less
+# when chunks fail (`loss`, the failed fraction of the chunks): a failed chunk is sent again whole.
+# Sizes are multiples of 256 KiB (required by GDrive) between MIN_CHUNK and MAX_CHUNK.
+
+import os
+import json
+import time
+import threading
+from datetime import datetime
+from collections import deque
+
+LINK_STATS_PATH = os.path.join(os.environ.get('AI4G_BASE', '/home/pi'), "link_stats.json")
+DEFAULT_THROUGHPUT = 50 * 1024  # bytes/s per connection until a transfer has been measured
+DEFAULT_RTT = 1.0
+SAFETY = 1.25
+EWMA_WEIGHT = 0.3
+PRIORITY = {'PRV': 0, 'ROI': 1, 'LOG': 1, 'TXT': 1, 'RGB': 2, 'TIR': 3}
+CHUNK_UNIT = 256 * 1024
+MIN_CHUNK = CHUNK_UNIT
+MAX_CHUNK = 16 * 1024 * 1024  # read into memory by every upload worker
+CHUNK_RTTS = 16
+MIN_CHUNK_SECONDS, MAX_CHUNK_SECONDS = 4.0, 30.0
+LOSS_PENALTY = 10  # chunk duration divided by (1 + LOSS_PENALTY * loss)
+CHUNK_SAMPLES = 16
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: GDrive_Scheduler :: {message}", flush=True)
+
+def load_link_stats(path=LINK_STATS_PATH):
+    """{'throughput', 'rtt', 'bandwidth', 'loss'} of the previous boots (defaults if unknown)."""
+    stats = {"throughput": DEFAULT_THROUGHPUT, "rtt": DEFAULT_RTT, "bandwidth": DEFAULT_THROUGHPUT, "loss": 0.0}
+    try:
+        with open(path, "r") as f:
+            saved = json.load(f)
+        stats.update({key: float(saved[key]) for key in stats if key in saved})
+    except Exception:
+        pass
+    return stats
+
+def save_link_stats(stats, path=LINK_STATS_PATH):
+    try:
+        with open(path + ".tmp", "w") as f:
+            json.dump(dict(stats, updated=time.time()), f)
+        os.replace(path + ".tmp", path)
+    except Exception as e:
+        _print(f"ERROR saving link statistics: {e}")
+
+def time_left(deadline):
+    return float("inf") if deadline is None else deadline - time.time()
+
+class UploadScheduler:
+    """Hands out upload jobs ({'dtype', 'name', 'bytes', 'mtime', ...}) to the upload workers."""
+
+    def __init__(self, jobs, deadline=None, stats_path=LINK_STATS_PATH):
+        self.deadline = deadline
+        self.stats_path = stats_path
+        stats = load_link_stats(stats_path)
+        self.throughput, self.rtt, self.bandwidth, self.loss = stats["throughput"], stats["rtt"], stats["bandwidth"], stats["loss"]
+        self.samples = deque(maxlen=CHUNK_SAMPLES)  # (bytes, seconds) of the last chunks sent without errors
+        self.measured = False
+        self.jobs = sorted(jobs, key=lambda job: (job.get('deferred', False), PRIORITY.get(job['dtype'], 4), -job.get('mtime', 0)))
+        self.skipped = []
+        self.lock = threading.Lock()
+
+    def estimate(self, job):
+        return SAFETY * (3 * self.rtt + job['bytes'] / self.throughput)
+
+    def next_job(self):
+        """Return the most important job that can still finish before the deadline, or None."""
+        with self.lock:
+            while self.jobs:
+                job = self.jobs.pop(0)
+                needed, left = self.estimate(job), time_left(self.deadline)
+                if needed <= left:
+                    return job
+                self.skipped.append(job)
+                _print(f"{job['name']} skipped: needs ~{needed:.0f} s at {self.throughput / 1024:.1f} KB/s, {max(left, 0):.0f} s left")
+            return None
+
+    def record(self, sent_bytes, seconds, rtt=None):
+        """Update the per-connection throughput (and round-trip time) with a measured transfer."""
+        if sent_bytes <= 0 or seconds <= 0:
+            return
+        with self.lock:
+            self.throughput = (1 - EWMA_WEIGHT) * self.throughput + EWMA_WEIGHT * sent_bytes / seconds
+            if rtt is not None:
+                self.rtt = (1 - EWMA_WEIGHT) * self.rtt + EWMA_WEIGHT * rtt
+            self.measured = True
+
+    def record_chunk(self, sent_bytes, seconds, requests=1, failures=0):
+        """A chunk of a resumable upload: `requests` round trips (2 with the session start or a status
+        query before the chunk), `failures` attempts that failed before it got through. Only the chunks
+        sent with one request and no failure are link samples."""
+        if seconds <= 0:
+            return
+        with self.lock:
+            self.loss = (1 - EWMA_WEIGHT) * self.loss + EWMA_WEIGHT * failures / (failures + 1)
+            self.measured = True
+            if requests == 1 and not failures and sent_bytes > 0:  # retries and extra requests: no link sample
+                self.samples.append((sent_bytes, seconds))
+                self.fit()
+        self.record(sent_bytes, seconds)
+
+    def fit(self):
+        """RTT and bandwidth of seconds = RTT + bytes / bandwidth over the last chunks."""
+        count = len(self.samples)
+        mean_bytes = sum(size for size, _ in self.samples) / count
+        mean_seconds = sum(seconds for _, seconds in self.samples) / count
+        spread = sum((size - mean_bytes) ** 2 for size, _ in self.samples)
+        if count >= 3 and spread > 0:
+            slope = sum((size - mean_bytes) * (seconds - mean_seconds) for size, seconds in self.samples) / spread
+            rtt = mean_seconds - slope * mean_bytes
+            if slope > 0 and rtt >= 0:
+                self.rtt = (1 - EWMA_WEIGHT) * self.rtt + EWMA_WEIGHT * rtt
+                self.bandwidth = (1 - EWMA_WEIGHT) * self.bandwidth + EWMA_WEIGHT / slope
+                return
+        # Sizes too similar to separate both: a chunk takes at least one round trip and the bandwidth
+        # is at least bytes / seconds (the chunk size grows and the next samples can be fitted)
+        size, seconds = self.samples[-1]
+        self.rtt = min(self.rtt, seconds)
+        self.bandwidth = (1 - EWMA_WEIGHT) * self.bandwidth + EWMA_WEIGHT * size / seconds
+
+    def chunk_size(self):
+        """Bytes of the next chunk of a resumable upload (multiple of CHUNK_UNIT)."""
+        with self.lock:
+            seconds = min(max(CHUNK_RTTS * self.rtt, MIN_CHUNK_SECONDS), MAX_CHUNK_SECONDS) / (1 + LOSS_PENALTY * self.loss)
+            size = int(self.bandwidth * seconds) // CHUNK_UNIT * CHUNK_UNIT
+        return min(max(size, MIN_CHUNK), MAX_CHUNK)
+
+    def sleep(self, seconds):
+        """Sleep for a retry, but never past the deadline. Return False if the deadline is reached."""
+        left = time_left(self.deadline)
+        if left <= 0:
+            return False
+        time.sleep(min(seconds, left))
+        return time_left(self.deadline) > 0
+
+    def expired(self):
+        return time_left(self.deadline) <= 0
+
+    def close(self):
+        if self.measured:
+            save_link_stats({"throughput": self.throughput, "rtt": self.rtt, "bandwidth": self.bandwidth, "loss": self.loss,
+                             "chunk": self.chunk_size()}, self.stats_path)
+        if self.skipped:
+            _print(f"{len(self.skipped)} uploads postponed to the next cycle")
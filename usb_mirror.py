@@ -0,0 +1,235 @@
+##############################################################################################
+# usb_mirror: Incremental and verified mirror of the FileTransfer folders on the USB stick   #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# A local manifest (SQLite on the SD card) remembers what is already on the stick, so a sync never
+# lists the stick. New files are copied as .part, fsynced in one batch, read back from the stick
+# (page cache dropped) and compared with the source checksum before they are renamed and recorded.
+# python3 usb_mirror.py --verify  reconciles the manifest with the stick (--rebuild starts from zero).
+# The manifest is also the file index of the stick: stats() gives count, bytes, oldest and newest
+# without walking the stick, and index_stats() only rescans it once every `reconcile_hours`.
+
+import os
+import time
+import shutil
+import sqlite3
+import hashlib
+import argparse
+import threading
+import metrics
+from datetime import datetime
+
+BASE_PATH = os.environ.get('AI4G_BASE', '/home/pi')  # AI4G_BASE: other root to run the scripts off the Pi (benchmarks)
+MANIFEST_PATH = os.path.join(BASE_PATH, "usb_manifest.db")
+MOUNT_POINT = os.path.join(BASE_PATH, "usb_stick")
+BLOCK_SIZE = 1024 * 1024
+
+_lock = threading.Lock()
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: USB_mirror :: {message}")
+
+def open_manifest(path=MANIFEST_PATH):
+    conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+    conn.row_factory = sqlite3.Row
+    with _lock, conn:
+        conn.execute("""CREATE TABLE IF NOT EXISTS files (
+                            name TEXT PRIMARY KEY,
+                            size INTEGER NOT NULL,
+                            mtime REAL NOT NULL,
+                            checksum TEXT,
+                            copied REAL NOT NULL)""")
+        conn.execute("CREATE INDEX IF NOT EXISTS files_mtime ON files (mtime)")
+        conn.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value REAL)")
+    return conn
+
+def is_mounted(mount_point=MOUNT_POINT):
+    with open('/proc/mounts', 'r') as mounts:
+        return any(line.split()[1] == mount_point for line in mounts if len(line.split()) > 1)
+
+def checksum(path):
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def copy_with_checksum(source, target):
+    digest = hashlib.sha1()
+    with open(source, "rb") as fsrc, open(target, "wb") as fdst:
+        for block in iter(lambda: fsrc.read(BLOCK_SIZE), b""):
+            digest.update(block)
+            fdst.write(block)
+    shutil.copystat(source, target)
+    return digest.hexdigest()
+
+def read_back_checksum(path):
+    # Drop the cached pages first, otherwise the verification would read RAM instead of the stick
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        if hasattr(os, "posix_fadvise"):
+            os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+    return checksum(path)
+
+def get_entry(conn, name):
+    with _lock:
+        row = conn.execute("SELECT * FROM files WHERE name = ?", (name,)).fetchone()
+    return dict(row) if row else None
+
+def record(conn, entries):
+    with _lock, conn:
+        conn.executemany("INSERT OR REPLACE INTO files (name, size, mtime, checksum, copied) VALUES (?, ?, ?, ?, ?)",
+                         [(e["name"], e["size"], e["mtime"], e["checksum"], time.time()) for e in entries])
+
+def forget(conn, name):
+    with _lock, conn:
+        conn.execute("DELETE FROM files WHERE name = ?", (name,))
+
+def pending_files(conn, files):
+    pending = []
+    for file in files:
+        stat = os.stat(file)
+        entry = get_entry(conn, os.path.basename(file))
+        # FAT sticks store mtimes with a 2 s resolution
+        if entry is None or entry["size"] != stat.st_size or abs(entry["mtime"] - stat.st_mtime) >= 2:
+            pending.append((file, stat))
+    return pending
+
+def sync(files, mount_point=MOUNT_POINT, manifest_path=MANIFEST_PATH):
+    """Copy to the stick the files that changed since the last sync. Return the verified copies."""
+    if not is_mounted(mount_point):
+        _print(f"ERROR: USB not mounted in {mount_point}. Synchronisation skipped")
+        return []
+    sync_start = time.time()
+    conn = open_manifest(manifest_path)
+    try:
+        pending = pending_files(conn, files)
+        if not pending:
+            _print(f"USB stick up to date ({len(files)} files checked)")
+            return []
+        copies = []
+        for file, stat in pending:
+            name = os.path.basename(file)
+            part = os.path.join(mount_point, f".{name}.part")
+            try:
+                copies.append((file, stat, part, copy_with_checksum(file, part)))
+            except Exception as e:
+                _print(f"ERROR copying {name} to the USB stick: {e}")
+        os.sync()  # One flush for the whole batch instead of one fsync per file
+        verified = []
+        for file, stat, part, source_checksum in copies:
+            name = os.path.basename(file)
+            if read_back_checksum(part) != source_checksum:
+                _print(f"ERROR: {name} copy on the USB stick is corrupted. It will be copied again in the next sync")
+                os.remove(part)
+                continue
+            os.replace(part, os.path.join(mount_point, name))
+            verified.append({"name": name, "size": stat.st_size, "mtime": stat.st_mtime, "checksum": source_checksum})
+            _print(f"Synchronising file in USB stick: {name} (verified)")
+        dir_fd = os.open(mount_point, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        record(conn, verified)
+        metrics.record("usb_sync", time.time() - sync_start, files=len(verified), bytes=sum(v["size"] for v in verified), checked=len(files))
+        return verified
+    finally:
+        conn.close()
+
+def reconcile(mount_point=MOUNT_POINT, manifest_path=MANIFEST_PATH, rebuild=False, with_checksum=False):
+    """Make the manifest match the stick: add unknown files, drop missing ones and drop copies that
+    differ from the manifest (so the next sync copies them again if the source still exists)."""
+    conn = open_manifest(manifest_path)
+    try:
+        if rebuild:
+            with _lock, conn:
+                conn.execute("DELETE FROM files")
+        with _lock:
+            known = {row["name"]: dict(row) for row in conn.execute("SELECT * FROM files")}
+        found, added, corrupted = set(), [], []
+        for entry in os.scandir(mount_point):
+            if not entry.is_file() or entry.name.startswith("."):
+                continue
+            found.add(entry.name)
+            stat = entry.stat()
+            manifest_entry = known.get(entry.name)
+            file_checksum = checksum(entry.path) if with_checksum else None
+            if manifest_entry is None:
+                added.append({"name": entry.name, "size": stat.st_size, "mtime": stat.st_mtime, "checksum": file_checksum})
+            elif manifest_entry["size"] != stat.st_size or (with_checksum and manifest_entry["checksum"] not in (None, file_checksum)):
+                corrupted.append(entry.name)
+            elif with_checksum and manifest_entry["checksum"] is None:
+                added.append(dict(manifest_entry, checksum=file_checksum))
+        missing = [name for name in known if name not in found]
+        for name in missing + corrupted:
+            forget(conn, name)
+        record(conn, added)
+        with _lock, conn:
+            conn.execute("INSERT OR REPLACE INTO meta (key, value) VALUES ('reconciled', ?)", (time.time(),))
+        _print(f"Manifest reconciled: {len(found)} files on the stick, {len(added)} added, "
+               f"{len(corrupted)} differ from the manifest, {len(missing)} missing")
+        return len(found), len(added), len(missing) + len(corrupted)
+    finally:
+        conn.close()
+
+def last_reconcile(conn):
+    with _lock:
+        row = conn.execute("SELECT value FROM meta WHERE key = 'reconciled'").fetchone()
+    return row["value"] if row else None
+
+def stats(conn):
+    """Return (files, bytes, oldest entry, newest entry) of the stick from the manifest (no scan)."""
+    with _lock:
+        count, size = conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM files").fetchone()
+        oldest = conn.execute("SELECT name, mtime FROM files ORDER BY mtime ASC LIMIT 1").fetchone()
+        newest = conn.execute("SELECT name, mtime FROM files ORDER BY mtime DESC LIMIT 1").fetchone()
+    return count, size, dict(oldest) if oldest else None, dict(newest) if newest else None
+
+def index_stats(mount_point=MOUNT_POINT, manifest_path=MANIFEST_PATH, reconcile_hours=24):
+    """Stick statistics from the manifest, with a full reconcile scan only every `reconcile_hours`."""
+    conn = open_manifest(manifest_path)
+    try:
+        reconciled = last_reconcile(conn)
+        if reconciled is None or time.time() - reconciled >= reconcile_hours * 3600:
+            conn.close()
+            reconcile(mount_point, manifest_path)
+            conn = open_manifest(manifest_path)
+        return stats(conn)
+    finally:
+        conn.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Verify or rebuild the USB stick manifest')
+    parser.add_argument('--verify', action='store_true', help='Reconcile the manifest with the stick')
+    parser.add_argument('--rebuild', action='store_true', help='Recreate the manifest from a full scan of the stick')
+    parser.add_argument('--checksum', action='store_true', help='Also compare checksums (reads every file)')
+    parser.add_argument('--stats', action='store_true', help='Show the stick statistics stored in the manifest')
+    parser.add_argument('--mount', type=str, default=MOUNT_POINT, help='Mount point of the USB stick')
+    args = parser.parse_args()
+    try:
+        if not is_mounted(args.mount):
+            _print(f"ERROR: USB not mounted in {args.mount}")
+        elif args.verify or args.rebuild:
+            reconcile(args.mount, rebuild=args.rebuild, with_checksum=args.checksum)
+        if args.stats:
+            conn = open_manifest()
+            count, size, oldest, newest = stats(conn)
+            conn.close()
+            _print(f"{count} files ({size / 1e9:.2f} GB) - oldest: {oldest and oldest['name']} - newest: {newest and newest['name']}")
+        if not (args.verify or args.rebuild or args.stats):
+            parser.print_help()
+    except Exception as e:
+        _print("ERROR: Manifest reconciliation failed")
+        _print(f"ERROR: {e}")
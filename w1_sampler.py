@@ -0,0 +1,186 @@
+##############################################################################################
+# w1_sampler: Background sampler of every DS18B20 temperature sensor on the 1-Wire bus       #
+#                                                                                            #
+# Author: Xabier Blanch Gorriz                                                               #
+#                                                                                            #
+# This script is open-source and licensed under the MIT License.                             #
+# Technische Universität Dresden in collaboration with Universitat Politecnica de Catalunya  #
+#                                                                                            #
+# Copyright (c) XBG 2024                                                                     #
+##############################################################################################
+
+# Every sample round converts all the sensors at the same time: with a single bulk conversion
+# (w1_bus_master*/therm_bulk_read) when the kernel has it, otherwise with one thread per sensor.
+# w1_slave is opened once per sensor and re-read with pread; a reading is only accepted when the
+# CRC line ends with YES, and failed reads are retried. The rounds run every `period` seconds in a
+# background thread and produce timestamped Record tuples.
+#
+# Usage (also against a fake tree made with write_fake_sensor):
+#   python3 w1_sampler.py --w1_path /sys/bus/w1/devices --samples 3 --period 1
+
+import os
+import glob
+import time
+import argparse
+import threading
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+W1_PATH = "/sys/bus/w1/devices"
+INVALID = 999.9  # value written for a sensor without a valid reading
+POWER_ON_RESET = 85000  # DS18B20 register value before the first conversion
+
+Record = namedtuple("Record", ["time", "device", "temperature", "attempts"])
+
+def _print(message):
+    current_time = datetime.now()
+    formatted_time = current_time.strftime("[%d/%m/%Y - %H:%M:%S]")
+    print(f"{formatted_time} :: TEMP_sensor :: {message}")
+
+def discover(w1_path=W1_PATH):
+    """{device id: w1_slave path} of the DS18B20 sensors (family 28)."""
+    return {os.path.basename(os.path.dirname(path)): path for path in sorted(glob.glob(os.path.join(w1_path, "28-*", "w1_slave")))}
+
+def parse(data):
+    """Temperature in degrees of a w1_slave content, or None if the CRC check failed."""
+    lines = data.strip().splitlines()
+    if len(lines) < 2 or not lines[0].strip().endswith("YES"):
+        return None
+    _, sep, reading = lines[1].partition("t=")
+    if not sep:
+        return None
+    try:
+        value = int(reading)
+    except ValueError:
+        return None
+    if value == POWER_ON_RESET:
+        return None
+    return value / 1000.0
+
+def write_fake_sensor(w1_path, device, temperature, crc_ok=True):
+    """Create or update a sensor of a fake 1-Wire tree (same w1_slave format as the kernel)."""
+    folder = os.path.join(w1_path, device)
+    os.makedirs(folder, exist_ok=True)
+    raw = int(round(temperature * 1000))
+    with open(os.path.join(folder, "w1_slave"), "w") as f:
+        f.write(f"72 01 4b 46 7f ff 0e 10 57 : crc=57 {'YES' if crc_ok else 'NO'}\n")
+        f.write(f"72 01 4b 46 7f ff 0e 10 57 t={raw}\n")
+
+class Sensor:
+    def __init__(self, device, path):
+        self.device = device
+        self.path = path
+        self.fd = os.open(path, os.O_RDONLY)
+
+    def read(self, retries=2, retry_delay=0.1):
+        attempts = 0
+        while True:
+            attempts = attempts + 1
+            try:
+                # pread at offset 0 makes the kernel run a new conversion without reopening the file
+                temperature = parse(os.pread(self.fd, 256, 0).decode("ascii", "replace"))
+            except OSError:
+                temperature = None
+            if temperature is not None or attempts > retries:
+                return temperature, attempts
+            time.sleep(retry_delay)
+
+    def close(self):
+        os.close(self.fd)
+
+class Sampler:
+    """Samples every discovered sensor `samples` times, one round every `period` seconds.
+
+    start() returns at once; records() waits for the rounds (up to a timeout) and returns the
+    Record list, with INVALID for the sensors that gave no valid reading.
+    """
+
+    def __init__(self, w1_path=W1_PATH, samples=3, period=1.0, retries=2, bulk=True):
+        self.w1_path = w1_path
+        self.samples = samples
+        self.period = period
+        self.retries = retries
+        self.sensors = []
+        for device, path in discover(w1_path).items():
+            try:
+                self.sensors.append(Sensor(device, path))
+            except OSError as e:
+                _print(f"ERROR: Temp sensor {device} can't be opened: {e}")
+        self.bulk_files = glob.glob(os.path.join(w1_path, "w1_bus_master*", "therm_bulk_read")) if bulk else []
+        self.pool = ThreadPoolExecutor(max_workers=max(1, len(self.sensors)))
+        self._records = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def start(self):
+        for sensor in self.sensors:
+            _print(f"Temp sensor {sensor.device} identified: Measuring temperatures")
+        self._thread.start()
+        return self
+
+    def _trigger_bulk(self):
+        triggered = False
+        for bulk_file in self.bulk_files:
+            try:
+                with open(bulk_file, "w") as f:
+                    f.write("trigger\n")
+                triggered = True
+            except OSError:
+                continue
+        return triggered
+
+    def sample_round(self):
+        now = datetime.now()
+        self._trigger_bulk()
+        results = self.pool.map(lambda sensor: sensor.read(self.retries), self.sensors)
+        records = []
+        for sensor, (temperature, attempts) in zip(self.sensors, results):
+            if temperature is None:
+                _print(f"ERROR: Temp sensor {sensor.device} without a valid reading after {attempts} attempts")
+                temperature = INVALID
+            records.append(Record(now, sensor.device, temperature, attempts))
+        with self._lock:
+            self._records.extend(records)
+        return records
+
+    def _run(self):
+        next_round = time.monotonic()
+        for count in range(self.samples):
+            if self._stop.is_set():
+                break
+            self.sample_round()
+            next_round = next_round + self.period
+            if count < self.samples - 1:
+                self._stop.wait(max(0, next_round - time.monotonic()))
+
+    def records(self, timeout=None):
+        self._thread.join(timeout)
+        if self._thread.is_alive():
+            _print(f"ERROR: Temp sensors still sampling after {timeout} s")
+        with self._lock:
+            return list(self._records)
+
+    def stop(self):
+        self._stop.set()
+        self.pool.shutdown(wait=False)
+        if self._thread.is_alive():
+            return  # a sensor read is hanging: its file stays open until the process exits
+        for sensor in self.sensors:
+            sensor.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Read every DS18B20 sensor of the 1-Wire bus')
+    parser.add_argument('--w1_path', type=str, default=W1_PATH, help='1-Wire devices folder (sysfs or a fake tree)')
+    parser.add_argument('--samples', type=int, default=3, help='Sample rounds')
+    parser.add_argument('--period', type=float, default=1.0, help='Seconds between sample rounds')
+    parser.add_argument('--retries', type=int, default=2, help='Retries of a reading with a failed CRC')
+    args = parser.parse_args()
+    start = time.time()
+    sampler = Sampler(args.w1_path, args.samples, args.period, args.retries).start()
+    records = sampler.records()
+    sampler.stop()
+    for record in records:
+        print(f"{record.time:%Y-%m-%d_%H:%M:%S},{record.device},{record.temperature},{record.attempts}")
+    _print(f"{len(sampler.sensors)} sensors, {len(records)} readings in {time.time() - start:.2f} s")